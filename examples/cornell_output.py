@@ -5,14 +5,13 @@ import logging
 import torch
 from torch.optim.lr_scheduler import StepLR
 import torchtext
-import nltk
 
 import seq2seq
 from seq2seq.trainer import SupervisedTrainer
 from seq2seq.models import EncoderRNN, DecoderRNN, Seq2seq
 from seq2seq.loss import Perplexity
 from seq2seq.optim import Optimizer
-from seq2seq.dataset import SourceField, TargetField
+from seq2seq.dataset import SourceField, TargetField, Tokenizer
 from seq2seq.evaluator import Predictor
 from seq2seq.util.checkpoint import Checkpoint
 
@@ -60,7 +59,7 @@ seq2seq = checkpoint.model
 input_vocab = checkpoint.input_vocab
 output_vocab = checkpoint.output_vocab
 
-predictor = Predictor(seq2seq, input_vocab, output_vocab)
+predictor = Predictor(seq2seq, input_vocab, output_vocab, tokenizer=Tokenizer())
 
 #import os
 #if os.path.exists(opt.out_path):
@@ -79,7 +78,7 @@ with open(opt.dev_path) as d, open(opt.out_path, 'a') as o:
             input = s[0]
             output = s[1]
  #           print(input, output)
-            seq = nltk.word_tokenize(input.strip())            
+            seq = predictor.tokenize(input.strip())            
             pred = predictor.predict(seq)
             if pred not in outputs:
                 if len(set(pred)) > 5:
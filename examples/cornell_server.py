@@ -2,44 +2,49 @@ import os
 import argparse
 import logging
 
-import torch
-from torch.optim.lr_scheduler import StepLR
-import torchtext
-
-import seq2seq
-from seq2seq.trainer import SupervisedTrainer
-from seq2seq.models import EncoderRNN, DecoderRNN, Seq2seq
-from seq2seq.loss import Perplexity
-from seq2seq.optim import Optimizer
-from seq2seq.dataset import SourceField, TargetField
-from seq2seq.evaluator import Predictor
+from seq2seq.evaluator import CachedPredictor
+from seq2seq.server import InferenceServer, PreforkServer, load_predictor
 from seq2seq.util.checkpoint import Checkpoint
 
-try:
-    raw_input          # Python 2
-except NameError:
-    raw_input = input  # Python 3
-
 # Sample usage:
-#     # training
-#     python examples/sample.py --train_path $TRAIN_PATH --dev_path $DEV_PATH --expt_dir $EXPT_PATH
-#     # resuming from the latest checkpoint of the experiment
-#      python examples/sample.py --train_path $TRAIN_PATH --dev_path $DEV_PATH --expt_dir $EXPT_PATH --resume
-#      # resuming from a specific checkpoint
-#      python examples/sample.py --train_path $TRAIN_PATH --dev_path $DEV_PATH --expt_dir $EXPT_PATH --load_checkpoint $CHECKPOINT_DIR
+#     # serving a checkpoint of an experiment
+#     python examples/cornell_server.py --expt_dir $EXPT_PATH --load_checkpoint $CHECKPOINT_DIR --port 8000
+#     # serving an inference bundle
+#     python examples/cornell_server.py --bundle model.bundle --port 8000
+#     # serving with 4 worker processes of 2 threads sharing the weights
+#     python examples/cornell_server.py --bundle model.bundle --port 8000 --workers 4 --threads_per_worker 2
+#     # querying the server
+#     curl -X POST localhost:8000/predict -d '{"src": "how are you ?"}'
 
 parser = argparse.ArgumentParser()
-parser.add_argument('--train_path', action='store', dest='train_path',
-                    help='Path to train data')
-parser.add_argument('--dev_path', action='store', dest='dev_path',
-                    help='Path to dev data')
 parser.add_argument('--expt_dir', action='store', dest='expt_dir', default='./experiment',
-                    help='Path to experiment directory. If load_checkpoint is True, then path to checkpoint directory has to be provided')
+                    help='Path to experiment directory')
 parser.add_argument('--load_checkpoint', action='store', dest='load_checkpoint',
                     help='The name of the checkpoint to load, usually an encoded time string')
-parser.add_argument('--resume', action='store_true', dest='resume',
-                    default=False,
-                    help='Indicates if training has to be resumed from the latest checkpoint')
+parser.add_argument('--bundle', action='store', dest='bundle',
+                    help='Path to an inference bundle to serve instead of a checkpoint')
+parser.add_argument('--host', action='store', dest='host', default='127.0.0.1',
+                    help='Address to listen on')
+parser.add_argument('--port', action='store', dest='port', type=int, default=8000,
+                    help='Port to listen on')
+parser.add_argument('--max_batch_size', action='store', dest='max_batch_size', type=int, default=32,
+                    help='Maximum number of requests predicted together')
+parser.add_argument('--max_delay', action='store', dest='max_delay', type=float, default=0.005,
+                    help='Maximum time in seconds a request waits for more requests to batch with')
+parser.add_argument('--continuous', action='store_true', dest='continuous', default=False,
+                    help='Decode with continuous batching, requests join and leave the batch at every step')
+parser.add_argument('--max_slots', action='store', dest='max_slots', type=int, default=64,
+                    help='Maximum number of sequences decoded together with continuous batching')
+parser.add_argument('--cache_entries', action='store', dest='cache_entries', type=int, default=0,
+                    help='Number of predictions cached for repeated requests, 0 disables the cache')
+parser.add_argument('--cache_ttl', action='store', dest='cache_ttl', type=float, default=None,
+                    help='Time in seconds a prediction is cached for')
+parser.add_argument('--workers', action='store', dest='workers', type=int, default=0,
+                    help='Number of pre-forked worker processes sharing the model, 0 serves in a single process')
+parser.add_argument('--threads_per_worker', action='store', dest='threads_per_worker', type=int, default=1,
+                    help='Number of torch threads of a worker process')
+parser.add_argument('--precompute_projections', action='store_true', dest='precompute_projections', default=False,
+                    help='Precompute the input projections of the decoder for its whole vocabulary')
 parser.add_argument('--log-level', dest='log_level',
                     default='info',
                     help='Logging level.')
@@ -50,31 +55,22 @@ LOG_FORMAT = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s'
 logging.basicConfig(format=LOG_FORMAT, level=getattr(logging, opt.log_level.upper()))
 logging.info(opt)
 
-logging.info("loading checkpoint from {}".format(os.path.join(opt.expt_dir, Checkpoint.CHECKPOINT_DIR_NAME, opt.load_checkpoint)))
-checkpoint_path = os.path.join(opt.expt_dir, Checkpoint.CHECKPOINT_DIR_NAME, opt.load_checkpoint)
-checkpoint = Checkpoint.load(checkpoint_path)
-seq2seq = checkpoint.model
-input_vocab = checkpoint.input_vocab
-output_vocab = checkpoint.output_vocab
-
-predictor = Predictor(seq2seq, input_vocab, output_vocab)
+if opt.bundle is not None:
+    model_path = opt.bundle
+elif opt.load_checkpoint is not None:
+    model_path = os.path.join(opt.expt_dir, Checkpoint.CHECKPOINT_DIR_NAME, opt.load_checkpoint)
+else:
+    model_path = Checkpoint.get_latest_checkpoint(opt.expt_dir)
+logging.info("loading model from {}".format(model_path))
+predictor = load_predictor(model_path, precompute_projections=opt.precompute_projections)
+if opt.cache_entries > 0:
+    predictor = CachedPredictor(predictor, max_entries=opt.cache_entries, ttl=opt.cache_ttl)
 
-with open(opt.dev_path) as d:
-#while True:
-#    seq_str = raw_input("Type in a source sequence:")
-    outputs = []
-    for s in d:
-        s = s.strip()
-        if len(s) > 0:
-            s = s.split("\t")
-#            print(s)
-            input = s[0]
-            output = s[1]
-            seq = input.strip().split()
-            pred = predictor.predict(seq)
-            if pred not in outputs:
-                if len(set(pred)) > 5:
-                    print(input)
-                    print(">", output)
-                    print("#", " ".join(pred))
-                outputs.append(pred)
+server_kwargs = dict(max_batch_size=opt.max_batch_size, max_delay=opt.max_delay,
+                     continuous=opt.continuous, max_slots=opt.max_slots)
+if opt.workers > 0:
+    server = PreforkServer(predictor, host=opt.host, port=opt.port, workers=opt.workers,
+                           threads_per_worker=opt.threads_per_worker, **server_kwargs)
+else:
+    server = InferenceServer(predictor, host=opt.host, port=opt.port, **server_kwargs)
+server.serve_forever()
@@ -42,6 +42,12 @@ parser.add_argument('--load_checkpoint', action='store', dest='load_checkpoint',
 parser.add_argument('--resume', action='store_true', dest='resume',
                     default=False,
                     help='Indicates if training has to be resumed from the latest checkpoint')
+parser.add_argument('--attention_window', dest='attention_window', type=int, default=None,
+                    help='Let every chunk attend only to the words of the last chunks, for long contexts')
+parser.add_argument('--attention_topk', dest='attention_topk', type=int, default=None,
+                    help='Let every chunk attend only to the words of its most similar chunks, for long contexts')
+parser.add_argument('--checkpoint_activations', action='store_true', dest='checkpoint_activations', default=False,
+                    help='Recompute the encoder and context attention activations in backward to save memory')
 parser.add_argument('--log-level', dest='log_level',
                     default='info',
                     help='Logging level.')
@@ -117,9 +123,13 @@ else:
         hidden_size=128
         bidirectional = True
         encoder = EncoderRNN(len(src.vocab), max_len, hidden_size,
-                             bidirectional=bidirectional, variable_lengths=True)
+                             bidirectional=bidirectional, variable_lengths=True,
+                             checkpoint_activations=opt.checkpoint_activations)
 
-        hrnn = HierarchialRNN(max_len, hidden_size * 2 if bidirectional else hidden_size, bidirectional=False)
+        hrnn = HierarchialRNN(max_len, hidden_size * 2 if bidirectional else hidden_size, bidirectional=False,
+                              variable_lengths=True, attention_window=opt.attention_window,
+                              attention_topk=opt.attention_topk,
+                              checkpoint_activations=opt.checkpoint_activations)
         decoder = DecoderRNN(len(tgt.vocab), max_len, hidden_size * 2 if bidirectional else hidden_size,
                              dropout_p=0.2, use_attention=True, bidirectional=False,
                              eos_id=tgt.eos_id, sos_id=tgt.sos_id)
@@ -0,0 +1,65 @@
+import os
+import argparse
+import logging
+
+from seq2seq.dataset import Tokenizer
+from seq2seq.evaluator import BatchInference
+from seq2seq.server import load_predictor
+from seq2seq.util.checkpoint import Checkpoint
+
+# Sample usage:
+#     # predicting the sources of a tsv file with 8 worker processes
+#     python scripts/batch_predict.py --bundle model.bundle --src_path data/test.tsv --out_path out.tsv --workers 8
+#     # rerunning the same command after a crash resumes from the last finished shard
+#     python scripts/batch_predict.py --expt_dir $EXPT_PATH --src_path data/test.tsv --out_path out.tsv --workers 8
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--expt_dir', action='store', dest='expt_dir', default='./experiment',
+                    help='Path to experiment directory')
+parser.add_argument('--load_checkpoint', action='store', dest='load_checkpoint',
+                    help='The name of the checkpoint to load, defaults to the latest checkpoint')
+parser.add_argument('--bundle', action='store', dest='bundle',
+                    help='Path to an inference bundle to predict with instead of a checkpoint')
+parser.add_argument('--src_path', action='store', dest='src_path', required=True,
+                    help='Path to the input file, the source is the first tab separated column of a line')
+parser.add_argument('--out_path', action='store', dest='out_path', required=True,
+                    help='Path to the output file, the input lines followed by their predictions')
+parser.add_argument('--workers', action='store', dest='workers', type=int, default=os.cpu_count() or 1,
+                    help='Number of worker processes')
+parser.add_argument('--threads_per_worker', action='store', dest='threads_per_worker', type=int,
+                    help='Number of torch threads of a worker process, defaults to the cores shared among them')
+parser.add_argument('--shard_size', action='store', dest='shard_size', type=int, default=1000,
+                    help='Number of lines of a shard, the unit of work and of progress')
+parser.add_argument('--batch_size', action='store', dest='batch_size', type=int, default=64,
+                    help='Number of sources predicted together')
+parser.add_argument('--tokenizer', action='store', dest='tokenizer', default='split', choices=['split', 'treebank'],
+                    help='Splits the sources on whitespace, or with the rules of nltk.word_tokenize')
+parser.add_argument('--dedupe', action='store_true', dest='dedupe', default=False,
+                    help='Skip the lines whose prediction was written already')
+parser.add_argument('--restart', action='store_true', dest='restart', default=False,
+                    help='Ignore the progress of a previous run and start over')
+parser.add_argument('--log-level', dest='log_level',
+                    default='info',
+                    help='Logging level.')
+
+opt = parser.parse_args()
+
+LOG_FORMAT = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s'
+logging.basicConfig(format=LOG_FORMAT, level=getattr(logging, opt.log_level.upper()))
+logging.info(opt)
+
+if opt.bundle is not None:
+    model_path = opt.bundle
+elif opt.load_checkpoint is not None:
+    model_path = os.path.join(opt.expt_dir, Checkpoint.CHECKPOINT_DIR_NAME, opt.load_checkpoint)
+else:
+    model_path = Checkpoint.get_latest_checkpoint(opt.expt_dir)
+logging.info("loading model from {}".format(model_path))
+
+tokenize = Tokenizer() if opt.tokenizer == 'treebank' else None
+
+inference = BatchInference(load_predictor(model_path), workers=opt.workers,
+                           threads_per_worker=opt.threads_per_worker, shard_size=opt.shard_size,
+                           batch_size=opt.batch_size, tokenize=tokenize, dedupe=opt.dedupe)
+stats = inference.run(opt.src_path, opt.out_path, restart=opt.restart)
+logging.info("predicted {lines} lines, wrote {written}, skipped {duplicates} duplicate predictions".format(**stats))
@@ -0,0 +1,39 @@
+import argparse
+import logging
+
+import torchtext
+
+from seq2seq.dataset import SourceField, TargetField, LengthPredictor
+
+# Sample usage:
+#     # build the decoding length caps of an experiment from its training data
+#     python scripts/build_length_predictor.py --train_path $TRAIN_PATH --output lengths.npz
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--train_path', action='store', dest='train_path', required=True,
+                    help='Path to train data')
+parser.add_argument('--output', action='store', dest='output', required=True,
+                    help='Path to the length predictor to write')
+parser.add_argument('--quantile', action='store', dest='quantile', type=float, default=0.99,
+                    help='Quantile of the target lengths of a source length')
+parser.add_argument('--margin', action='store', dest='margin', type=int, default=2,
+                    help='Number of decoding steps added to the quantiles')
+parser.add_argument('--min_count', action='store', dest='min_count', type=int, default=20,
+                    help='Minimum number of pairs a cap is computed from')
+parser.add_argument('--log-level', dest='log_level',
+                    default='info',
+                    help='Logging level.')
+
+opt = parser.parse_args()
+
+LOG_FORMAT = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s'
+logging.basicConfig(format=LOG_FORMAT, level=getattr(logging, opt.log_level.upper()))
+logging.info(opt)
+
+train = torchtext.data.TabularDataset(path=opt.train_path, format='tsv',
+                                      fields=[('src', SourceField()), ('tgt', TargetField())])
+length_predictor = LengthPredictor.from_dataset(train, quantile=opt.quantile, margin=opt.margin,
+                                                min_count=opt.min_count)
+length_predictor.save(opt.output)
+logging.info("wrote the caps of {} source lengths, from {} to {} steps, to {}".format(
+    len(length_predictor.caps), length_predictor.caps[0], length_predictor.caps[-1], opt.output))
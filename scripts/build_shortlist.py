@@ -0,0 +1,41 @@
+import argparse
+import logging
+
+import torchtext
+
+from seq2seq.dataset import SourceField, TargetField, Shortlist
+from seq2seq.util.checkpoint import Checkpoint
+
+# Sample usage:
+#     # build the shortlist of an experiment from its training data
+#     python scripts/build_shortlist.py --train_path $TRAIN_PATH --checkpoint $CHECKPOINT_PATH --output shortlist.npz
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--train_path', action='store', dest='train_path', required=True,
+                    help='Path to train data')
+parser.add_argument('--checkpoint', action='store', dest='checkpoint', required=True,
+                    help='Path to the checkpoint whose vocabularies the shortlist is built for')
+parser.add_argument('--output', action='store', dest='output', required=True,
+                    help='Path to the shortlist to write')
+parser.add_argument('--n_frequent', action='store', dest='n_frequent', type=int, default=1000,
+                    help='Number of most frequent target words that are always candidates')
+parser.add_argument('--n_aligned', action='store', dest='n_aligned', type=int, default=20,
+                    help='Number of target words aligned to every source word')
+parser.add_argument('--log-level', dest='log_level',
+                    default='info',
+                    help='Logging level.')
+
+opt = parser.parse_args()
+
+LOG_FORMAT = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s'
+logging.basicConfig(format=LOG_FORMAT, level=getattr(logging, opt.log_level.upper()))
+logging.info(opt)
+
+checkpoint = Checkpoint.load(opt.checkpoint)
+train = torchtext.data.TabularDataset(path=opt.train_path, format='tsv',
+                                      fields=[('src', SourceField()), ('tgt', TargetField())])
+shortlist = Shortlist.from_dataset(train, checkpoint.input_vocab, checkpoint.output_vocab,
+                                   n_frequent=opt.n_frequent, n_aligned=opt.n_aligned)
+shortlist.save(opt.output)
+logging.info("wrote shortlist of {} frequent words and {} aligned words to {}".format(
+    shortlist.n_frequent, len(shortlist.aligned), opt.output))
@@ -0,0 +1,77 @@
+from __future__ import print_function
+import os
+import sys
+import argparse
+import logging
+
+from seq2seq.evaluator import Predictor
+from seq2seq.util.checkpoint import Checkpoint
+from seq2seq.util.onnx_export import export_onnx
+from seq2seq.util.onnx_runtime import OnnxSeq2seq
+
+# Sample usage:
+#     # export the latest checkpoint of an experiment trained on the toy reverse data (scripts/toy.sh) and check
+#     # that the exported graphs predict like the torch model
+#     python scripts/check_onnx_export.py --expt_dir $EXPT_PATH --output_dir $ONNX_PATH \
+#         --dev_path data/toy_reverse/dev/data.txt
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--expt_dir', action='store', dest='expt_dir', default='./experiment',
+                    help='Path to experiment directory')
+parser.add_argument('--load_checkpoint', action='store', dest='load_checkpoint',
+                    help='The name of the checkpoint to export, defaults to the latest checkpoint')
+parser.add_argument('--output_dir', action='store', dest='output_dir', required=True,
+                    help='Path to the directory to export the ONNX graphs to')
+parser.add_argument('--dev_path', action='store', dest='dev_path', required=True,
+                    help='Path to dev data to compare the predictions on')
+parser.add_argument('--max_examples', action='store', dest='max_examples', type=int, default=1000,
+                    help='Maximum number of dev examples in the comparison')
+parser.add_argument('--beam_size', action='store', dest='beam_size', type=int, default=3,
+                    help='Beam size to report the accuracy of beam search for')
+parser.add_argument('--log-level', dest='log_level',
+                    default='info',
+                    help='Logging level.')
+
+opt = parser.parse_args()
+
+LOG_FORMAT = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s'
+logging.basicConfig(format=LOG_FORMAT, level=getattr(logging, opt.log_level.upper()))
+logging.info(opt)
+
+if opt.load_checkpoint is not None:
+    checkpoint_path = os.path.join(opt.expt_dir, Checkpoint.CHECKPOINT_DIR_NAME, opt.load_checkpoint)
+else:
+    checkpoint_path = Checkpoint.get_latest_checkpoint(opt.expt_dir)
+logging.info("loading checkpoint from {}".format(checkpoint_path))
+checkpoint = Checkpoint.load(checkpoint_path)
+
+export_onnx(checkpoint.model, checkpoint.input_vocab, checkpoint.output_vocab, opt.output_dir)
+logging.info("exported ONNX graphs to {}".format(opt.output_dir))
+
+examples = []
+with open(opt.dev_path) as fin:
+    for line in fin:
+        fields = line.strip().split('\t')
+        if len(fields) == 2:
+            examples.append((fields[0].split(), fields[1].split() + ['<eos>']))
+        if len(examples) >= opt.max_examples:
+            break
+
+predictor = Predictor(checkpoint.model, checkpoint.input_vocab, checkpoint.output_vocab)
+runtime = OnnxSeq2seq(opt.output_dir)
+mismatches = 0
+greedy_correct = beam_correct = 0
+for src_seq, tgt_seq in examples:
+    expected = predictor.predict(src_seq)
+    greedy = runtime.predict(src_seq)
+    if greedy != expected:
+        mismatches += 1
+        logging.warning("mismatch for {}: torch {} onnx {}".format(src_seq, expected, greedy))
+    greedy_correct += greedy == tgt_seq
+    beam_correct += runtime.predict(src_seq, beam_size=opt.beam_size) == tgt_seq
+
+print("Compared %d examples of %s" % (len(examples), opt.dev_path))
+print("greedy agreement with Predictor %.4f | greedy exact match %.4f | beam %d exact match %.4f" % (
+    1 - float(mismatches) / max(len(examples), 1), float(greedy_correct) / max(len(examples), 1),
+    opt.beam_size, float(beam_correct) / max(len(examples), 1)))
+sys.exit(1 if mismatches else 0)
@@ -0,0 +1,39 @@
+import os
+import argparse
+import logging
+
+from seq2seq.util.checkpoint import Checkpoint
+from seq2seq.util.bundle import InferenceBundle
+
+# Sample usage:
+#     # export the latest checkpoint of an experiment
+#     python scripts/export_bundle.py --expt_dir $EXPT_PATH --output model.bundle
+#     # export a specific checkpoint
+#     python scripts/export_bundle.py --expt_dir $EXPT_PATH --load_checkpoint $CHECKPOINT_DIR --output model.bundle
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--expt_dir', action='store', dest='expt_dir', default='./experiment',
+                    help='Path to experiment directory')
+parser.add_argument('--load_checkpoint', action='store', dest='load_checkpoint',
+                    help='The name of the checkpoint to export, defaults to the latest checkpoint')
+parser.add_argument('--output', action='store', dest='output', required=True,
+                    help='Path to the inference bundle to write')
+parser.add_argument('--log-level', dest='log_level',
+                    default='info',
+                    help='Logging level.')
+
+opt = parser.parse_args()
+
+LOG_FORMAT = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s'
+logging.basicConfig(format=LOG_FORMAT, level=getattr(logging, opt.log_level.upper()))
+logging.info(opt)
+
+if opt.load_checkpoint is not None:
+    checkpoint_path = os.path.join(opt.expt_dir, Checkpoint.CHECKPOINT_DIR_NAME, opt.load_checkpoint)
+else:
+    checkpoint_path = Checkpoint.get_latest_checkpoint(opt.expt_dir)
+logging.info("loading checkpoint from {}".format(checkpoint_path))
+checkpoint = Checkpoint.load(checkpoint_path)
+
+InferenceBundle.from_checkpoint(checkpoint).save(opt.output)
+logging.info("wrote inference bundle to {}".format(opt.output))
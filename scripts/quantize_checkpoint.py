@@ -0,0 +1,101 @@
+from __future__ import print_function, division
+import io
+import os
+import time
+import argparse
+import logging
+
+import numpy as np
+import torch
+
+from seq2seq.evaluator import Predictor
+from seq2seq.util.checkpoint import Checkpoint
+from seq2seq.util.quantization import quantize_checkpoint
+
+# Sample usage:
+#     # quantize the latest checkpoint of an experiment into another experiment directory
+#     python scripts/quantize_checkpoint.py --expt_dir $EXPT_PATH --output_dir $QUANTIZED_EXPT_PATH
+#     # ... and compare accuracy and latency with the fp32 model on a dev file
+#     python scripts/quantize_checkpoint.py --expt_dir $EXPT_PATH --output_dir $QUANTIZED_EXPT_PATH --dev_path $DEV_PATH
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--expt_dir', action='store', dest='expt_dir', default='./experiment',
+                    help='Path to experiment directory')
+parser.add_argument('--load_checkpoint', action='store', dest='load_checkpoint',
+                    help='The name of the checkpoint to quantize, defaults to the latest checkpoint')
+parser.add_argument('--output_dir', action='store', dest='output_dir', required=True,
+                    help='Path to the experiment directory to save the quantized checkpoint to')
+parser.add_argument('--dev_path', action='store', dest='dev_path',
+                    help='Path to dev data, a comparison report is printed if given')
+parser.add_argument('--max_examples', action='store', dest='max_examples', type=int, default=1000,
+                    help='Maximum number of dev examples in the comparison')
+parser.add_argument('--log-level', dest='log_level',
+                    default='info',
+                    help='Logging level.')
+
+opt = parser.parse_args()
+
+LOG_FORMAT = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s'
+logging.basicConfig(format=LOG_FORMAT, level=getattr(logging, opt.log_level.upper()))
+logging.info(opt)
+
+
+def model_size(model):
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return len(buf.getvalue())
+
+
+def run(predictor, examples):
+    predictions, latencies = [], []
+    for src_seq, _ in examples:
+        start = time.time()
+        pred = predictor.predict(src_seq)
+        latencies.append(time.time() - start)
+        if pred and pred[-1] == '<eos>':
+            pred = pred[:-1]
+        predictions.append(pred)
+    return predictions, np.array(latencies) * 1000
+
+
+def report(name, model, predictions, latencies, examples, reference=None):
+    exact = np.mean([pred == tgt_seq for pred, (_, tgt_seq) in zip(predictions, examples)])
+    matches = sum(sum(p == t for p, t in zip(pred, tgt_seq)) for pred, (_, tgt_seq) in zip(predictions, examples))
+    tokens = sum(len(tgt_seq) for _, tgt_seq in examples)
+    line = "%-6s size %8.2f MB | exact match %.4f | token accuracy %.4f | latency ms mean %.2f p50 %.2f p99 %.2f" % (
+        name, model_size(model) / 2 ** 20, exact, matches / max(tokens, 1),
+        latencies.mean(), np.percentile(latencies, 50), np.percentile(latencies, 99))
+    if reference is not None:
+        line += " | agreement with fp32 %.4f" % np.mean([p == r for p, r in zip(predictions, reference)])
+    print(line)
+
+
+if opt.load_checkpoint is not None:
+    checkpoint_path = os.path.join(opt.expt_dir, Checkpoint.CHECKPOINT_DIR_NAME, opt.load_checkpoint)
+else:
+    checkpoint_path = Checkpoint.get_latest_checkpoint(opt.expt_dir)
+logging.info("loading checkpoint from {}".format(checkpoint_path))
+checkpoint = Checkpoint.load(checkpoint_path)
+checkpoint.model.cpu()
+
+quantized = quantize_checkpoint(checkpoint)
+path = quantized.save(opt.output_dir)
+logging.info("saved quantized checkpoint to {}".format(path))
+
+if opt.dev_path is not None:
+    examples = []
+    with open(opt.dev_path) as fin:
+        for line in fin:
+            fields = line.strip().split('\t')
+            if len(fields) == 2:
+                examples.append((fields[0].split(), fields[1].split()))
+            if len(examples) >= opt.max_examples:
+                break
+
+    fp32_predictions, fp32_latencies = run(Predictor(checkpoint.model, checkpoint.input_vocab,
+                                                     checkpoint.output_vocab), examples)
+    int8_predictions, int8_latencies = run(Predictor(quantized.model, quantized.input_vocab,
+                                                     quantized.output_vocab), examples)
+    print("Comparison on %d examples of %s" % (len(examples), opt.dev_path))
+    report('fp32', checkpoint.model, fp32_predictions, fp32_latencies, examples)
+    report('int8', quantized.model, int8_predictions, int8_latencies, examples, reference=fp32_predictions)
@@ -1 +1,5 @@
-from .fields import SourceField, TargetField, HierarchialSourceField
+from .fields import SourceField, TargetField, HierarchialSourceField, build_joint_vocab
+from .vocabulary import CompactVocab
+from .shortlist import Shortlist
+from .tokenizer import Tokenizer
+from .length_predictor import LengthPredictor
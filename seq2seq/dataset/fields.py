@@ -7,11 +7,18 @@ from torchtext.data.dataset import Dataset
 
 from collections import Counter, OrderedDict
 
+from .vocabulary import CompactVocab
+
 class SourceField(torchtext.data.Field):
-    """ Wrapper class of torchtext.data.Field that forces batch_first and include_lengths to be True. """
+    """ Wrapper class of torchtext.data.Field that forces batch_first and include_lengths to be True.
+
+    Set `compact_vocab=True` to replace the vocabulary with a :class:`CompactVocab` once it is built.  Pass a
+    :class:`seq2seq.dataset.Tokenizer` as `tokenize` to split the text as the predictors given the same tokenizer.
+    """
 
     def __init__(self, **kwargs):
         logger = logging.getLogger(__name__)
+        self.compact_vocab = kwargs.pop('compact_vocab', False)
 
         if kwargs.get('batch_first') is False:
             logger.warning("Option batch_first has to be set to use pytorch-seq2seq.  Changed to True.")
@@ -22,13 +29,24 @@ class SourceField(torchtext.data.Field):
 
         super(SourceField, self).__init__(**kwargs)
 
+    def build_vocab(self, *args, **kwargs):
+        super(SourceField, self).build_vocab(*args, **kwargs)
+        if self.compact_vocab:
+            self.vocab = CompactVocab.from_vocab(self.vocab, self.unk_token)
+
 
 
 class HierarchialSourceField(torchtext.data.Field):
-    """ Wrapper class of torchtext.data.Field that forces batch_first and include_lengths to be True. """
+    """ Wrapper class of torchtext.data.Field that forces batch_first and include_lengths to be True.
+
+    Set `compact_vocab=True` to replace the vocabulary with a :class:`CompactVocab` once it is built.  Pass a
+    :class:`seq2seq.dataset.Tokenizer` as `tokenize` to split the text into chunks as the predictors given the same
+    tokenizer, the chunks are then split into sub-tokens at `|`.
+    """
 
     def __init__(self, **kwargs):
         logger = logging.getLogger(__name__)
+        self.compact_vocab = kwargs.pop('compact_vocab', False)
         #field_sep = kwargs.get('field_seperator')
         if kwargs.get('batch_first') is False:
             logger.warning("Option batch_first has to be set to use pytorch-seq2seq.  Changed to True.")
@@ -189,6 +207,8 @@ class HierarchialSourceField(torchtext.data.Field):
                             self.eos_token]
             if tok is not None))
         self.vocab = self.vocab_cls(counter, specials=specials, **kwargs)
+        if self.compact_vocab:
+            self.vocab = CompactVocab.from_vocab(self.vocab, self.unk_token)
 
 
 
@@ -201,9 +221,47 @@ class HierarchialSourceField(torchtext.data.Field):
         
 
 
+def build_joint_vocab(src_field, tgt_field, *args, **kwargs):
+    """
+    Builds one vocabulary over the sources and the targets and sets it as the vocabulary of both fields, so that
+    the encoder and the decoder can share their embeddings (see the `share_embeddings` option of
+    :class:`seq2seq.models.Seq2seq`).
+
+    Args:
+        src_field (SourceField): the source field
+        tgt_field (TargetField): the target field
+        *args: datasets or token sequences to count the tokens of, as for `torchtext.data.Field.build_vocab`
+        **kwargs: arguments of the vocabulary, e.g. `max_size` or `min_freq`
+    """
+    counter = Counter()
+    for arg in args:
+        if isinstance(arg, Dataset):
+            sources = [getattr(arg, name) for name, field in arg.fields.items()
+                       if field is src_field or field is tgt_field]
+        else:
+            sources = [arg]
+        for data in sources:
+            for x in data:
+                counter.update(x)
+
+    specials = list(OrderedDict.fromkeys(
+        tok for field in [src_field, tgt_field]
+        for tok in [field.unk_token, field.pad_token, field.init_token, field.eos_token]
+        if tok is not None))
+    vocab = tgt_field.vocab_cls(counter, specials=specials, **kwargs)
+    if src_field.compact_vocab or tgt_field.compact_vocab:
+        vocab = CompactVocab.from_vocab(vocab, tgt_field.unk_token)
+    src_field.vocab = vocab
+    tgt_field.vocab = vocab
+    tgt_field.sos_id = vocab.stoi[tgt_field.SYM_SOS]
+    tgt_field.eos_id = vocab.stoi[tgt_field.SYM_EOS]
+
+
 class TargetField(torchtext.data.Field):
     """ Wrapper class of torchtext.data.Field that forces batch_first to be True and prepend <sos> and append <eos> to sequences in preprocessing step.
 
+    Set `compact_vocab=True` to replace the vocabulary with a :class:`CompactVocab` once it is built.
+
     Attributes:
         sos_id: index of the start of sentence symbol
         eos_id: index of the end of sentence symbol
@@ -214,6 +272,7 @@ class TargetField(torchtext.data.Field):
 
     def __init__(self, **kwargs):
         logger = logging.getLogger(__name__)
+        self.compact_vocab = kwargs.pop('compact_vocab', False)
 
         if kwargs.get('batch_first') == False:
             logger.warning("Option batch_first has to be set to use pytorch-seq2seq.  Changed to True.")
@@ -230,5 +289,7 @@ class TargetField(torchtext.data.Field):
 
     def build_vocab(self, *args, **kwargs):
         super(TargetField, self).build_vocab(*args, **kwargs)
+        if self.compact_vocab:
+            self.vocab = CompactVocab.from_vocab(self.vocab, self.unk_token)
         self.sos_id = self.vocab.stoi[self.SYM_SOS]
         self.eos_id = self.vocab.stoi[self.SYM_EOS]
@@ -0,0 +1,98 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+
+import seq2seq
+from .fields import TargetField
+
+
+class LengthPredictor(object):
+    """
+    Maximum number of decoding steps of a source sequence given its length, so that the decoder stops short of
+    its `max_len` for short inputs, see the `max_lengths` argument of :class:`seq2seq.models.DecoderRNN` and
+    :class:`seq2seq.models.TopKDecoder`.
+
+    The cap of a source length is the `quantile` of the numbers of decoding steps (the target tokens and the end
+    of sentence symbol) of the training pairs whose sources have that length, plus `margin` steps.  The lengths
+    with fewer than `min_count` pairs are pooled with the next lengths, and the caps never decrease with the
+    source length.  Sources longer than all the training sources get the cap of the longest.
+
+    Args:
+        caps (numpy.ndarray): `caps[n]` is the maximum number of decoding steps of a source of `n` tokens
+
+    Examples::
+
+         >>> length_predictor = LengthPredictor.from_dataset(train, quantile=0.99)
+         >>> length_predictor.save('experiment/lengths.npz')
+         >>> predictor = Predictor(model, src.vocab, tgt.vocab,
+         ...                       length_predictor=LengthPredictor.load('experiment/lengths.npz'))
+    """
+
+    def __init__(self, caps):
+        self.caps = caps
+
+    @classmethod
+    def build(cls, pairs, quantile=0.99, margin=2, min_count=20):
+        """
+        Builds the caps from training pairs.
+        Args:
+            pairs (iterable of (list, list)): source and target tokens of the training pairs, without the start
+                and end of sentence symbols of the targets
+            quantile (float, optional): quantile of the target lengths of a source length (default: 0.99)
+            margin (int, optional): number of steps added to the quantiles (default: 2)
+            min_count (int, optional): minimum number of pairs the cap of a source length is computed from
+                (default: 20)
+        Returns:
+            LengthPredictor: the length predictor
+        """
+        steps = defaultdict(list)
+        for src_seq, tgt_seq in pairs:
+            # the decoder also emits the end of sentence symbol
+            steps[len(src_seq)].append(len(tgt_seq) + 1)
+        if not steps:
+            raise ValueError("Cannot build a length predictor without training pairs.")
+
+        caps = np.zeros(max(steps) + 1, dtype=np.int64)
+        start = 0
+        while start < len(caps):
+            # pool the next source lengths until there are enough pairs
+            end, pool = start, []
+            while end < len(caps) and (end == start or len(pool) < min_count):
+                pool.extend(steps.get(end, []))
+                end += 1
+            if pool:
+                pool.sort()
+                caps[start:end] = pool[max(0, int(math.ceil(quantile * len(pool))) - 1)] + margin
+            start = end
+        return cls(np.maximum.accumulate(caps))
+
+    @classmethod
+    def from_dataset(cls, dataset, quantile=0.99, margin=2, min_count=20):
+        """ Builds the caps from the examples of a dataset with `src` and `tgt` fields, see :meth:`build`. """
+        special = (TargetField.SYM_SOS, TargetField.SYM_EOS)
+        pairs = ((getattr(example, seq2seq.src_field_name),
+                  [tok for tok in getattr(example, seq2seq.tgt_field_name) if tok not in special])
+                 for example in dataset.examples)
+        return cls.build(pairs, quantile=quantile, margin=margin, min_count=min_count)
+
+    def max_lengths(self, src_lengths):
+        """
+        Returns the maximum numbers of decoding steps of source sequences.
+        Args:
+            src_lengths (iterable of int): lengths of the source sequences
+        Returns:
+            list: maximum number of decoding steps of every source sequence
+        """
+        src_lengths = np.minimum(np.asarray(list(src_lengths), dtype=np.int64), len(self.caps) - 1)
+        return self.caps[src_lengths].tolist()
+
+    def save(self, path):
+        """ Writes the caps to a `.npz` file. """
+        np.savez(path, caps=self.caps)
+
+    @classmethod
+    def load(cls, path):
+        """ Loads a length predictor written by :meth:`save`. """
+        with np.load(path) as data:
+            return cls(data['caps'])
@@ -0,0 +1,116 @@
+from collections import Counter, defaultdict
+
+import numpy as np
+
+import seq2seq
+from .vocabulary import CompactVocab
+
+
+def _flatten(tokens):
+    # sources of the hierarchial field are lists of chunks
+    for tok in tokens:
+        if isinstance(tok, (list, tuple)):
+            for sub_tok in tok:
+                yield sub_tok
+        else:
+            yield tok
+
+
+class Shortlist(object):
+    """
+    Candidate target words for decoding, so that the output layer of the decoder only scores a small part of the
+    vocabulary, see the `shortlist` argument of :class:`seq2seq.models.DecoderRNN`.
+
+    The candidates of a source sequence are the `n_frequent` first words of the target vocabulary (the special
+    tokens and the most frequent words, as the vocabularies built by the fields are sorted by frequency) and for
+    every source word the `n_aligned` target words most associated with it in the training pairs.  Source and
+    target words are associated by their Dice coefficient, `2 * c(s, t) / (c(s) + c(t))` where `c` counts the
+    pairs the words occur in.
+
+    Args:
+        n_frequent (int): number of most frequent target words that are always candidates
+        offsets (numpy.ndarray): `aligned[offsets[i]:offsets[i + 1]]` are the target ids aligned to source id `i`
+        aligned (numpy.ndarray): aligned target ids
+
+    Examples::
+
+         >>> shortlist = Shortlist.from_dataset(train, src.vocab, tgt.vocab, n_frequent=1000, n_aligned=20)
+         >>> shortlist.save('experiment/shortlist.npz')
+         >>> predictor = Predictor(model, src.vocab, tgt.vocab, shortlist=Shortlist.load('experiment/shortlist.npz'))
+    """
+
+    def __init__(self, n_frequent, offsets, aligned):
+        self.n_frequent = n_frequent
+        self.offsets = offsets
+        self.aligned = aligned
+
+    @classmethod
+    def build(cls, pairs, src_vocab, tgt_vocab, n_frequent=1000, n_aligned=20):
+        """
+        Builds a shortlist from training pairs.
+        Args:
+            pairs (iterable of (list, list)): source and target tokens of the training pairs
+            src_vocab (Vocabulary): vocabulary for the source language
+            tgt_vocab (Vocabulary): vocabulary for the target language
+            n_frequent (int, optional): number of most frequent target words to always include (default: 1000)
+            n_aligned (int, optional): number of aligned target words per source word (default: 20)
+        Returns:
+            Shortlist: the shortlist
+        """
+        # compact vocabularies do not grow when looking up unseen words
+        src_vocab = CompactVocab.from_vocab(src_vocab)
+        tgt_vocab = CompactVocab.from_vocab(tgt_vocab)
+        n_frequent = min(n_frequent, len(tgt_vocab.itos))
+        src_counts = Counter()
+        tgt_counts = Counter()
+        joint_counts = defaultdict(Counter)
+        for src_seq, tgt_seq in pairs:
+            src_ids = set(src_vocab.stoi[tok] for tok in _flatten(src_seq))
+            # frequent words are candidates anyway
+            tgt_ids = set(tgt_vocab.stoi[tok] for tok in tgt_seq)
+            tgt_ids = set(i for i in tgt_ids if i >= n_frequent)
+            src_counts.update(src_ids)
+            tgt_counts.update(tgt_ids)
+            for src_id in src_ids:
+                joint_counts[src_id].update(tgt_ids)
+
+        offsets = np.zeros(len(src_vocab.itos) + 1, dtype=np.int64)
+        aligned = []
+        for src_id in range(len(src_vocab.itos)):
+            scores = [(2. * count / (src_counts[src_id] + tgt_counts[tgt_id]), tgt_id)
+                      for tgt_id, count in joint_counts[src_id].items()]
+            scores.sort(key=lambda score: (-score[0], score[1]))
+            aligned.extend(sorted(tgt_id for _, tgt_id in scores[:n_aligned]))
+            offsets[src_id + 1] = len(aligned)
+        return cls(n_frequent, offsets, np.array(aligned, dtype=np.int64))
+
+    @classmethod
+    def from_dataset(cls, dataset, src_vocab, tgt_vocab, n_frequent=1000, n_aligned=20):
+        """ Builds a shortlist from the examples of a dataset with `src` and `tgt` fields, see :meth:`build`. """
+        pairs = ((getattr(example, seq2seq.src_field_name), getattr(example, seq2seq.tgt_field_name))
+                 for example in dataset.examples)
+        return cls.build(pairs, src_vocab, tgt_vocab, n_frequent=n_frequent, n_aligned=n_aligned)
+
+    def candidates(self, src_ids):
+        """
+        Returns the candidate target ids for source ids.
+        Args:
+            src_ids (iterable of int): ids of the source words, e.g. of all the sequences of a batch
+        Returns:
+            numpy.ndarray: sorted candidate target ids
+        """
+        src_ids = np.unique(np.asarray(src_ids, dtype=np.int64))
+        src_ids = src_ids[(src_ids >= 0) & (src_ids < len(self.offsets) - 1)]
+        aligned = [self.aligned[self.offsets[i]:self.offsets[i + 1]] for i in src_ids]
+        return np.union1d(np.arange(self.n_frequent, dtype=np.int64),
+                          np.concatenate(aligned) if aligned else np.zeros(0, dtype=np.int64))
+
+    def save(self, path):
+        """ Writes the shortlist to a `.npz` file. """
+        np.savez(path, n_frequent=np.array(self.n_frequent), offsets=self.offsets, aligned=self.aligned)
+
+    @classmethod
+    def load(cls, path):
+        """ Loads a shortlist written by :meth:`save`. """
+        with np.load(path) as data:
+            return cls(int(data['n_frequent']), data['offsets'], data['aligned'])
@@ -0,0 +1,166 @@
+import re
+import threading
+from collections import OrderedDict
+
+# the rules of the Treebank tokenizer of `nltk.word_tokenize`, which the Cornell data was preprocessed with
+STARTING_QUOTES = [
+    (re.compile(u'([«“‘„]|[`]+)'), r' \1 '),
+    (re.compile(r'^"'), r'``'),
+    (re.compile(r'(``)'), r' \1 '),
+    (re.compile(r'([ \(\[{<])("|\'{2})'), r'\1 `` '),
+    (re.compile(r"(?i)(')(?!re|ve|ll|m|t|s|d|n)(\w)\b"), r'\1 \2'),
+]
+
+PUNCTUATION = [
+    (re.compile(r'([^\.])(\.)([\]\)}>"\']*)\s*$'), r'\1 \2 \3 '),
+    (re.compile(r'([:,])([^\d])'), r' \1 \2'),
+    (re.compile(r'([:,])$'), r' \1 '),
+    (re.compile(r'\.{2,}'), r' \g<0> '),
+    (re.compile(r'[;@#$%&]'), r' \g<0> '),
+    (re.compile(r'([^\.])(\.)([\]\)}>"\']*)\s*$'), r'\1 \2\3 '),
+    (re.compile(r'[?!]'), r' \g<0> '),
+    (re.compile(r"([^'])' "), r"\1 ' "),
+    (re.compile(r'[*]'), r' \g<0> '),
+    (re.compile(r'[\]\[\(\)\{\}\<\>]'), r' \g<0> '),
+    (re.compile(r'--'), r' -- '),
+]
+
+ENDING_QUOTES = [
+    (re.compile(u'([»”’])'), r' \1 '),
+    (re.compile(r"''"), " '' "),
+    (re.compile(r'"'), " '' "),
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r'\1 \2 '),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r'\1 \2 '),
+]
+
+CONTRACTIONS = [
+    (re.compile(pattern), r' \1 \2 ') for pattern in [
+        r'(?i)\b(can)(?#X)(not)\b', r"(?i)\b(d)(?#X)('ye)\b", r'(?i)\b(gim)(?#X)(me)\b', r'(?i)\b(gon)(?#X)(na)\b',
+        r'(?i)\b(got)(?#X)(ta)\b', r'(?i)\b(lem)(?#X)(me)\b', r"(?i)\b(more)(?#X)('n)\b",
+        r'(?i)\b(wan)(?#X)(na)(?=\s)', r"(?i) ('t)(?#X)(is)\b", r"(?i) ('t)(?#X)(was)\b"]
+]
+
+# a period followed by a word that does not start in lower case ends a sentence, unless it ends an abbreviation
+SENTENCE_END = re.compile(r'\.[\]\)}>"\']*\s+(?=[^\sa-z])')
+ABBREVIATIONS = frozenset(['mr', 'mrs', 'ms', 'dr', 'st', 'jr', 'sr', 'prof', 'vs', 'etc', 'e.g', 'i.e', 'gen', 'col',
+                           'lt', 'sgt', 'capt', 'mt', 'no'])
+
+
+class Tokenizer(object):
+    """
+    Word tokenizer with the rules of `nltk.word_tokenize`, as compiled regular expressions: punctuation is split
+    from the words, quotes become ``` `` ``` and `''`, and contractions are split as in `do n't`, `ca n't` or
+    `he 's`.  Like `nltk.word_tokenize` the text is split into sentences first, at the periods followed by a word
+    that does not start in lower case, except after a single letter or a common abbreviation.
+
+    The tokens of the last `cache_size` distinct texts are cached, frequent utterances are only tokenized once.
+    A tokenizer is the `tokenize` option of :class:`seq2seq.dataset.SourceField` and
+    :class:`seq2seq.dataset.HierarchialSourceField`, and the `tokenizer` option of the predictors, so that training
+    and serving split the text the same way.
+
+    Args:
+        lowercase (bool, optional): lower cases the tokens (default: False)
+        cache_size (int, optional): number of texts whose tokens are cached, 0 disables the cache (default: 10000)
+
+    Attributes:
+        hits (int): number of texts whose tokens were cached
+        misses (int): number of texts tokenized
+
+    Examples::
+
+         >>> tokenizer = Tokenizer()
+         >>> tokenizer("I don't know, it's \\"fine\\".")
+         ['I', 'do', "n't", 'know', ',', 'it', "'s", '``', 'fine', "''", '.']
+    """
+
+    def __init__(self, lowercase=False, cache_size=10000):
+        self.lowercase = lowercase
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, text):
+        return self.tokenize(text)
+
+    def tokenize(self, text):
+        """
+        Splits a text into tokens.
+
+        Args:
+            text (str): text to tokenize
+
+        Returns:
+            list: list of tokens
+        """
+        if self.cache_size <= 0:
+            return self._tokenize(text)
+        with self._lock:
+            tokens = self._cache.get(text)
+            if tokens is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return list(tokens)
+        tokens = self._tokenize(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[text] = tuple(tokens)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def tokenize_batch(self, texts):
+        """
+        Splits texts into tokens.
+
+        Args:
+            texts (list): list of texts to tokenize
+
+        Returns:
+            list: list of the lists of tokens of `texts`
+        """
+        return [self.tokenize(text) for text in texts]
+
+    def __getstate__(self):
+        # the cache and its lock stay with the process
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _tokenize(self, text):
+        tokens = []
+        for sentence in self._sentences(text):
+            tokens.extend(self._tokenize_sentence(sentence))
+        if self.lowercase:
+            tokens = [tok.lower() for tok in tokens]
+        return tokens
+
+    def _sentences(self, text):
+        start = 0
+        for match in SENTENCE_END.finditer(text):
+            words = text[start:match.start()].split()
+            if words:
+                word = words[-1].lstrip('([{<"\'`').lower()
+                if len(word) <= 1 or word in ABBREVIATIONS:
+                    continue
+            yield text[start:match.end()]
+            start = match.end()
+        yield text[start:]
+
+    def _tokenize_sentence(self, text):
+        for regexp, substitution in STARTING_QUOTES:
+            text = regexp.sub(substitution, text)
+        for regexp, substitution in PUNCTUATION:
+            text = regexp.sub(substitution, text)
+        text = ' ' + text + ' '
+        for regexp, substitution in ENDING_QUOTES:
+            text = regexp.sub(substitution, text)
+        for regexp, substitution in CONTRACTIONS:
+            text = regexp.sub(substitution, text)
+        return text.split()
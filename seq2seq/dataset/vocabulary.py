@@ -0,0 +1,232 @@
+import zlib
+import struct
+
+import numpy as np
+
+
+def _hash(data):
+    # a hash that is stable across processes, unlike `hash()`, so that tables can be shared and persisted
+    return zlib.crc32(data) & 0xffffffff
+
+
+class _StringTable(object):
+    """ Read-only sequence of the tokens of a :class:`CompactVocab`, indexed by token id. """
+
+    def __init__(self, strings, offsets):
+        self._strings = strings
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+        return self._raw(index).decode('utf-8')
+
+    def _raw(self, index):
+        return self._strings[self._offsets[index]:self._offsets[index + 1]].tobytes()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class _StringIndex(object):
+    """
+    Read-only token to index mapping of a :class:`CompactVocab`.  Unlike the `defaultdict` of a torchtext
+    vocabulary, looking up an unseen token returns the unknown token index without inserting the token.
+    """
+
+    def __init__(self, table, itos, unk_index):
+        self._table = table
+        self._itos = itos
+        self._mask = len(table) - 1
+        self.unk_index = unk_index
+
+    def _find(self, token):
+        data = token.encode('utf-8')
+        slot = _hash(data) & self._mask
+        while True:
+            index = int(self._table[slot])
+            if index < 0:
+                return None
+            if self._itos._raw(index) == data:
+                return index
+            slot = (slot + 1) & self._mask
+
+    def __getitem__(self, token):
+        index = self._find(token)
+        return self.unk_index if index is None else index
+
+    def get(self, token, default=None):
+        index = self._find(token)
+        return default if index is None else index
+
+    def __contains__(self, token):
+        return self._find(token) is not None
+
+    def __len__(self):
+        return len(self._itos)
+
+    def __iter__(self):
+        return iter(self._itos)
+
+    def keys(self):
+        return list(self._itos)
+
+    def items(self):
+        return [(tok, i) for i, tok in enumerate(self._itos)]
+
+
+class CompactVocab(object):
+    """
+    An immutable vocabulary backed by flat arrays.
+
+    The tokens are stored as one UTF-8 string table with offsets, and the token to index lookup is an open
+    addressing hash table of token ids.  The whole vocabulary serializes to a single buffer which can be used
+    in place, e.g. memory-mapped from a file and shared by several processes.  It provides the `stoi` and
+    `itos` of a torchtext vocabulary, so it can be used by the fields, predictors and checkpoints.
+
+    Args:
+        itos (list of str): the tokens, in the order of their indices
+        unk_index (int, optional): index returned for tokens that are not in the vocabulary (default: 0)
+
+    Attributes:
+        stoi (mapping): token to index, unseen tokens map to `unk_index`
+        itos (sequence): index to token
+        unk_index (int): index returned for unseen tokens
+
+    Examples::
+
+         >>> vocab = CompactVocab.from_vocab(field.vocab)
+         >>> vocab.stoi['unseen-token'] == vocab.unk_index
+         True
+    """
+
+    MAGIC = b'S2SVOCB1'
+    _HEADER = struct.Struct('<8sqqq')
+
+    def __init__(self, itos=None, unk_index=0, _arrays=None):
+        if _arrays is None:
+            _arrays = self._build(itos)
+        strings, offsets, table = _arrays
+        self.unk_index = unk_index
+        self.itos = _StringTable(strings, offsets)
+        self.stoi = _StringIndex(table, self.itos, unk_index)
+
+    @staticmethod
+    def _build(itos):
+        encoded = [tok.encode('utf-8') for tok in itos]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(data) for data in encoded])
+        strings = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        table_size = 8
+        while table_size < 2 * len(encoded):
+            table_size *= 2
+        table = np.full(table_size, -1, dtype=np.int32)
+        mask = table_size - 1
+        for index, data in enumerate(encoded):
+            slot = _hash(data) & mask
+            while table[slot] >= 0:
+                if encoded[table[slot]] == data:
+                    break
+                slot = (slot + 1) & mask
+            if table[slot] < 0:
+                # the first occurrence of a duplicated token wins, as in torchtext
+                table[slot] = index
+        return strings, offsets, table
+
+    @classmethod
+    def from_vocab(cls, vocab, unk_token='<unk>'):
+        """
+        Creates a compact copy of a vocabulary.
+        Args:
+            vocab (torchtext.vocab.Vocab): vocabulary with `itos` and `stoi`
+            unk_token (str, optional): the unknown token (default: `<unk>`)
+        Returns:
+            CompactVocab: the compact vocabulary
+        """
+        if isinstance(vocab, CompactVocab):
+            return vocab
+        unk_index = vocab.stoi[unk_token] if unk_token in vocab.stoi else 0
+        return cls(list(vocab.itos), unk_index)
+
+    def __len__(self):
+        return len(self.itos)
+
+    def lookup(self, tokens):
+        """ Returns the indices of a list of tokens. """
+        return [self.stoi[tok] for tok in tokens]
+
+    def to_bytes(self):
+        """ Serializes the vocabulary into a buffer that :meth:`from_buffer` can use in place. """
+        strings, offsets, table = self.itos._strings, self.itos._offsets, self.stoi._table
+        header = self._HEADER.pack(self.MAGIC, len(offsets) - 1, len(table), self.unk_index)
+        # the table has at least 8 slots, so every section stays 8 byte aligned
+        return header + offsets.tobytes() + table.tobytes() + strings.tobytes()
+
+    @classmethod
+    def from_buffer(cls, buf):
+        """
+        Creates a vocabulary on top of a buffer written by :meth:`to_bytes` without copying it.
+        Args:
+            buf (bytes, memoryview or numpy.ndarray): the serialized vocabulary, e.g. a slice of a `numpy.memmap`
+        Returns:
+            CompactVocab: the vocabulary
+        """
+        buf = np.frombuffer(buf, dtype=np.uint8)
+        magic, size, table_size, unk_index = cls._HEADER.unpack(buf[:cls._HEADER.size].tobytes())
+        if magic != cls.MAGIC:
+            raise ValueError("Buffer does not contain a serialized vocabulary.")
+        start = cls._HEADER.size
+        offsets = buf[start:start + 8 * (size + 1)].view(np.int64)
+        start += 8 * (size + 1)
+        table = buf[start:start + 4 * table_size].view(np.int32)
+        start += 4 * table_size
+        strings = buf[start:start + int(offsets[-1])]
+        return cls(unk_index=int(unk_index), _arrays=(strings, offsets, table))
+
+    def save(self, path):
+        """ Writes the vocabulary to a file. """
+        with open(path, 'wb') as fout:
+            fout.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads a vocabulary written by :meth:`save`.
+        Args:
+            path (str): path of the file
+            mmap (bool, optional): map the file into memory instead of reading it (default: True)
+        Returns:
+            CompactVocab: the vocabulary
+        """
+        if mmap:
+            return cls.from_buffer(np.memmap(path, dtype=np.uint8, mode='r'))
+        with open(path, 'rb') as fin:
+            return cls.from_buffer(fin.read())
+
+    def __reduce__(self):
+        # pickle (and thus dill, torch.save and checkpoints) store the compact buffer
+        return (_from_bytes, (self.to_bytes(),))
+
+    def __eq__(self, other):
+        return isinstance(other, CompactVocab) and self.unk_index == other.unk_index and self.itos == other.itos
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def _from_bytes(data):
+    return CompactVocab.from_buffer(data)
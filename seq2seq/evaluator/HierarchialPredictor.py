@@ -1,9 +1,19 @@
+import time
+import threading
+
 import torch
 from torch.autograd import Variable
 
+from seq2seq.dataset.vocabulary import CompactVocab
+from seq2seq.models import TopKDecoder
+from seq2seq.util.precision import autocast
+from .deadline import deadline_decode
+from .streaming import stream_decode
+
 class HierarchialPredictor(object):
 
-    def __init__(self, model, src_vocab, tgt_vocab):
+    def __init__(self, model, src_vocab, tgt_vocab, use_bf16=False, shortlist=None, tokenizer=None,
+                 length_predictor=None, precompute_projections=False):
         """
         Predictor class to evaluate for a given model.
         Args:
@@ -11,26 +21,50 @@ class HierarchialPredictor(object):
                 using `seq2seq.util.checkpoint.load`
             src_vocab (seq2seq.dataset.vocabulary.Vocabulary): source sequence vocabulary
             tgt_vocab (seq2seq.dataset.vocabulary.Vocabulary): target sequence vocabulary
+            use_bf16 (bool, optional): run the model under bfloat16 autocast (default: False)
+            shortlist (seq2seq.dataset.shortlist.Shortlist, optional): only score the candidate target words of
+                every source sequence (default: None)
+            tokenizer (callable, optional): splits the source texts given as strings into tokens, e.g. a
+                :class:`seq2seq.dataset.Tokenizer` (default: None, split on whitespace)
+            length_predictor (seq2seq.dataset.length_predictor.LengthPredictor, optional): caps the number of
+                decoding steps of every source sequence given its length (default: None, the `max_len` of the
+                decoder)
+            precompute_projections (bool, optional): precompute the input projections of the decoder for its whole
+                vocabulary, see :meth:`seq2seq.models.DecoderRNN.precompute_input_projections` (default: False)
+
+        The vocabularies are converted to :class:`seq2seq.dataset.vocabulary.CompactVocab`, so that looking up
+        unseen tokens does not grow them.
         """
         if torch.cuda.is_available():
             self.model = model.cuda()
         else:
             self.model = model.cpu()
         self.model.eval()
-        self.src_vocab = src_vocab
-        self.tgt_vocab = tgt_vocab
+        if precompute_projections:
+            decoder = self.model.decoder
+            (decoder.rnn if isinstance(decoder, TopKDecoder) else decoder).precompute_input_projections()
+        self.src_vocab = CompactVocab.from_vocab(src_vocab)
+        self.tgt_vocab = CompactVocab.from_vocab(tgt_vocab)
+        self.use_bf16 = use_bf16
+        self.shortlist = shortlist
+        self.tokenizer = tokenizer
+        self.length_predictor = length_predictor
+        # running means of the durations of a decoding step, see :meth:`predict_with_deadline`
+        self._step_times = {}
+        self._step_lock = threading.Lock()
 
 
     def predict(self, src_seq):
         """ Make prediction given `src_seq` as input.
 
         Args:
-            src_seq (list): list of tokens in source language
+            src_seq (list or str): list of tokens in source language, or a text split by :meth:`tokenize`
 
         Returns:
             tgt_seq (list): list of tokens in target language as predicted
             by the pre-trained model
         """
+        src_seq = self.tokenize(src_seq)
 
         seq = [x.split('|') for x in src_seq]
         max_len = max(len(x) for x in seq)
@@ -42,9 +76,129 @@ class HierarchialPredictor(object):
         if torch.cuda.is_available():
             src_id_seq = src_id_seq.cuda()
             chunk_lengths = chunk_lengths.cuda()
-        softmax_list, _, other = self.model(src_id_seq, [len(padded_seq)], chunk_lengths)
+        shortlist = self._shortlist(src_id_seq)
+        with autocast(self.use_bf16):
+            softmax_list, _, other = self.model(src_id_seq, [len(padded_seq)], chunk_lengths, shortlist=shortlist,
+                                                 max_lengths=self._max_lengths([len(padded_seq)]))
         length = other['length'][0]
 
         tgt_id_seq = [other['sequence'][di][0].data[0] for di in range(length)]
         tgt_seq = [self.tgt_vocab.itos[tok] for tok in tgt_id_seq]
         return tgt_seq
+
+    def predict_stream(self, src_seq):
+        """ Make prediction given `src_seq` as input, yielding the target tokens as they are decoded.
+
+        The tokens are those returned by :meth:`predict`, see :func:`seq2seq.evaluator.streaming.stream_decode`.
+
+        Args:
+            src_seq (list or str): list of chunks of sub-tokens separated by `|`, or a text split by
+                :meth:`tokenize`
+
+        Yields:
+            str: tokens in target language
+        """
+        src_id_seq, lengths, chunk_lengths = self._batch_input([src_seq])
+        with torch.no_grad(), autocast(self.use_bf16):
+            encoder_outputs, encoder_hidden, encoder_mask = self.model.encode(src_id_seq, lengths, chunk_lengths)
+        for tok in stream_decode(self.model.decoder, encoder_outputs, encoder_hidden, encoder_mask,
+                                 function=self.model.decode_function, shortlist=self._shortlist(src_id_seq),
+                                 use_bf16=self.use_bf16, max_lengths=self._max_lengths(lengths)):
+            yield self.tgt_vocab.itos[tok]
+
+    def predict_with_deadline(self, src_seq, budget):
+        """ Make prediction given `src_seq` as input within a latency budget.
+
+        The beam search of a `TopKDecoder` falls back to greedy decoding when it is not expected to fit in the
+        time left after encoding, and the decoding stops before the step expected to exceed the budget, returning
+        the best hypothesis so far, see :func:`seq2seq.evaluator.deadline.deadline_decode`.
+
+        Args:
+            src_seq (list or str): list of chunks of sub-tokens separated by `|`, or a text split by
+                :meth:`tokenize`
+            budget (float): time in seconds the prediction has to end within
+
+        Returns: tgt_seq, truncated
+            - **tgt_seq** (list): list of tokens in target language as predicted by the pre-trained model
+            - **truncated** (bool): whether the budget stopped the decoding before the end of the sequence
+        """
+        deadline = time.monotonic() + budget
+        src_id_seq, lengths, chunk_lengths = self._batch_input([src_seq])
+        with torch.no_grad(), autocast(self.use_bf16):
+            encoder_outputs, encoder_hidden, encoder_mask = self.model.encode(src_id_seq, lengths, chunk_lengths)
+        symbols, truncated = deadline_decode(self.model.decoder, encoder_outputs, encoder_hidden, deadline,
+                                             self._step_times, encoder_mask, function=self.model.decode_function,
+                                             shortlist=self._shortlist(src_id_seq), use_bf16=self.use_bf16,
+                                             max_lengths=self._max_lengths(lengths), lock=self._step_lock)
+        return [self.tgt_vocab.itos[tok] for tok in symbols], truncated
+
+    def predict_batch(self, src_seqs):
+        """ Make predictions for a batch of source sequences with one forward pass of the model.
+
+        The chunks and the sequences are padded like the fields pad them, the padding is masked from the attention
+        of the hierarchial RNN and of the decoder so the predictions are those of :meth:`predict` for models whose
+        `EncoderRNN` and `HierarchialRNN` are built with `variable_lengths`.
+
+        Args:
+            src_seqs (list): list of source sequences, each a list of chunks of sub-tokens separated by `|` or
+                a text
+
+        Returns:
+            tgt_seqs (list): list of predicted sequences of tokens in target language, in the order of `src_seqs`
+        """
+        src_id_seq, lengths, chunk_lengths = self._batch_input(src_seqs)
+        shortlist = self._shortlist(src_id_seq)
+        with torch.no_grad(), autocast(self.use_bf16):
+            _, _, other = self.model(src_id_seq, lengths, chunk_lengths, shortlist=shortlist,
+                                     max_lengths=self._max_lengths(lengths))
+
+        symbols = torch.cat(other['sequence'], 1).cpu()
+        return [[self.tgt_vocab.itos[tok] for tok in symbols[i, :other['length'][i]].tolist()]
+                for i in range(len(src_seqs))]
+
+    def encode_batch(self, src_seqs):
+        """
+        Encodes a batch of source sequences, see :meth:`seq2seq.models.HSeq2seq.encode`.
+
+        Args:
+            src_seqs (list): list of source sequences, each a list of chunks of sub-tokens separated by `|` or
+                a text
+
+        Returns: encoder_outputs, encoder_hidden, encoder_mask
+            the outputs of :meth:`seq2seq.models.HSeq2seq.encode`, in the order of `src_seqs`
+        """
+        src_id_seq, lengths, chunk_lengths = self._batch_input(src_seqs)
+        with torch.no_grad(), autocast(self.use_bf16):
+            return self.model.encode(src_id_seq, lengths, chunk_lengths)
+
+    def _batch_input(self, src_seqs):
+        seqs = [[x.split('|') for x in self.tokenize(src_seq)] for src_seq in src_seqs]
+        max_len = max(len(x) for seq in seqs for x in seq)
+        max_seq_len = max(len(seq) for seq in seqs)
+        padded_seqs = [[x + ['<cpad>'] * (max_len - len(x)) for x in seq] +
+                       [['<cpad>'] * max_len] * (max_seq_len - len(seq)) for seq in seqs]
+        # padded chunks are encoded as a single padding token
+        chunk_lengths = torch.LongTensor([[len(x) for x in seq] + [1] * (max_seq_len - len(seq)) for seq in seqs])
+        src_id_seq = torch.LongTensor([[[self.src_vocab.stoi[tok] for tok in x] for x in seq] for seq in padded_seqs])
+
+        if torch.cuda.is_available():
+            src_id_seq = src_id_seq.cuda()
+            chunk_lengths = chunk_lengths.cuda()
+        return src_id_seq, [len(seq) for seq in seqs], chunk_lengths
+
+    def tokenize(self, src_seq):
+        """ Returns the tokens of a source text, split by the `tokenizer` or on whitespace, a list of tokens is
+        returned as it is. """
+        if not isinstance(src_seq, str):
+            return src_seq
+        return self.tokenizer(src_seq) if self.tokenizer is not None else src_seq.split()
+
+    def _max_lengths(self, lengths):
+        if self.length_predictor is None:
+            return None
+        return self.length_predictor.max_lengths(lengths)
+
+    def _shortlist(self, src_id_seq):
+        if self.shortlist is None:
+            return None
+        return torch.from_numpy(self.shortlist.candidates(src_id_seq.data.cpu().view(-1).numpy()))
@@ -2,3 +2,9 @@ from .evaluator import Evaluator
 from .plain_evaluator import Evaluator as PlainEvaluator
 from .predictor import Predictor
 from .HierarchialPredictor import HierarchialPredictor
+from .traced_predictor import TracedPredictor
+from .threaded_predictor import ThreadedPredictor
+from .cached_predictor import CachedPredictor
+from .streaming import stream_decode
+from .deadline import deadline_decode
+from .batch_inference import BatchInference
@@ -0,0 +1,191 @@
+import os
+import json
+import hashlib
+import logging
+import itertools
+import multiprocessing
+
+import torch
+
+# state of the worker processes, set by `_init_worker`
+_worker = {}
+
+
+def _init_worker(predictor, threads, batch_size, tokenize):
+    if threads is not None:
+        torch.set_num_threads(threads)
+    _worker.update(predictor=predictor, batch_size=batch_size, tokenize=tokenize)
+
+
+def _predict_shard(lines):
+    """ Predicts the source column of the lines of a shard, `None` for the lines without a source. """
+    predictor, batch_size, tokenize = _worker['predictor'], _worker['batch_size'], _worker['tokenize']
+    srcs = [line.split('\t')[0].strip() for line in lines]
+    # identical sources are predicted once, and batched with sources of similar lengths
+    unique = dict((src, tokenize(src)) for src in srcs if src)
+    order = sorted(unique, key=lambda src: len(unique[src]))
+    predictions = {}
+    with torch.no_grad():
+        for i in range(0, len(order), batch_size):
+            batch = order[i:i + batch_size]
+            for src, tgt_seq in zip(batch, predictor.predict_batch([unique[src] for src in batch])):
+                if tgt_seq and tgt_seq[-1] == '<eos>':
+                    tgt_seq = tgt_seq[:-1]
+                predictions[src] = ' '.join(tgt_seq)
+    return [predictions[src] if src else None for src in srcs]
+
+
+def _digest(prediction):
+    return hashlib.md5(prediction.encode('utf-8')).digest()
+
+
+class BatchInference(object):
+    """
+    Offline prediction of a file of source sequences, one per line, on a pool of worker processes.
+
+    The lines are read in shards of `shard_size` lines, and the workers predict the shards with
+    `predictor.predict_batch` in batches of `batch_size` sources of similar lengths, identical sources of a shard
+    being predicted once.  The source is the first tab separated column of a line, e.g. of the tsv files of the
+    examples, lines without a source are skipped.  Every predicted line is written to the output as the input line
+    followed by a tab and the prediction, in the order of the input.
+
+    After every shard the output is flushed, and the number of input lines done and the size of the output are
+    recorded in a progress marker, `out_path + '.progress'`.  A run finding a marker resumes from it, dropping the
+    output written after it, and the marker is removed once the whole input is done.
+
+    The workers are forked where possible, so that they share the weights of the model with the parent process
+    copy-on-write instead of unpickling a copy each.  Prediction must not run in the parent before, the thread pool
+    of torch does not survive a fork.  Batched predictions are those of `predictor.predict` for models whose
+    encoders use `variable_lengths`.
+
+    Args:
+        predictor (Predictor or HierarchialPredictor): predictor of the model
+        workers (int, optional): number of worker processes, 1 predicts in the calling process (default: 1)
+        threads_per_worker (int, optional): number of torch threads of a worker process (default: None, the
+            cores shared among the workers)
+        shard_size (int, optional): number of lines of a shard (default: 1000)
+        batch_size (int, optional): number of sources predicted together (default: 64)
+        tokenize (callable, optional): splits a source into tokens, must be picklable, e.g. a
+            :class:`seq2seq.dataset.Tokenizer` (default: `predictor.tokenize`)
+        dedupe (bool, optional): skips the lines whose prediction was written already (default: False)
+
+    Examples::
+
+         >>> inference = BatchInference(Predictor(model, src_vocab, tgt_vocab), workers=8)
+         >>> inference.run('data/test.tsv', 'predictions.tsv')
+    """
+
+    def __init__(self, predictor, workers=1, threads_per_worker=None, shard_size=1000, batch_size=64, tokenize=None,
+                 dedupe=False):
+        self.predictor = predictor
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        self.tokenize = tokenize if tokenize is not None else predictor.tokenize
+        self.dedupe = dedupe
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def progress_path(out_path):
+        """ Returns the path of the progress marker of an output file. """
+        return out_path + '.progress'
+
+    def run(self, src_path, out_path, restart=False):
+        """
+        Predicts the lines of `src_path` into `out_path`, resuming from the progress marker of a previous run.
+
+        Args:
+            src_path (str): path of the input file
+            out_path (str): path of the output file
+            restart (bool, optional): ignores the progress marker and starts over (default: False)
+
+        Returns:
+            dict: the number of input lines done, of predicted lines written and of duplicate predictions skipped
+        """
+        marker = self.progress_path(out_path)
+        progress = {'lines': 0, 'bytes': 0, 'written': 0, 'duplicates': 0}
+        if not restart and os.path.exists(marker) and os.path.exists(out_path):
+            with open(marker) as f:
+                progress = json.load(f)
+            self.logger.info("Resuming after line %d of %s", progress['lines'], src_path)
+
+        seen = set()
+        out = open(out_path, 'r+b' if progress['bytes'] else 'w+b')
+        try:
+            out.truncate(progress['bytes'])
+            if self.dedupe:
+                for line in out:
+                    seen.add(_digest(line.decode('utf-8').rstrip('\n').rsplit('\t', 1)[-1]))
+            out.seek(progress['bytes'])
+
+            for lines, predictions in self._predict(src_path, progress['lines']):
+                for line, prediction in zip(lines, predictions):
+                    if prediction is None:
+                        continue
+                    if self.dedupe:
+                        digest = _digest(prediction)
+                        if digest in seen:
+                            progress['duplicates'] += 1
+                            continue
+                        seen.add(digest)
+                    out.write((line + '\t' + prediction + '\n').encode('utf-8'))
+                    progress['written'] += 1
+                out.flush()
+                os.fsync(out.fileno())
+                progress['lines'] += len(lines)
+                progress['bytes'] = out.tell()
+                self._save_progress(marker, progress)
+                self.logger.info("Predicted %d lines", progress['lines'])
+        finally:
+            out.close()
+        if os.path.exists(marker):
+            os.remove(marker)
+        return dict((key, progress[key]) for key in ('lines', 'written', 'duplicates'))
+
+    def _shards(self, src_path, skip):
+        with open(src_path, encoding='utf-8') as f:
+            lines = (line.rstrip('\r\n') for line in itertools.islice(f, skip, None))
+            while True:
+                shard = list(itertools.islice(lines, self.shard_size))
+                if not shard:
+                    return
+                yield shard
+
+    def _predict(self, src_path, skip):
+        """ Yields the lines of the shards after the first `skip` lines with their predictions, in order. """
+        shards = self._shards(src_path, skip)
+        if self.workers <= 1:
+            _init_worker(self.predictor, None, self.batch_size, self.tokenize)
+            try:
+                for shard in shards:
+                    yield shard, _predict_shard(shard)
+            finally:
+                _worker.clear()
+            return
+
+        threads = self.threads_per_worker
+        if threads is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+        initargs = (self.predictor, threads, self.batch_size, self.tokenize)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        pool = context.Pool(self.workers, initializer=_init_worker, initargs=initargs)
+        try:
+            while True:
+                # a bounded window of shards is read ahead, the input is not loaded at once
+                window = list(itertools.islice(shards, 4 * self.workers))
+                if not window:
+                    break
+                for shard, predictions in zip(window, pool.imap(_predict_shard, window)):
+                    yield shard, predictions
+        finally:
+            pool.terminate()
+            pool.join()
+
+    @staticmethod
+    def _save_progress(marker, progress):
+        tmp_path = marker + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, marker)
@@ -0,0 +1,195 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from seq2seq.models import TopKDecoder
+from .HierarchialPredictor import HierarchialPredictor
+
+
+class CachedPredictor(object):
+    """
+    LRU cache of predictions in front of a `Predictor` or `HierarchialPredictor`.
+
+    Predictions are keyed by the token ids of the source sequence, so that tokens mapping to the same ids share
+    an entry, and by the decoding configuration of the model: the beam size, the maximum output length, bfloat16
+    autocast, the shortlist and the length predictor, so that changing them does not return stale predictions.
+    Entries expire after `ttl` seconds, and the least recently used ones are evicted beyond `max_entries` entries
+    or an estimate of `max_bytes` bytes.
+
+    Concurrent requests for a sequence being predicted wait for that prediction instead of computing it again,
+    and the misses of a batch are predicted together by `predict_batch` of the predictor.  The other attributes
+    of the predictor, e.g. `model` or `predict_stream`, are those of the wrapped predictor.
+
+    Args:
+        predictor (Predictor or HierarchialPredictor): predictor computing the missing predictions
+        max_entries (int, optional): maximum number of cached predictions (default: 10000)
+        max_bytes (int, optional): maximum estimated size of the cached predictions in bytes (default: 64 MiB)
+        ttl (float, optional): time in seconds a prediction is cached for (default: None, until evicted)
+
+    Attributes:
+        hits (int): number of requests answered from the cache
+        misses (int): number of requests predicted
+        coalesced (int): number of requests that waited for the same prediction of a concurrent request
+        evictions (int): number of entries evicted to respect the limits
+        expirations (int): number of entries dropped after `ttl`
+
+    Examples::
+
+         >>> predictor = CachedPredictor(Predictor(model, src_vocab, tgt_vocab), max_entries=1000, ttl=3600)
+         >>> predictor.predict("1 3 5 7 9".split())
+         >>> predictor.stats()['hits']
+    """
+
+    def __init__(self, predictor, max_entries=10000, max_bytes=64 << 20, ttl=None):
+        self.predictor = predictor
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # only called for the attributes the cache does not define
+        if name == 'predictor':
+            raise AttributeError(name)
+        return getattr(self.predictor, name)
+
+    def predict(self, src_seq):
+        """ Make prediction given `src_seq` as input, see `Predictor.predict`. """
+        return self.predict_batch([src_seq])[0]
+
+    def predict_batch(self, src_seqs):
+        """
+        Make predictions for a batch of source sequences, predicting the missing ones with one call of
+        `predict_batch` of the predictor.
+
+        Args:
+            src_seqs (list): list of source sequences
+
+        Returns:
+            tgt_seqs (list): list of predicted sequences of tokens in target language, in the order of `src_seqs`
+        """
+        src_seqs = [self.predictor.tokenize(src_seq) for src_seq in src_seqs]
+        config = self._config()
+        keys = [(config, self._ids(src_seq)) for src_seq in src_seqs]
+        results = [None] * len(src_seqs)
+        waiting = []
+        computing = OrderedDict()
+        with self._lock:
+            now = time.monotonic()
+            for i, key in enumerate(keys):
+                value = self._get(key, now)
+                if value is not None:
+                    self.hits += 1
+                    results[i] = value
+                elif key in computing:
+                    # repeated in the batch
+                    self.coalesced += 1
+                    waiting.append((i, computing[key]))
+                elif key in self._pending:
+                    self.coalesced += 1
+                    waiting.append((i, self._pending[key]))
+                else:
+                    self.misses += 1
+                    future = Future()
+                    self._pending[key] = future
+                    computing[key] = future
+                    waiting.append((i, future))
+
+        if computing:
+            first = dict((key, i) for i, key in reversed(list(enumerate(keys))))
+            try:
+                tgt_seqs = self.predictor.predict_batch([src_seqs[first[key]] for key in computing])
+            except Exception as e:
+                with self._lock:
+                    for key, future in computing.items():
+                        del self._pending[key]
+                        future.set_exception(e)
+                raise
+            with self._lock:
+                now = time.monotonic()
+                for (key, future), tgt_seq in zip(computing.items(), tgt_seqs):
+                    del self._pending[key]
+                    self._put(key, tgt_seq, now)
+                    future.set_result(tgt_seq)
+
+        for i, future in waiting:
+            results[i] = future.result()
+        # callers may modify their predictions
+        return [list(tgt_seq) for tgt_seq in results]
+
+    def clear(self):
+        """ Drops the cached predictions. """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """ Returns the counters of the cache, its hit rate, number of entries and estimated size in bytes. """
+        with self._lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced,
+                    'hit_rate': float(self.hits + self.coalesced) / requests if requests else 0.0,
+                    'evictions': self.evictions, 'expirations': self.expirations,
+                    'entries': len(self._entries), 'bytes': self._bytes}
+
+    def _config(self):
+        decoder = self.predictor.model.decoder
+        if isinstance(decoder, TopKDecoder):
+            k, max_length = decoder.k, decoder.rnn.max_length
+        else:
+            k, max_length = 1, decoder.max_length
+        return (k, max_length, self.predictor.use_bf16, id(self.predictor.shortlist),
+                id(self.predictor.length_predictor))
+
+    def _ids(self, src_seq):
+        stoi = self.predictor.src_vocab.stoi
+        if isinstance(self.predictor, HierarchialPredictor):
+            return tuple(tuple(stoi[tok] for tok in chunk.split('|')) for chunk in src_seq)
+        return tuple(stoi[tok] for tok in src_seq)
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires, size = entry
+        if expires is not None and expires <= now:
+            del self._entries[key]
+            self._bytes -= size
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value, now):
+        size = _size(key, value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[2]
+        expires = now + self.ttl if self.ttl is not None else None
+        self._entries[key] = (tuple(value), expires, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+            self.evictions += 1
+
+
+def _size(key, value):
+    """ Estimates the bytes held by a cache entry: the ids of its key and the tokens of its prediction. """
+    _, ids = key
+    size = sys.getsizeof(ids) + sys.getsizeof(value)
+    for chunk in ids:
+        if isinstance(chunk, tuple):
+            size += sys.getsizeof(chunk)
+    return size + sum(sys.getsizeof(tok) for tok in value)
@@ -0,0 +1,76 @@
+import time
+import threading
+
+import torch
+import torch.nn.functional as F
+
+from seq2seq.models import TopKDecoder
+from seq2seq.util.precision import autocast
+
+# weight of the last decoding in the running means of the durations of a step
+SMOOTHING = 0.2
+
+
+def deadline_decode(decoder, encoder_outputs, encoder_hidden, deadline, step_times, encoder_mask=None,
+                    function=F.log_softmax, shortlist=None, use_bf16=False, max_lengths=None, lock=None):
+    """
+    Decodes one encoded source sequence before a deadline.
+
+    A `TopKDecoder` falls back to the greedy search of its `DecoderRNN` when the beam search of `max_len` steps, or
+    of the maximum length of the sequence, is not expected to end before the deadline, from the mean duration of its
+    steps in the previous calls.  Either search stops before the first step expected to end after the deadline,
+    and returns its best hypothesis so far.  Every greedy fallback moves the mean duration of a beam step towards
+    `k` times that of a greedy step, so that the beam search is tried again once it is expected to fit.
+
+    Args:
+        decoder (DecoderRNN or TopKDecoder): decoder of the model
+        encoder_outputs (1, input_len, hidden_size): outputs of the encoder
+        encoder_hidden (num_layers * num_directions, 1, hidden_size): hidden state of the encoder
+        deadline (float): `time.monotonic()` value the decoding has to end by
+        step_times (dict): running means of the durations of a step of the beam and of the greedy searches,
+            updated with the duration of this decoding, kept by the caller from one call to the next
+        encoder_mask (1, input_len), optional: byte tensor marking the padded positions of `encoder_outputs`
+        function (torch.nn.Module, optional): decoding function of the model (default: `F.log_softmax`)
+        shortlist (torch.LongTensor, optional): sorted ids of the candidate target words (default: None)
+        use_bf16 (bool, optional): run the decoder under bfloat16 autocast (default: False)
+        max_lengths (list, optional): maximum number of decoding steps of the sequence, as a list of one value
+            (default: None, the `max_len` of the decoder)
+        lock (threading.Lock, optional): lock guarding `step_times`, for callers decoding from several threads
+            (default: None)
+
+    Returns: symbols, truncated
+        - **symbols** (list): target symbols, with the `<eos>` symbol when it was decoded
+        - **truncated** (bool): whether the deadline stopped the decoding before the end of the sequence
+    """
+    if lock is None:
+        lock = threading.Lock()
+    search, k = 'greedy', None
+    if isinstance(decoder, TopKDecoder):
+        k = decoder.k
+        with lock:
+            beam_time = step_times.get('beam')
+        max_length = decoder.rnn.max_length if max_lengths is None else min(decoder.rnn.max_length, max_lengths[0])
+        if beam_time is None or time.monotonic() + beam_time * max_length <= deadline:
+            search = 'beam'
+        else:
+            decoder = decoder.rnn
+
+    start = time.monotonic()
+    with torch.no_grad(), autocast(use_bf16):
+        _, _, other = decoder(None, encoder_hidden, encoder_outputs, function=function, shortlist=shortlist,
+                              encoder_mask=encoder_mask, deadline=deadline, max_lengths=max_lengths)
+    steps = len(other['sequence'])
+    if steps:
+        step_time = (time.monotonic() - start) / steps
+        with lock:
+            _update(step_times, search, step_time)
+            if search == 'greedy' and k is not None:
+                _update(step_times, 'beam', k * step_times['greedy'])
+
+    symbols = torch.cat(other['sequence'], 1)[0, :other['length'][0]].tolist()
+    return symbols, other['truncated'][0]
+
+
+def _update(step_times, search, step_time):
+    mean = step_times.get(search)
+    step_times[search] = step_time if mean is None else (1 - SMOOTHING) * mean + SMOOTHING * step_time
@@ -5,6 +5,7 @@ import torchtext
 
 import seq2seq
 from seq2seq.loss import NLLLoss
+from seq2seq.util.precision import autocast
 
 class Evaluator(object):
     """ Class to evaluate models with given datasets.
@@ -12,11 +13,14 @@ class Evaluator(object):
     Args:
         loss (seq2seq.loss, optional): loss for evaluator (default: seq2seq.loss.NLLLoss)
         batch_size (int, optional): batch size for evaluator (default: 64)
+        use_bf16 (bool, optional): run the model under bfloat16 autocast, the loss is accumulated in fp32
+            (default: False)
     """
 
-    def __init__(self, loss=NLLLoss(), batch_size=64):
+    def __init__(self, loss=NLLLoss(), batch_size=64, use_bf16=False):
         self.loss = loss
         self.batch_size = batch_size
+        self.use_bf16 = use_bf16
 
     def evaluate(self, model, data):
         """ Evaluate a model on given dataset and return performance.
@@ -47,7 +51,8 @@ class Evaluator(object):
             input_variables, input_lengths, chunk_lengths  = getattr(batch, seq2seq.src_field_name)
             target_variables = getattr(batch, seq2seq.tgt_field_name)
 
-            decoder_outputs, decoder_hidden, other = model(input_variables, input_lengths.tolist(), chunk_lengths, target_variables)
+            with autocast(self.use_bf16):
+                decoder_outputs, decoder_hidden, other = model(input_variables, input_lengths.tolist(), chunk_lengths, target_variables)
 
             # Evaluation
             seqlist = other['sequence']
@@ -1,9 +1,19 @@
+import time
+import threading
+
 import torch
 from torch.autograd import Variable
 
+from seq2seq.dataset.vocabulary import CompactVocab
+from seq2seq.models import TopKDecoder
+from seq2seq.util.precision import autocast
+from .deadline import deadline_decode
+from .streaming import stream_decode
+
 class Predictor(object):
 
-    def __init__(self, model, src_vocab, tgt_vocab):
+    def __init__(self, model, src_vocab, tgt_vocab, use_bf16=False, shortlist=None, tokenizer=None,
+                 length_predictor=None, precompute_projections=False):
         """
         Predictor class to evaluate for a given model.
         Args:
@@ -11,34 +21,180 @@ class Predictor(object):
                 using `seq2seq.util.checkpoint.load`
             src_vocab (seq2seq.dataset.vocabulary.Vocabulary): source sequence vocabulary
             tgt_vocab (seq2seq.dataset.vocabulary.Vocabulary): target sequence vocabulary
+            use_bf16 (bool, optional): run the model under bfloat16 autocast (default: False)
+            shortlist (seq2seq.dataset.shortlist.Shortlist, optional): only score the candidate target words of
+                every source sequence (default: None)
+            tokenizer (callable, optional): splits the source texts given as strings into tokens, e.g. a
+                :class:`seq2seq.dataset.Tokenizer` (default: None, split on whitespace)
+            length_predictor (seq2seq.dataset.length_predictor.LengthPredictor, optional): caps the number of
+                decoding steps of every source sequence given its length (default: None, the `max_len` of the
+                decoder)
+            precompute_projections (bool, optional): precompute the input projections of the decoder for its whole
+                vocabulary, see :meth:`seq2seq.models.DecoderRNN.precompute_input_projections` (default: False)
+
+        The vocabularies are converted to :class:`seq2seq.dataset.vocabulary.CompactVocab`, so that looking up
+        unseen tokens does not grow them.
         """
         if torch.cuda.is_available():
             self.model = model.cuda()
         else:
             self.model = model.cpu()
         self.model.eval()
-        self.src_vocab = src_vocab
-        self.tgt_vocab = tgt_vocab
+        if precompute_projections:
+            decoder = self.model.decoder
+            (decoder.rnn if isinstance(decoder, TopKDecoder) else decoder).precompute_input_projections()
+        self.src_vocab = CompactVocab.from_vocab(src_vocab)
+        self.tgt_vocab = CompactVocab.from_vocab(tgt_vocab)
+        self.use_bf16 = use_bf16
+        self.shortlist = shortlist
+        self.tokenizer = tokenizer
+        self.length_predictor = length_predictor
+        # running means of the durations of a decoding step, see :meth:`predict_with_deadline`
+        self._step_times = {}
+        self._step_lock = threading.Lock()
 
 
     def predict(self, src_seq):
         """ Make prediction given `src_seq` as input.
 
         Args:
-            src_seq (list): list of tokens in source language
+            src_seq (list or str): list of tokens in source language, or a text split by :meth:`tokenize`
 
         Returns:
             tgt_seq (list): list of tokens in target language as predicted
             by the pre-trained model
         """
+        src_seq = self.tokenize(src_seq)
         src_id_seq = Variable(torch.LongTensor([self.src_vocab.stoi[tok] for tok in src_seq]),
                               volatile=True).view(1, -1)
         if torch.cuda.is_available():
             src_id_seq = src_id_seq.cuda()
 
-        softmax_list, _, other = self.model(src_id_seq, [len(src_seq)])
+        shortlist = self._shortlist(src_id_seq)
+        with autocast(self.use_bf16):
+            softmax_list, _, other = self.model(src_id_seq, [len(src_seq)], shortlist=shortlist,
+                                                 max_lengths=self._max_lengths([len(src_seq)]))
         length = other['length'][0]
 
         tgt_id_seq = [other['sequence'][di][0].data[0] for di in range(length)]
         tgt_seq = [self.tgt_vocab.itos[tok] for tok in tgt_id_seq]
         return tgt_seq
+
+    def predict_stream(self, src_seq):
+        """ Make prediction given `src_seq` as input, yielding the target tokens as they are decoded.
+
+        The tokens are those returned by :meth:`predict`, see :func:`seq2seq.evaluator.streaming.stream_decode`.
+
+        Args:
+            src_seq (list or str): list of tokens in source language, or a text split by :meth:`tokenize`
+
+        Yields:
+            str: tokens in target language
+        """
+        _, src_id_seq, lengths = self._batch_input([src_seq])
+        with torch.no_grad(), autocast(self.use_bf16):
+            encoder_outputs, encoder_hidden, encoder_mask = self.model.encode(src_id_seq, lengths)
+        for tok in stream_decode(self.model.decoder, encoder_outputs, encoder_hidden, encoder_mask,
+                                 function=self.model.decode_function, shortlist=self._shortlist(src_id_seq),
+                                 use_bf16=self.use_bf16, max_lengths=self._max_lengths(lengths)):
+            yield self.tgt_vocab.itos[tok]
+
+    def predict_with_deadline(self, src_seq, budget):
+        """ Make prediction given `src_seq` as input within a latency budget.
+
+        The beam search of a `TopKDecoder` falls back to greedy decoding when it is not expected to fit in the
+        time left after encoding, and the decoding stops before the step expected to exceed the budget, returning
+        the best hypothesis so far, see :func:`seq2seq.evaluator.deadline.deadline_decode`.
+
+        Args:
+            src_seq (list or str): list of tokens in source language, or a text split by :meth:`tokenize`
+            budget (float): time in seconds the prediction has to end within
+
+        Returns: tgt_seq, truncated
+            - **tgt_seq** (list): list of tokens in target language as predicted by the pre-trained model
+            - **truncated** (bool): whether the budget stopped the decoding before the end of the sequence
+        """
+        deadline = time.monotonic() + budget
+        _, src_id_seq, lengths = self._batch_input([src_seq])
+        with torch.no_grad(), autocast(self.use_bf16):
+            encoder_outputs, encoder_hidden, encoder_mask = self.model.encode(src_id_seq, lengths)
+        symbols, truncated = deadline_decode(self.model.decoder, encoder_outputs, encoder_hidden, deadline,
+                                             self._step_times, encoder_mask, function=self.model.decode_function,
+                                             shortlist=self._shortlist(src_id_seq), use_bf16=self.use_bf16,
+                                             max_lengths=self._max_lengths(lengths), lock=self._step_lock)
+        return [self.tgt_vocab.itos[tok] for tok in symbols], truncated
+
+    def predict_batch(self, src_seqs):
+        """ Make predictions for a batch of source sequences with one forward pass of the model.
+
+        The sequences are padded to the longest one, the padding is masked from the attention of the decoder so
+        the predictions are those of :meth:`predict` for models whose `EncoderRNN` is built with `variable_lengths`.
+
+        Args:
+            src_seqs (list): list of source sequences, each a list of tokens in source language or a text
+
+        Returns:
+            tgt_seqs (list): list of predicted sequences of tokens in target language, in the order of `src_seqs`
+        """
+        order, src_id_seq, lengths = self._batch_input(src_seqs)
+        shortlist = self._shortlist(src_id_seq)
+        with torch.no_grad(), autocast(self.use_bf16):
+            _, _, other = self.model(src_id_seq, lengths, shortlist=shortlist,
+                                     max_lengths=self._max_lengths(lengths))
+
+        symbols = torch.cat(other['sequence'], 1).cpu()
+        tgt_seqs = [None] * len(src_seqs)
+        for row, i in enumerate(order):
+            tgt_seqs[i] = [self.tgt_vocab.itos[tok] for tok in symbols[row, :other['length'][row]].tolist()]
+        return tgt_seqs
+
+    def encode_batch(self, src_seqs):
+        """
+        Encodes a batch of source sequences, see :meth:`seq2seq.models.Seq2seq.encode`.
+
+        Args:
+            src_seqs (list): list of source sequences, each a list of tokens in source language or a text
+
+        Returns: encoder_outputs, encoder_hidden, encoder_mask
+            the outputs of :meth:`seq2seq.models.Seq2seq.encode`, in the order of `src_seqs`
+        """
+        order, src_id_seq, lengths = self._batch_input(src_seqs)
+        with torch.no_grad(), autocast(self.use_bf16):
+            encoder_outputs, encoder_hidden, encoder_mask = self.model.encode(src_id_seq, lengths)
+        inverse = torch.empty(len(order), dtype=torch.long)
+        inverse[torch.LongTensor(order)] = torch.arange(len(order))
+        inverse = inverse.to(encoder_outputs.device)
+        if isinstance(encoder_hidden, tuple):
+            encoder_hidden = tuple([h.index_select(1, inverse) for h in encoder_hidden])
+        else:
+            encoder_hidden = encoder_hidden.index_select(1, inverse)
+        return encoder_outputs.index_select(0, inverse), encoder_hidden, encoder_mask.index_select(0, inverse)
+
+    def _batch_input(self, src_seqs):
+        src_seqs = [self.tokenize(src_seq) for src_seq in src_seqs]
+        # the encoder packs the sequences, which have to be sorted by decreasing length
+        order = sorted(range(len(src_seqs)), key=lambda i: -len(src_seqs[i]))
+        lengths = [len(src_seqs[i]) for i in order]
+        pad_id = self.src_vocab.stoi['<pad>']
+        src_id_seq = torch.LongTensor([[self.src_vocab.stoi[tok] for tok in src_seqs[i]] +
+                                       [pad_id] * (lengths[0] - len(src_seqs[i])) for i in order])
+        if torch.cuda.is_available():
+            src_id_seq = src_id_seq.cuda()
+        return order, src_id_seq, lengths
+
+    def tokenize(self, src_seq):
+        """ Returns the tokens of a source text, split by the `tokenizer` or on whitespace, a list of tokens is
+        returned as it is. """
+        if not isinstance(src_seq, str):
+            return src_seq
+        return self.tokenizer(src_seq) if self.tokenizer is not None else src_seq.split()
+
+    def _max_lengths(self, lengths):
+        if self.length_predictor is None:
+            return None
+        return self.length_predictor.max_lengths(lengths)
+
+    def _shortlist(self, src_id_seq):
+        if self.shortlist is None:
+            return None
+        return torch.from_numpy(self.shortlist.candidates(src_id_seq.data.cpu().view(-1).numpy()))
@@ -0,0 +1,98 @@
+import torch
+import torch.nn.functional as F
+
+from seq2seq.models import TopKDecoder
+from seq2seq.util.precision import autocast
+
+
+def stream_decode(decoder, encoder_outputs, encoder_hidden, encoder_mask=None, function=F.log_softmax,
+                  shortlist=None, use_bf16=False, max_lengths=None):
+    """
+    Decodes one encoded source sequence, yielding the target symbols as soon as they are known.
+
+    A `DecoderRNN` decodes greedily and yields every symbol at the step it is decoded.  A `TopKDecoder` yields
+    the prefix all the hypotheses that can still be returned agree on, the running beams and the ones that ended,
+    which cannot change anymore, and the rest of the best hypothesis once the search is over.  The symbols are
+    those returned by the `forward` of the decoder, with the `<eos>` symbol when it is decoded.
+
+    Every step runs under `torch.no_grad` and autocast, which are not held while the caller consumes a symbol.
+
+    Args:
+        decoder (DecoderRNN or TopKDecoder): decoder of the model
+        encoder_outputs (1, input_len, hidden_size): outputs of the encoder
+        encoder_hidden (num_layers * num_directions, 1, hidden_size): hidden state of the encoder
+        encoder_mask (1, input_len), optional: byte tensor marking the padded positions of `encoder_outputs`
+        function (torch.nn.Module, optional): decoding function of the model (default: `F.log_softmax`)
+        shortlist (torch.LongTensor, optional): sorted ids of the candidate target words (default: None)
+        use_bf16 (bool, optional): run the decoder under bfloat16 autocast (default: False)
+        max_lengths (list, optional): maximum number of decoding steps of the sequence, as a list of one value
+            (default: None, the `max_len` of the decoder)
+
+    Yields:
+        int: target symbols in decoding order
+    """
+    if isinstance(decoder, TopKDecoder):
+        steps = _beam_stream(decoder, encoder_outputs, encoder_hidden, encoder_mask, function, shortlist, max_lengths)
+    else:
+        steps = _greedy_stream(decoder, encoder_outputs, encoder_hidden, encoder_mask, function, shortlist,
+                               max_lengths)
+    while True:
+        with torch.no_grad(), autocast(use_bf16):
+            try:
+                symbols = next(steps)
+            except StopIteration:
+                return
+        for symbol in symbols:
+            yield symbol
+
+
+def _greedy_stream(decoder, encoder_outputs, encoder_hidden, encoder_mask, function, shortlist, max_lengths):
+    if shortlist is not None:
+        shortlist = decoder.gather_shortlist(shortlist)
+    hidden = decoder._init_state(encoder_hidden)
+    device = encoder_outputs.device if encoder_outputs is not None else decoder.embedding.weight.device
+    symbols = torch.full((1, 1), decoder.sos_id, dtype=torch.long, device=device)
+    max_length = decoder.max_length if max_lengths is None else min(decoder.max_length, int(max_lengths[0]))
+    for _ in range(max_length):
+        step_output, hidden, _ = decoder.forward_step(symbols, hidden, encoder_outputs, function=function,
+                                                      encoder_mask=encoder_mask, shortlist=shortlist)
+        symbols = step_output.squeeze(1).topk(1)[1]
+        symbol = int(symbols[0, 0])
+        yield [symbol]
+        if symbol == decoder.eos_id:
+            return
+
+
+def _beam_stream(decoder, encoder_outputs, encoder_hidden, encoder_mask, function, shortlist, max_lengths):
+    steps = decoder.beam_steps(None, encoder_hidden, encoder_outputs, function, shortlist=shortlist,
+                               encoder_mask=encoder_mask, max_lengths=max_lengths)
+    beams = [[] for _ in range(decoder.k)]
+    ended = []
+    emitted = 0
+    while True:
+        try:
+            predecessors, symbols = next(steps)
+        except StopIteration as stop:
+            _, _, other = stop.value
+            break
+        symbols = symbols.view(-1).tolist()
+        beams = [beams[p] + [s] for p, s in zip(predecessors.view(-1).tolist(), symbols)]
+        # beams that ended are not extended, but can still be the best hypothesis
+        ended.extend(beam for beam, s in zip(beams, symbols) if s == decoder.EOS)
+        stable = _common_prefix(beams + ended)
+        if len(stable) > emitted:
+            yield stable[emitted:]
+            emitted = len(stable)
+
+    best = torch.cat(other['sequence'], 1)[0, :other['length'][0]].tolist()
+    yield best[emitted:]
+
+
+def _common_prefix(seqs):
+    prefix = seqs[0]
+    for seq in seqs[1:]:
+        n = 0
+        while n < min(len(prefix), len(seq)) and prefix[n] == seq[n]:
+            n += 1
+        prefix = prefix[:n]
+    return prefix
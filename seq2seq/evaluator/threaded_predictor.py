@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+class ThreadedPredictor(object):
+    """
+    Predicts concurrent requests on a pool of threads sharing one model.
+
+    The models keep no per-call state on their modules, and torch releases the GIL while its kernels run, so the
+    threads predict in parallel on the weights of a single model instead of a copy per thread.  Every prediction
+    runs under `torch.no_grad`, which like autocast only applies to the thread it is entered on.
+
+    The threads of the pool share the intra-op thread pool of torch: with many threads predicting at once, fewer
+    intra-op threads per prediction, e.g. `intra_op_threads=1`, avoid oversubscribing the cores.
+
+    Args:
+        predictor (Predictor or HierarchialPredictor): predictor of the shared model
+        num_threads (int, optional): number of requests predicted in parallel (default: number of cores)
+        intra_op_threads (int, optional): sets the process-wide number of torch threads used within an operation,
+            see `torch.set_num_threads` (default: None, left unchanged)
+
+    Examples::
+
+         >>> with ThreadedPredictor(Predictor(model, src_vocab, tgt_vocab), num_threads=8) as predictor:
+         ...     tgt_seqs = predictor.predict_many([seq.split() for seq in open('src.txt')])
+    """
+
+    def __init__(self, predictor, num_threads=None, intra_op_threads=None):
+        self.predictor = predictor
+        self.num_threads = num_threads if num_threads is not None else (os.cpu_count() or 1)
+        if intra_op_threads is not None:
+            torch.set_num_threads(intra_op_threads)
+        self.executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix='predictor')
+
+    def submit(self, src_seq):
+        """
+        Queues a source sequence for prediction on the pool.
+
+        Args:
+            src_seq (list): list of tokens in source language
+
+        Returns:
+            concurrent.futures.Future: future resolved with the list of predicted tokens in target language
+        """
+        return self.executor.submit(self._predict, src_seq)
+
+    def predict(self, src_seq):
+        """ Make prediction given `src_seq` as input, waiting for a thread of the pool, see :meth:`submit`. """
+        return self.submit(src_seq).result()
+
+    def predict_many(self, src_seqs):
+        """
+        Predicts source sequences in parallel.
+
+        Args:
+            src_seqs (list): list of source sequences, each a list of tokens in source language
+
+        Returns:
+            tgt_seqs (list): list of predicted sequences of tokens in target language, in the order of `src_seqs`
+        """
+        return [future.result() for future in [self.submit(src_seq) for src_seq in src_seqs]]
+
+    def shutdown(self, wait=True):
+        """ Stops the pool once the queued predictions are done. """
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _predict(self, src_seq):
+        with torch.no_grad():
+            return self.predictor.predict(src_seq)
@@ -0,0 +1,169 @@
+import os
+import hashlib
+import bisect
+import warnings
+
+import torch
+
+from seq2seq.models import TopKDecoder
+from seq2seq.models.graphs import EncoderGraph, DecoderStepGraph
+from seq2seq.util.checkpoint import _model_tensors
+from .predictor import Predictor
+
+
+class TracedPredictor(Predictor):
+    """
+    Predictor running TorchScript traces of the encoder and of a single decoding step of a `Seq2seq` model, which
+    removes the Python overhead of the eager decoding loop.
+
+    The source sequences are padded to the smallest of the length `buckets` that fits them and a pair of traces is
+    created per bucket the first time it is used.  With a `cache_dir` the traces are saved there, keyed by the
+    weights of the model and the torch version, so that restarting a process loads them instead of tracing again.
+    Sequences longer than the largest bucket are predicted by the eager model.
+
+    The traces decode greedily in float32 over the whole target vocabulary, so beam search models (`TopKDecoder`),
+    `use_bf16` and `shortlist` are rejected, predict them with :class:`seq2seq.evaluator.Predictor`.
+
+    Args:
+        model (seq2seq.models.Seq2seq): trained model, decoding with `F.log_softmax`
+        src_vocab (seq2seq.dataset.vocabulary.Vocabulary): source sequence vocabulary
+        tgt_vocab (seq2seq.dataset.vocabulary.Vocabulary): target sequence vocabulary
+        buckets (list of int, optional): padded source lengths to trace the graphs for (default: (10, 20, 50))
+        cache_dir (str, optional): directory to persist the traces in (default: `None`, traces are kept in memory)
+        tokenizer (callable, optional): splits the source texts given as strings into tokens (default: None, split
+            on whitespace)
+        length_predictor (seq2seq.dataset.length_predictor.LengthPredictor, optional): caps the number of decoding
+            steps of every source sequence given its length (default: None, the `max_len` of the decoder)
+        use_bf16 (bool, optional): not supported, must be False (default: False)
+        shortlist (seq2seq.dataset.shortlist.Shortlist, optional): not supported, must be None (default: None)
+
+    Raises:
+        ValueError: if the model decodes with a `TopKDecoder`, or `use_bf16` or `shortlist` is given
+
+    Examples::
+
+         >>> predictor = TracedPredictor(model, src_vocab, tgt_vocab, cache_dir='experiment/traces')
+         >>> predictor.warmup()
+         >>> predictor.predict("1 3 5 7 9".split())
+    """
+
+    def __init__(self, model, src_vocab, tgt_vocab, buckets=(10, 20, 50), cache_dir=None, tokenizer=None,
+                 length_predictor=None, use_bf16=False, shortlist=None):
+        if isinstance(model.decoder, TopKDecoder):
+            raise ValueError("TracedPredictor decodes greedily, predict beam search models with Predictor.")
+        if use_bf16 or shortlist is not None:
+            raise ValueError("TracedPredictor does not support use_bf16 or shortlist, use Predictor.")
+        super(TracedPredictor, self).__init__(model, src_vocab, tgt_vocab, tokenizer=tokenizer,
+                                              length_predictor=length_predictor)
+        self.buckets = sorted(buckets)
+        self.cache_dir = cache_dir
+        self._graphs = {}
+        self._key = None
+
+    def bucket(self, length):
+        """ Returns the padded length for a source sequence of the given length, `None` if it exceeds all buckets. """
+        index = bisect.bisect_left(self.buckets, length)
+        if index == len(self.buckets):
+            return None
+        return self.buckets[index]
+
+    def warmup(self):
+        """ Traces or loads the graphs of every bucket ahead of the first predictions. """
+        for bucket in self.buckets:
+            self._get_graphs(bucket)
+
+    def predict(self, src_seq):
+        """ Make prediction given `src_seq` as input.
+
+        Args:
+            src_seq (list): list of tokens in source language
+
+        Returns:
+            tgt_seq (list): list of tokens in target language as predicted
+            by the pre-trained model
+        """
+        src_seq = self.tokenize(src_seq)
+        bucket = self.bucket(len(src_seq))
+        if bucket is None:
+            return super(TracedPredictor, self).predict(src_seq)
+        encoder, decoder_step = self._get_graphs(bucket)
+        decoder = self.model.decoder
+
+        src_ids = [self.src_vocab.stoi[tok] for tok in src_seq]
+        src_ids += [0] * (bucket - len(src_ids))
+        device = self._device()
+        input_var = torch.tensor([src_ids], dtype=torch.long, device=device)
+        input_lengths = torch.tensor([len(src_seq)], dtype=torch.long, device=device)
+
+        tgt_id_seq = []
+        with torch.no_grad():
+            encoder_outputs, hidden, encoder_mask = encoder(input_var, input_lengths)
+            symbols = torch.tensor([[decoder.sos_id]], dtype=torch.long, device=device)
+            max_lengths = self._max_lengths([len(src_seq)])
+            max_length = decoder.max_length if max_lengths is None else min(decoder.max_length, max_lengths[0])
+            for _ in range(max_length):
+                log_probs, hidden = decoder_step(symbols, hidden, encoder_outputs, encoder_mask)
+                symbols = log_probs.topk(1)[1]
+                tgt_id_seq.append(int(symbols[0, 0]))
+                if tgt_id_seq[-1] == decoder.eos_id:
+                    break
+        return [self.tgt_vocab.itos[tok] for tok in tgt_id_seq]
+
+    def _device(self):
+        return next(self.model.parameters()).device
+
+    def _get_graphs(self, bucket):
+        if bucket not in self._graphs:
+            graphs = self._load_graphs(bucket)
+            if graphs is None:
+                graphs = self._trace(bucket)
+                self._save_graphs(bucket, graphs)
+            self._graphs[bucket] = graphs
+        return self._graphs[bucket]
+
+    def _trace(self, bucket):
+        device = self._device()
+        decoder = self.model.decoder
+        input_var = torch.zeros(1, bucket, dtype=torch.long, device=device)
+        input_lengths = torch.tensor([bucket], dtype=torch.long, device=device)
+        symbols = torch.full((1, 1), decoder.sos_id, dtype=torch.long, device=device)
+        with torch.no_grad(), warnings.catch_warnings():
+            # packing with traced lengths warns about them being converted to constants, they are not
+            warnings.simplefilter('ignore', torch.jit.TracerWarning)
+            encoder = torch.jit.trace(EncoderGraph(self.model.encoder, decoder).eval(), (input_var, input_lengths),
+                                      check_trace=False)
+            encoder_outputs, hidden, encoder_mask = encoder(input_var, input_lengths)
+            decoder_step = torch.jit.trace(DecoderStepGraph(decoder).eval(),
+                                           (symbols, hidden, encoder_outputs, encoder_mask), check_trace=False)
+        return encoder, decoder_step
+
+    def _cache_paths(self, bucket):
+        if self._key is None:
+            digest = hashlib.sha256(torch.__version__.encode('utf-8'))
+            digest.update(str(self._device()).encode('utf-8'))
+            for name, tensor in _model_tensors(self.model):
+                digest.update(name.encode('utf-8'))
+                digest.update(tensor.data.cpu().contiguous().numpy().tobytes())
+            self._key = digest.hexdigest()
+        path = os.path.join(self.cache_dir, self._key)
+        return (os.path.join(path, 'encoder_{}.pt'.format(bucket)),
+                os.path.join(path, 'decoder_{}.pt'.format(bucket)))
+
+    def _load_graphs(self, bucket):
+        if self.cache_dir is None:
+            return None
+        paths = self._cache_paths(bucket)
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        return tuple(torch.jit.load(path, map_location=self._device()) for path in paths)
+
+    def _save_graphs(self, bucket, graphs):
+        if self.cache_dir is None:
+            return
+        paths = self._cache_paths(bucket)
+        if not os.path.exists(os.path.dirname(paths[0])):
+            os.makedirs(os.path.dirname(paths[0]))
+        for graph, path in zip(graphs, paths):
+            tmp_path = path + '.tmp'
+            torch.jit.save(graph, tmp_path)
+            os.rename(tmp_path, path)
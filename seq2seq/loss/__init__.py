@@ -1 +1 @@
-from .loss import NLLLoss, Perplexity
+from .loss import NLLLoss, AdaptiveNLLLoss, Perplexity
@@ -75,14 +75,25 @@ class Loss(object):
     def cuda(self):
         self.criterion.cuda()
 
-    def backward(self):
+    def backward(self, scale=1.):
+        """ Back propagates the accumulated loss.
+
+        Args:
+            scale (float, optional): factor to scale the loss by, e.g. to average the gradients accumulated over
+                several batches (default: 1)
+        """
         if type(self.acc_loss) is int:
             raise ValueError("No loss to back propagate.")
-        self.acc_loss.backward()
+        if scale != 1:
+            (self.acc_loss * scale).backward()
+        else:
+            self.acc_loss.backward()
 
 class NLLLoss(Loss):
     """ Batch averaged negative log-likelihood loss.
 
+    The loss is computed and accumulated in fp32, also for reduced precision (e.g. bfloat16) outputs.
+
     Args:
         weight (torch.Tensor, optional): refer to http://pytorch.org/docs/master/nn.html#nllloss
         mask (int, optional): index of masked token, i.e. weight[mask] = 0.
@@ -114,7 +125,42 @@ class NLLLoss(Loss):
         return loss
 
     def eval_batch(self, outputs, target):
-        self.acc_loss += self.criterion(outputs, target)
+        self.acc_loss += self.criterion(outputs.float(), target)
+        self.norm_term += 1
+
+class AdaptiveNLLLoss(NLLLoss):
+    """ Batch averaged negative log-likelihood loss of a decoder with an adaptive output layer.
+
+    In training mode such a decoder outputs the hidden states its output layer takes, see the `output_layer`
+    argument of :class:`seq2seq.models.DecoderRNN`.  The loss projects them with the targets through
+    `torch.nn.AdaptiveLogSoftmaxWithLoss`, which only computes the log probabilities of the clusters of the
+    targets.  In evaluation mode the decoder outputs full log probabilities and the loss is that of `NLLLoss`.
+
+    Args:
+        output_layer (torch.nn.AdaptiveLogSoftmaxWithLoss): output layer of the decoder, `decoder.out`
+        mask (int, optional): index of masked token, e.g. padding, which is left out of the loss.
+    """
+
+    _NAME = "Avg AdaptiveNLLLoss"
+
+    def __init__(self, output_layer, mask=None):
+        if not isinstance(output_layer, nn.AdaptiveLogSoftmaxWithLoss):
+            raise ValueError("Output layer has to be a torch.nn.AdaptiveLogSoftmaxWithLoss")
+        super(AdaptiveNLLLoss, self).__init__()
+        self.name = self._NAME
+        self.output_layer = output_layer
+        self.mask = mask
+
+    def eval_batch(self, outputs, target):
+        if self.mask is not None:
+            keep = target.ne(self.mask)
+            outputs, target = outputs[keep], target[keep]
+        if target.numel() == 0:
+            return
+        if self.output_layer.training:
+            self.acc_loss += self.output_layer(outputs.float(), target).loss
+        else:
+            self.acc_loss += self.criterion(outputs.float(), target)
         self.norm_term += 1
 
 class Perplexity(NLLLoss):
@@ -135,7 +181,7 @@ class Perplexity(NLLLoss):
         super(Perplexity, self).__init__(weight=weight, mask=mask, size_average=False)
 
     def eval_batch(self, outputs, target):
-        self.acc_loss += self.criterion(outputs, target)
+        self.acc_loss += self.criterion(outputs.float(), target)
         if self.mask is None:
             self.norm_term += np.prod(target.size())
         else:
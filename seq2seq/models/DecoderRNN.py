@@ -1,3 +1,4 @@
+import time
 import random
 
 import numpy as np
@@ -7,7 +8,7 @@ import torch.nn as nn
 from torch.autograd import Variable
 import torch.nn.functional as F
 
-from .attention import Attention
+from .attention import Attention, attention_context
 from .baseRNN import BaseRNN
 
 if torch.cuda.is_available():
@@ -16,6 +17,17 @@ else:
     import torch as device
 
 
+def exceeds_deadline(deadline, start, steps):
+    """
+    Tells whether one more decoding step is expected to end after `deadline`, a `time.monotonic()` value, from
+    the mean duration of the `steps` steps run since `start`.  The first step is always run.
+    """
+    if deadline is None or steps == 0:
+        return False
+    now = time.monotonic()
+    return now + (now - start) / steps > deadline
+
+
 class DecoderRNN(BaseRNN):
     r"""
     Provides functionality for decoding in a seq2seq framework, with an option for attention.
@@ -32,13 +44,27 @@ class DecoderRNN(BaseRNN):
         input_dropout_p (float, optional): dropout probability for the input sequence (default: 0)
         dropout_p (float, optional): dropout probability for the output sequence (default: 0)
         use_attention(bool, optional): flag indication whether to use attention mechanism or not (default: false)
+        output_layer (str, optional): `linear` for a full projection to the vocabulary, or `adaptive` for an
+            adaptive softmax (`torch.nn.AdaptiveLogSoftmaxWithLoss`) whose rarer words are projected from smaller
+            hidden states.  In training mode its decoder outputs are the hidden states it takes, which
+            :class:`seq2seq.loss.AdaptiveNLLLoss` projects with the targets instead of computing the log
+            probabilities of the whole vocabulary (default: linear)
+        cutoffs (list of int, optional): increasing token ids splitting the vocabulary into the clusters of the
+            adaptive softmax.  The vocabulary has to be sorted by decreasing frequency, as the vocabularies built
+            by the fields are.  Required for the adaptive output layer (default: `None`)
+        div_value (float, optional): factor the hidden size is divided by from one cluster of the adaptive
+            softmax to the next (default: 4)
+        tie_weights (bool, optional): share the weights of the input embedding and of the linear output layer
+            (default: False)
 
     Attributes:
         KEY_ATTN_SCORE (str): key used to indicate attention weights in `ret_dict`
         KEY_LENGTH (str): key used to indicate a list representing lengths of output sequences in `ret_dict`
         KEY_SEQUENCE (str): key used to indicate a list of sequences in `ret_dict`
+        KEY_TRUNCATED (str): key used to indicate a list of flags of the sequences cut by the deadline in `ret_dict`
 
-    Inputs: inputs, encoder_hidden, encoder_outputs, function, teacher_forcing_ratio
+    Inputs: inputs, encoder_hidden, encoder_outputs, function, teacher_forcing_ratio, shortlist, encoder_mask, deadline,
+            max_lengths
         - **inputs** (batch, seq_len, input_size): list of sequences, whose length is the batch size and within which
           each sequence is a list of token IDs.  It is used for teacher forcing when provided. (default `None`)
         - **encoder_hidden** (num_layers * num_directions, batch_size, hidden_size): tensor containing the features in the
@@ -50,6 +76,18 @@ class DecoderRNN(BaseRNN):
         - **teacher_forcing_ratio** (float): The probability that teacher forcing will be used. A random number is
           drawn uniformly from 0-1 for every decoding token, and if the sample is smaller than the given value,
           teacher forcing would be used (default is 0).
+        - **shortlist** (torch.LongTensor, optional): sorted ids of the only target words to score, e.g. the
+          candidates of a :class:`seq2seq.dataset.shortlist.Shortlist`.  The other words get a log probability
+          of `-inf`.  Only meant for inference, with the linear output layer (default is `None`).
+        - **encoder_mask** (batch, seq_len): byte tensor marking the padded positions of `encoder_outputs`, which
+          are not attended to.  When the padding is uneven the attention is computed per group of sequences of
+          similar lengths, see :class:`seq2seq.models.attention.RaggedContext` (default is `None`).
+        - **deadline** (float, optional): `time.monotonic()` value after which no step is decoded anymore.  The
+          decoding stops before the first step expected to end after it, and returns the symbols decoded so far
+          (default is `None`, decode `max_len` steps).
+        - **max_lengths** (batch), optional: maximum number of decoding steps of every sequence, e.g. predicted by a
+          :class:`seq2seq.dataset.LengthPredictor`, capped by `max_len`.  The decoding then also stops as soon as
+          every sequence ended (default is `None`, decode `max_len` steps).
 
     Outputs: decoder_outputs, decoder_hidden, ret_dict
         - **decoder_outputs** (seq_len, batch, vocab_size): list of tensors with size (batch_size, vocab_size) containing
@@ -58,17 +96,20 @@ class DecoderRNN(BaseRNN):
           state of the decoder.
         - **ret_dict**: dictionary containing additional information as follows {*KEY_LENGTH* : list of integers
           representing lengths of output sequences, *KEY_SEQUENCE* : list of sequences, where each sequence is a list of
-          predicted token IDs }.
+          predicted token IDs, *KEY_TRUNCATED* : list of booleans, true for the sequences the deadline stopped
+          before their end of sentence symbol }.
     """
 
     KEY_ATTN_SCORE = 'attention_score'
     KEY_LENGTH = 'length'
     KEY_SEQUENCE = 'sequence'
+    KEY_TRUNCATED = 'truncated'
 
     def __init__(self, vocab_size, max_len, hidden_size,
             sos_id, eos_id,
             n_layers=1, rnn_cell='gru', bidirectional=False,
-            input_dropout_p=0, dropout_p=0, use_attention=False):
+            input_dropout_p=0, dropout_p=0, use_attention=False,
+            output_layer='linear', cutoffs=None, div_value=4., tie_weights=False):
         super(DecoderRNN, self).__init__(vocab_size, max_len, hidden_size,
                 input_dropout_p, dropout_p,
                 n_layers, rnn_cell)
@@ -83,33 +124,175 @@ class DecoderRNN(BaseRNN):
         self.sos_id = sos_id
 
         self.init_input = None
+        self._input_projections = None
 
         self.embedding = nn.Embedding(self.output_size, self.hidden_size)
         if use_attention:
             self.attention = Attention(self.hidden_size)
 
-        self.out = nn.Linear(self.hidden_size, self.output_size)
+        self.output_layer = output_layer
+        self.cutoffs = list(cutoffs) if cutoffs else None
+        self.div_value = div_value
+        if output_layer == 'linear':
+            self.out = nn.Linear(self.hidden_size, self.output_size)
+        elif output_layer == 'adaptive':
+            if not cutoffs:
+                raise ValueError("The adaptive output layer requires cutoffs.")
+            self.out = nn.AdaptiveLogSoftmaxWithLoss(self.hidden_size, self.output_size, self.cutoffs,
+                                                     div_value=div_value)
+        else:
+            raise ValueError("Unsupported output layer: {0}".format(output_layer))
 
-    def forward_step(self, input_var, hidden, encoder_outputs, function):
+        self.tie_weights = tie_weights
+        if tie_weights:
+            if output_layer != 'linear':
+                raise ValueError("Weights can only be tied with the linear output layer.")
+            self.out.weight = self.embedding.weight
+
+    def forward_step(self, input_var, hidden, encoder_outputs, function, encoder_mask=None, shortlist=None):
+        """
+        Runs the decoder for the given input symbols, one step per column of `input_var`.
+
+        Args:
+            input_var (batch, seq_len): tensor containing the input symbols
+            hidden (num_layers, batch, hidden_size): decoder hidden state
+            encoder_outputs (batch, input_len, hidden_size): outputs of the encoder, used for attention, or a
+              :class:`seq2seq.models.attention.RaggedContext` of them
+            function (torch.nn.Module): function used to generate symbols from the RNN outputs
+            encoder_mask (batch, input_len), optional: byte tensor marking padded encoder positions that are
+              not attended to (default `None`)
+            shortlist (tuple, optional): output layer restricted to candidate words, created by
+              :meth:`gather_shortlist` (default `None`)
+
+        Returns: predicted_softmax, hidden, attn
+            - **predicted_softmax** (batch, seq_len, vocab_size): outputs of the decoding function
+            - **hidden** (num_layers, batch, hidden_size): decoder hidden state after the last step
+            - **attn** (batch, seq_len, input_len): attention weights, `None` without attention
+        """
         batch_size = input_var.size(0)
         output_size = input_var.size(1)
-        embedded = self.embedding(input_var)
-        embedded = self.input_dropout(embedded)
-
-        output, hidden = self.rnn(embedded, hidden)
+        if self._input_projections is not None and not self.training:
+            output, hidden = self._projected_rnn(input_var, hidden)
+        else:
+            embedded = self.embedding(input_var)
+            embedded = self.input_dropout(embedded)
+            output, hidden = self.rnn(embedded, hidden)
 
         attn = None
         if self.use_attention:
-            output, attn = self.attention(output, encoder_outputs)
+            output, attn = self.attention(output, encoder_outputs, encoder_mask)
 
-        predicted_softmax = function(self.out(output.view(-1, self.hidden_size))).view(batch_size, output_size, -1)
+        predicted_softmax = self._project(output.view(-1, self.hidden_size), function, shortlist)
+        predicted_softmax = predicted_softmax.view(batch_size, output_size, -1)
         return predicted_softmax, hidden, attn
 
+    def precompute_input_projections(self):
+        """
+        Precomputes the input to hidden projections of the first RNN layer, `embedding * W_ih^T + b_ih`, for the
+        whole vocabulary.  In evaluation mode the decoding steps then look up the projections of their input
+        symbols instead of embedding them and multiplying the embeddings, which saves the input matrix
+        multiplication of the first layer at every step of greedy and beam search decoding.
+
+        The table takes `vocab_size * 3 * hidden_size` floats for a GRU and `vocab_size * 4 * hidden_size` for an
+        LSTM.  It is not part of the model state and is dropped when the decoder is put in training mode, call
+        this method again after changing the weights.
+        """
+        if not hasattr(self.rnn, 'weight_ih_l0'):
+            raise ValueError("Input projections cannot be precomputed for quantized RNNs.")
+        with torch.no_grad():
+            self._input_projections = F.linear(self.embedding.weight, self.rnn.weight_ih_l0, self.rnn.bias_ih_l0)
+
+    def train(self, mode=True):
+        if mode:
+            self._input_projections = None
+        return super(DecoderRNN, self).train(mode)
+
+    def _projected_rnn(self, input_var, hidden):
+        """ Runs the RNN step by step with the precomputed input projections of the first layer. """
+        rnn = self.rnn
+        if self._input_projections.device != rnn.weight_hh_l0.device:
+            self._input_projections = self._input_projections.to(rnn.weight_hh_l0.device)
+        lstm = self.rnn_cell is nn.LSTM
+        batch_size = input_var.size(0)
+        if hidden is None:
+            zeros = rnn.weight_hh_l0.new_zeros(self.n_layers, batch_size, self.hidden_size)
+            hidden = (zeros, zeros) if lstm else zeros
+        h = list(hidden[0] if lstm else hidden)
+        c = list(hidden[1]) if lstm else None
+
+        outputs = []
+        for t in range(input_var.size(1)):
+            gates_i = self._input_projections[input_var[:, t]]
+            for layer in range(self.n_layers):
+                if layer > 0:
+                    gates_i = F.linear(h[layer - 1], getattr(rnn, 'weight_ih_l%d' % layer),
+                                       getattr(rnn, 'bias_ih_l%d' % layer))
+                gates_h = F.linear(h[layer], getattr(rnn, 'weight_hh_l%d' % layer),
+                                   getattr(rnn, 'bias_hh_l%d' % layer))
+                if lstm:
+                    i, f, g, o = (gates_i + gates_h).chunk(4, 1)
+                    c[layer] = torch.sigmoid(f) * c[layer] + torch.sigmoid(i) * torch.tanh(g)
+                    h[layer] = torch.sigmoid(o) * torch.tanh(c[layer])
+                else:
+                    i_r, i_z, i_n = gates_i.chunk(3, 1)
+                    h_r, h_z, h_n = gates_h.chunk(3, 1)
+                    r = torch.sigmoid(i_r + h_r)
+                    z = torch.sigmoid(i_z + h_z)
+                    n = torch.tanh(i_n + r * h_n)
+                    h[layer] = (1 - z) * n + z * h[layer]
+            outputs.append(h[-1])
+
+        output = torch.stack(outputs, 1)
+        if lstm:
+            return output, (torch.stack(h), torch.stack(c))
+        return output, torch.stack(h)
+
+    def gather_shortlist(self, shortlist):
+        """
+        Gathers the rows of the output layer of candidate words, so that the decoding steps only score them.
+        Args:
+            shortlist (torch.LongTensor): sorted ids of the candidate words
+        Returns:
+            tuple: the ids with the gathered weights and biases, to pass to :meth:`forward_step`
+        """
+        if self.output_layer != 'linear':
+            raise ValueError("Shortlists are only supported by the linear output layer.")
+        shortlist = shortlist.to(self.out.weight.device)
+        return shortlist, self.out.weight.index_select(0, shortlist), self.out.bias.index_select(0, shortlist)
+
+    def _project(self, output, function, shortlist=None):
+        """ Applies the output layer and `function` to the RNN outputs of size (N, hidden_size). """
+        if shortlist is not None:
+            ids, weight, bias = shortlist
+            scores = function(F.linear(output, weight, bias))
+            predicted = scores.new_full((output.size(0), self.output_size), -float('inf'))
+            return predicted.index_copy(1, ids, scores)
+        if self.output_layer == 'adaptive':
+            # the adaptive softmax computes the log probabilities itself
+            if function is not F.log_softmax:
+                raise ValueError("The adaptive output layer only supports F.log_softmax as decoding function.")
+            if self.training:
+                return output
+            return self.out.log_prob(output)
+        return function(self.out(output))
+
+    def _symbols(self, step_output):
+        """ Returns the most likely symbols of the outputs of a step, of size (batch, 1). """
+        if self.output_layer == 'adaptive' and self.training:
+            # the outputs are the hidden states of the adaptive output layer
+            with torch.no_grad():
+                return self.out.predict(step_output).unsqueeze(1)
+        return step_output.topk(1)[1]
+
     def forward(self, inputs=None, encoder_hidden=None, encoder_outputs=None,
-                    function=F.log_softmax, teacher_forcing_ratio=0):
+                    function=F.log_softmax, teacher_forcing_ratio=0, shortlist=None, encoder_mask=None,
+                    deadline=None, max_lengths=None):
         ret_dict = dict()
+        if shortlist is not None:
+            shortlist = self.gather_shortlist(shortlist)
         if self.use_attention:
             ret_dict[DecoderRNN.KEY_ATTN_SCORE] = list()
+            encoder_outputs = attention_context(encoder_outputs, encoder_mask)
 
         inputs, batch_size, max_length = self._validate_args(inputs, encoder_hidden, encoder_outputs,
                                                              function, teacher_forcing_ratio)
@@ -120,12 +303,15 @@ class DecoderRNN(BaseRNN):
         decoder_outputs = []
         sequence_symbols = []
         lengths = np.array([max_length] * batch_size)
+        if max_lengths is not None:
+            lengths = np.minimum(lengths, np.asarray(max_lengths))
+            max_length = int(lengths.max())
 
         def decode(step, step_output, step_attn):
             decoder_outputs.append(step_output)
             if self.use_attention:
                 ret_dict[DecoderRNN.KEY_ATTN_SCORE].append(step_attn)
-            symbols = decoder_outputs[-1].topk(1)[1]
+            symbols = self._symbols(decoder_outputs[-1])
             sequence_symbols.append(symbols)
 
             eos_batches = symbols.data.eq(self.eos_id)
@@ -140,7 +326,8 @@ class DecoderRNN(BaseRNN):
         if use_teacher_forcing:
             decoder_input = inputs[:, :-1]
             decoder_output, decoder_hidden, attn = self.forward_step(decoder_input, decoder_hidden, encoder_outputs,
-                                                                     function=function)
+                                                                     function=function, encoder_mask=encoder_mask,
+                                                                     shortlist=shortlist)
 
             for di in range(decoder_output.size(1)):
                 step_output = decoder_output[:, di, :]
@@ -151,15 +338,26 @@ class DecoderRNN(BaseRNN):
                 decode(di, step_output, step_attn)
         else:
             decoder_input = inputs[:, 0].unsqueeze(1)
+            start = time.monotonic()
             for di in range(max_length):
+                if exceeds_deadline(deadline, start, di):
+                    break
                 decoder_output, decoder_hidden, step_attn = self.forward_step(decoder_input, decoder_hidden, encoder_outputs,
-                                                                         function=function)
+                                                                         function=function, encoder_mask=encoder_mask,
+                                                                         shortlist=shortlist)
                 step_output = decoder_output.squeeze(1)
                 symbols = decode(di, step_output, step_attn)
                 decoder_input = symbols
+                # every sequence emitted its end of sentence symbol or reached its maximum length
+                if max_lengths is not None and (lengths <= di + 1).all():
+                    break
 
+        # the sequences still running when the deadline stopped the decoding end with the last decoded step
+        truncated = lengths > len(sequence_symbols)
+        lengths[truncated] = len(sequence_symbols)
         ret_dict[DecoderRNN.KEY_SEQUENCE] = sequence_symbols
         ret_dict[DecoderRNN.KEY_LENGTH] = lengths.tolist()
+        ret_dict[DecoderRNN.KEY_TRUNCATED] = truncated.tolist()
 
         return decoder_outputs, decoder_hidden, ret_dict
 
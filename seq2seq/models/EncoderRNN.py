@@ -16,6 +16,9 @@ class EncoderRNN(BaseRNN):
         bidirectional (bool, optional): if True, becomes a bidirectional encodr (defulat False)
         rnn_cell (str, optional): type of RNN cell (default: gru)
         variable_lengths (bool, optional): if use variable length RNN (default: False)
+        checkpoint_activations (bool, optional): recompute the embeddings and the RNN activations in the backward
+            pass instead of keeping them, which trades compute for memory when training on long or many chunks
+            (default: False)
 
     Inputs: inputs, input_lengths
         - **inputs**: list of sequences, whose length is the batch size and within which each sequence is a list of token IDs.
@@ -35,11 +38,13 @@ class EncoderRNN(BaseRNN):
 
     def __init__(self, vocab_size, max_len, hidden_size,
             input_dropout_p=0, dropout_p=0,
-            n_layers=1, bidirectional=False, rnn_cell='gru', variable_lengths=False):
+            n_layers=1, bidirectional=False, rnn_cell='gru', variable_lengths=False,
+            checkpoint_activations=False):
         super(EncoderRNN, self).__init__(vocab_size, max_len, hidden_size,
                 input_dropout_p, dropout_p, n_layers, rnn_cell)
 
         self.variable_lengths = variable_lengths
+        self.checkpoint_activations = checkpoint_activations
         self.embedding = nn.Embedding(vocab_size, hidden_size)
         self.rnn = self.rnn_cell(hidden_size, hidden_size, n_layers,
                                  batch_first=True, bidirectional=bidirectional, dropout=dropout_p)
@@ -57,6 +62,9 @@ class EncoderRNN(BaseRNN):
             - **output** (batch, seq_len, hidden_size): variable containing the encoded features of the input sequence
             - **hidden** (num_layers * num_directions, batch, hidden_size): variable containing the features in the hidden state h
         """
+        return self._checkpoint(self._encode, input_var, input_lengths)
+
+    def _encode(self, input_var, input_lengths):
         embedded = self.embedding(input_var)
         embedded = self.input_dropout(embedded)
         if self.variable_lengths:
@@ -1,4 +1,6 @@
+import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 from .baseRNN import BaseRNN
 from .attention import Attention
@@ -17,6 +19,17 @@ class HierarchialRNN(BaseRNN):
         bidirectional (bool, optional): if True, becomes a bidirectional encodr (defulat False)
         rnn_cell (str, optional): type of RNN cell (default: gru)
         variable_lengths (bool, optional): if use variable length RNN (default: False)
+        attention_window (int, optional): every chunk only attends to the words of the last `attention_window`
+            chunks, itself included, instead of the words of all the chunks (default: `None`)
+        attention_topk (int, optional): every chunk only attends to the words of the `attention_topk` chunks
+            whose encoded features are most similar to its own output (default: `None`)
+        checkpoint_activations (bool, optional): recompute the attention over the words of the chunks in the
+            backward pass instead of keeping its scores and weights, which trades compute for memory when training
+            on long contexts (default: False)
+
+    Both local attention modes score `seq_len * k * chunk_len` words instead of `seq_len * seq_len * chunk_len`,
+    where `k` is the window or the number of selected chunks, so the memory used by the attention of long contexts
+    grows linearly with the number of chunks.
 
     Inputs: inputs, input_lengths
         - **inputs**: list of sequences, whose length is the batch size and within which each sequence is a list of token IDs.
@@ -36,23 +49,33 @@ class HierarchialRNN(BaseRNN):
 
     def __init__(self, max_len, hidden_size,
                  input_dropout_p=0, dropout_p=0,
-                 n_layers=1, bidirectional=False, rnn_cell='gru', variable_lengths=False):
+                 n_layers=1, bidirectional=False, rnn_cell='gru', variable_lengths=False,
+                 attention_window=None, attention_topk=None, checkpoint_activations=False):
         super(HierarchialRNN, self).__init__(None, max_len, hidden_size,
                                          input_dropout_p, dropout_p, n_layers, rnn_cell)
+        if attention_window is not None and attention_topk is not None:
+            raise ValueError("Only one of attention_window and attention_topk can be set.")
+        self.attention_window = attention_window
+        self.attention_topk = attention_topk
+        self.checkpoint_activations = checkpoint_activations
 
         self.variable_lengths = variable_lengths
         self.rnn = self.rnn_cell(hidden_size, hidden_size, n_layers,
                                  batch_first=True, bidirectional=False, dropout=dropout_p)
         self.attention = Attention(self.hidden_size)
 
-    def forward(self, input_var, encoder_outputs, input_lengths=None):
+    def forward(self, input_var, encoder_outputs, input_lengths=None, encoder_mask=None):
         """
         Applies a multi-layer RNN to an input sequence.
 
         Args:
             input_var (batch, seq_len): tensor containing the features of the input sequence.
+            encoder_outputs (batch, seq_len * chunk_len, hidden_size): outputs of the encoder for all the chunks,
+              used for attention
             input_lengths (list of int, optional): A list that contains the lengths of sequences
               in the mini-batch
+            encoder_mask (batch, seq_len * chunk_len), optional: byte tensor marking the padded positions of
+              `encoder_outputs`, which are not attended to
 
         Returns: output, hidden
             - **output** (batch, seq_len, hidden_size): variable containing the encoded features of the input sequence
@@ -61,10 +84,74 @@ class HierarchialRNN(BaseRNN):
         #embedded = self.embedding(input_var)
         embedded = self.input_dropout(input_var)
         if self.variable_lengths:
-            embedded = nn.utils.rnn.pack_padded_sequence(embedded, input_lengths, batch_first=True)
+            embedded = nn.utils.rnn.pack_padded_sequence(embedded, input_lengths, batch_first=True,
+                                                         enforce_sorted=False)
 #        print("Embedded Shape", embedded.size())
         output, hidden = self.rnn(embedded)
-        output, attn = self.attention(output, encoder_outputs)
         if self.variable_lengths:
-            output, _ = nn.utils.rnn.pad_packed_sequence(output, batch_first=True)
+            output, _ = nn.utils.rnn.pad_packed_sequence(output, batch_first=True, total_length=input_var.size(1))
+        output = self._checkpoint(self.attend, output, input_var, encoder_outputs, encoder_mask)
         return output, hidden
+
+    def attend(self, output, chunk_features, encoder_outputs, encoder_mask=None):
+        """
+        Attends to the words of the chunks, all of them or only the local ones depending on `attention_window`
+        and `attention_topk`.
+
+        Args:
+            output (batch, seq_len, hidden_size): outputs of the RNN, one per chunk
+            chunk_features (batch, seq_len, hidden_size): encoded features of the chunks, used to select the
+              chunks attended to with `attention_topk`
+            encoder_outputs (batch, seq_len * chunk_len, hidden_size): outputs of the encoder for all the chunks
+            encoder_mask (batch, seq_len * chunk_len), optional: byte tensor marking the padded words
+
+        Returns:
+            output (batch, seq_len, hidden_size): attended outputs
+        """
+        if self.attention_window is None and self.attention_topk is None:
+            output, _ = self.attention(output, encoder_outputs, encoder_mask)
+            return output
+        batch_size, seq_len, hidden_size = output.size()
+        words = encoder_outputs.view(batch_size, seq_len, -1, hidden_size)
+        chunk_len = words.size(2)
+        if encoder_mask is None:
+            word_mask = torch.zeros(batch_size, seq_len, chunk_len, dtype=torch.bool, device=output.device)
+        else:
+            word_mask = encoder_mask.view(batch_size, seq_len, chunk_len)
+
+        if self.attention_window is not None:
+            chunks = self._window_chunks(batch_size, seq_len, output.device)
+        else:
+            chunks = self._topk_chunks(output, chunk_features, word_mask)
+
+        # the attended chunks are gathered one at a time, so only the scores grow with their number
+        batch_index = torch.arange(batch_size, device=output.device).unsqueeze(1)
+        scores = []
+        for index, valid in chunks:
+            score = torch.matmul(words[batch_index, index], output.unsqueeze(3)).squeeze(3)
+            scores.append(score.masked_fill(word_mask[batch_index, index] | ~valid.unsqueeze(2), -float('inf')))
+        scores = torch.cat(scores, 2)
+        # padded chunks may not see any word, they attend to all the gathered positions instead
+        empty = torch.isinf(scores).all(2, keepdim=True)
+        attn = F.softmax(scores.masked_fill(empty, 0), dim=2)
+
+        mix = 0
+        for i, (index, _) in enumerate(chunks):
+            chunk_attn = attn[:, :, i * chunk_len:(i + 1) * chunk_len].unsqueeze(2)
+            mix = mix + torch.matmul(chunk_attn, words[batch_index, index]).squeeze(2)
+        return self.attention._combine(mix, output)
+
+    def _window_chunks(self, batch_size, seq_len, device):
+        positions = torch.arange(seq_len, device=device)
+        chunks = []
+        for offset in range(min(self.attention_window, seq_len)):
+            index = (positions - offset).clamp(min=0).unsqueeze(0).expand(batch_size, seq_len)
+            chunks.append((index, (positions >= offset).unsqueeze(0).expand(batch_size, seq_len)))
+        return chunks
+
+    def _topk_chunks(self, output, chunk_features, word_mask):
+        relevance = torch.bmm(output, chunk_features.transpose(1, 2))
+        relevance = relevance.masked_fill(word_mask.all(2).unsqueeze(1), -float('inf'))
+        relevance, index = relevance.topk(min(self.attention_topk, output.size(1)), dim=2)
+        valid = ~torch.isinf(relevance)
+        return [(index[:, :, i], valid[:, :, i]) for i in range(index.size(2))]
@@ -1,10 +1,16 @@
+import time
+
 import torch
 import torch.nn.functional as F
 from torch.autograd import Variable
 
+from .attention import attention_context
+from .DecoderRNN import exceeds_deadline
+
 def _inflate(tensor, times, dim):
         """
-        Given a tensor, 'inflates' it along the given dimension by replicating each slice specified number of times (in-place)
+        Given a tensor, 'inflates' it along the given dimension by replicating each slice specified number of times,
+        so that the copies of a slice are next to each other, as the beams of a batch entry are
 
         Args:
             tensor: A :class:`Tensor` to inflate
@@ -22,21 +28,19 @@ def _inflate(tensor, times, dim):
             [torch.LongTensor of size 2x2]
             >> b = ._inflate(a, 2, dim=1)
             >> b
-            1   2   1   2
-            3   4   3   4
+            1   1   2   2
+            3   3   4   4
             [torch.LongTensor of size 2x4]
             >> c = _inflate(a, 2, dim=0)
             >> c
             1   2
-            3   4
             1   2
             3   4
+            3   4
             [torch.LongTensor of size 4x2]
 
         """
-        repeat_dims = [1] * tensor.dim()
-        repeat_dims[dim] = times
-        return tensor.repeat(*repeat_dims)
+        return tensor.repeat_interleave(times, dim)
 
 class TopKDecoder(torch.nn.Module):
     r"""
@@ -58,6 +62,13 @@ class TopKDecoder(torch.nn.Module):
         - **teacher_forcing_ratio** (float): The probability that teacher forcing will be used. A random number is
           drawn uniformly from 0-1 for every decoding token, and if the sample is smaller than the given value,
           teacher forcing would be used (default is 0).
+        - **deadline** (float, optional): `time.monotonic()` value after which no step is decoded anymore.  The
+          search stops before the first step expected to end after it and backtracks from the beams reached
+          (default is `None`, decode `max_len` steps).
+        - **max_lengths** (batch), optional: maximum number of decoding steps of every sequence, capped by `max_len`.
+          The hypotheses of a sequence are backtracked from its last step, and the search stops once every sequence
+          reached its maximum length or has an ended hypothesis scoring higher than its running beams, whose log
+          probabilities can only decrease (default is `None`, decode `max_len` steps).
 
     Outputs: decoder_outputs, decoder_hidden, ret_dict
         - **decoder_outputs** (batch): batch-length list of tensors with size (max_length, hidden_size) containing the
@@ -68,7 +79,8 @@ class TopKDecoder(torch.nn.Module):
           representing lengths of output sequences, *topk_length*: list of integers representing lengths of beam search
           sequences, *sequence* : list of sequences, where each sequence is a list of predicted token IDs,
           *topk_sequence* : list of beam search sequences, each beam is a list of token IDs, *inputs* : target
-          outputs if provided for decoding}.
+          outputs if provided for decoding, *truncated* : list of booleans, true for the sequences whose best
+          hypothesis the deadline stopped before its end of sentence symbol}.
     """
 
     def __init__(self, decoder_rnn, k):
@@ -81,15 +93,48 @@ class TopKDecoder(torch.nn.Module):
         self.EOS = self.rnn.eos_id
 
     def forward(self, inputs=None, encoder_hidden=None, encoder_outputs=None, function=F.log_softmax,
-                    teacher_forcing_ratio=0, retain_output_probs=True):
+                    teacher_forcing_ratio=0, retain_output_probs=True, shortlist=None, encoder_mask=None,
+                    deadline=None, max_lengths=None):
         """
         Forward rnn for MAX_LENGTH steps.  Look at :func:`seq2seq.models.DecoderRNN.DecoderRNN.forward_rnn` for details.
         """
+        steps = self.beam_steps(inputs, encoder_hidden, encoder_outputs, function, teacher_forcing_ratio,
+                                retain_output_probs, shortlist, encoder_mask, deadline, max_lengths)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def beam_steps(self, inputs=None, encoder_hidden=None, encoder_outputs=None, function=F.log_softmax,
+                   teacher_forcing_ratio=0, retain_output_probs=True, shortlist=None, encoder_mask=None,
+                   deadline=None, max_lengths=None):
+        """
+        Runs the beam search of :meth:`forward` one decoding step at a time, so that callers can follow the beams
+        while they are decoded, e.g. to stream the prefix all of them agree on.
+
+        Yields: predecessors, symbols
+            - **predecessors** (batch*k, 1): row of the previous step every beam extends
+            - **symbols** (batch*k, 1): symbols emitted by the beams at this step
+
+        Returns:
+            the outputs of :meth:`forward`, as the value of the final `StopIteration`
+        """
+        if shortlist is not None:
+            shortlist = self.rnn.gather_shortlist(shortlist)
 
         inputs, batch_size, max_length = self.rnn._validate_args(inputs, encoder_hidden, encoder_outputs,
                                                                  function, teacher_forcing_ratio)
+        # the search runs up to the longest of the maximum lengths of the sequences
+        caps = [max_length] * batch_size
+        if max_lengths is not None:
+            caps = [min(max_length, int(n)) for n in max_lengths]
+            max_length = max(caps)
 
-        self.pos_index = Variable(torch.LongTensor(range(batch_size)) * self.k).cuda().view(-1, 1)
+        device = inputs.device
+        # offsets of the beams of every sequence in the b*k rows, local to the call so that concurrent calls on a
+        # shared decoder do not interfere
+        pos_index = (torch.arange(batch_size, device=device) * self.k).view(-1, 1)
 
         # Inflate the initial hidden states to be of size: b*k x h
         encoder_hidden = self.rnn._init_state(encoder_hidden)
@@ -104,18 +149,21 @@ class TopKDecoder(torch.nn.Module):
         # ... same idea for encoder_outputs and decoder_outputs
         if self.rnn.use_attention:
             inflated_encoder_outputs = _inflate(encoder_outputs, self.k, 0)
+            inflated_encoder_mask = None if encoder_mask is None else _inflate(encoder_mask, self.k, 0)
+            inflated_encoder_outputs = attention_context(inflated_encoder_outputs, inflated_encoder_mask)
         else:
             inflated_encoder_outputs = None
+            inflated_encoder_mask = None
 
         # Initialize the scores; for the first step,
         # ignore the inflated copies to avoid duplicate entries in the top k
         sequence_scores = torch.Tensor(batch_size * self.k, 1)
         sequence_scores.fill_(-float('Inf'))
         sequence_scores.index_fill_(0, torch.LongTensor([i * self.k for i in range(0, batch_size)]), 0.0)
-        sequence_scores = Variable(sequence_scores).cuda()
+        sequence_scores = Variable(sequence_scores).to(device)
 
         # Initialize the input vector
-        input_var = Variable(torch.transpose(torch.LongTensor([[self.SOS] * batch_size * self.k]), 0, 1)).cuda()
+        input_var = Variable(torch.transpose(torch.LongTensor([[self.SOS] * batch_size * self.k]), 0, 1)).to(device)
 
         # Store decisions for backtracking
         stored_outputs = list()
@@ -124,11 +172,20 @@ class TopKDecoder(torch.nn.Module):
         stored_emitted_symbols = list()
         stored_hidden = list()
 
-        for _ in range(0, max_length):
+        # best score of the ended hypotheses of every sequence
+        ended_scores = torch.full((batch_size,), -float('inf'), device=device)
+        stopped = False
+        start = time.monotonic()
+        for step in range(0, max_length):
+            if exceeds_deadline(deadline, start, step):
+                stopped = True
+                break
 
             # Run the RNN one step forward
             log_softmax_output, hidden, _ = self.rnn.forward_step(input_var, hidden,
-                                                                  inflated_encoder_outputs, function=function)
+                                                                  inflated_encoder_outputs, function=function,
+                                                                  encoder_mask=inflated_encoder_mask,
+                                                                  shortlist=shortlist)
 
             # If doing local backprop (e.g. supervised training), retain the output layer
             if retain_output_probs:
@@ -144,7 +201,7 @@ class TopKDecoder(torch.nn.Module):
             sequence_scores = scores.view(batch_size * self.k, 1)
 
             # Update fields for next timestep
-            predecessors = (candidates / self.V + self.pos_index.expand_as(candidates)).view(batch_size * self.k, 1)
+            predecessors = (candidates // self.V + pos_index.expand_as(candidates)).view(batch_size * self.k, 1)
             if isinstance(hidden, tuple):
                 hidden = tuple([h.index_select(1, predecessors.squeeze()) for h in hidden])
             else:
@@ -160,11 +217,21 @@ class TopKDecoder(torch.nn.Module):
             stored_predecessors.append(predecessors)
             stored_emitted_symbols.append(input_var)
             stored_hidden.append(hidden)
+            yield predecessors, input_var
+
+            if max_lengths is not None:
+                ended = stored_scores[-1].masked_fill(~eos_indices, -float('inf')).view(batch_size, self.k)
+                ended_scores = torch.max(ended_scores, ended.max(1)[0])
+                live_scores = sequence_scores.view(batch_size, self.k).max(1)[0]
+                if all(step + 1 >= cap or ended_score >= live_score for cap, ended_score, live_score
+                       in zip(caps, ended_scores.tolist(), live_scores.tolist())):
+                    break
 
         # Do backtracking to return the optimal values
         output, h_t, h_n, s, l, p = self._backtrack(stored_outputs, stored_hidden,
                                                     stored_predecessors, stored_emitted_symbols,
-                                                    stored_scores, batch_size, self.hidden_size)
+                                                    stored_scores, pos_index, batch_size, self.hidden_size,
+                                                    caps)
 
         # Build return objects
         decoder_outputs = [step[:, 0, :] for step in output]
@@ -180,10 +247,15 @@ class TopKDecoder(torch.nn.Module):
         metadata['topk_length'] = l
         metadata['topk_sequence'] = p
         metadata['length'] = [seq_len[0] for seq_len in l]
-        metadata['sequence'] = [seq[0] for seq in p]
+        metadata['sequence'] = [seq[:, 0] for seq in p]
+        # the best hypotheses that did not reach their end of sentence symbol or maximum length before the deadline
+        steps = len(stored_emitted_symbols)
+        metadata['truncated'] = [stopped and steps < caps[b] and l[b][0] == steps and int(p[-1][b, 0, 0]) != self.EOS
+                                 for b in range(batch_size)]
         return decoder_outputs, decoder_hidden, metadata
 
-    def _backtrack(self, nw_output, nw_hidden, predecessors, symbols, scores, b, hidden_size):
+    def _backtrack(self, nw_output, nw_hidden, predecessors, symbols, scores, pos_index, b, hidden_size,
+                   lengths=None):
         """Backtracks over batch to generate optimal k-sequences.
 
         Args:
@@ -192,8 +264,10 @@ class TopKDecoder(torch.nn.Module):
             predecessors [(batch*k)] * sequence_length: A Tensor of predecessors
             symbols [(batch*k)] * sequence_length: A Tensor of predicted tokens
             scores [(batch*k)] * sequence_length: A Tensor containing sequence scores for every token t = [0, ... , seq_len - 1]
+            pos_index (batch, 1): A Tensor of the offsets of the first beam of every sequence in the batch*k rows
             b: Size of the batch
             hidden_size: Size of the hidden state
+            lengths [batch]: number of steps to backtrack every sequence from, its maximum length (default: all)
 
         Returns:
             output [(batch, k, vocab_size)] * sequence_length: A list of the output probabilities (p_n)
@@ -223,11 +297,12 @@ class TopKDecoder(torch.nn.Module):
         # the last hidden state of decoding.
         if lstm:
             state_size = nw_hidden[0][0].size()
-            h_n = tuple([torch.zeros(state_size), torch.zeros(state_size)])
+            h_n = tuple([nw_hidden[0][0].new_zeros(state_size), nw_hidden[0][0].new_zeros(state_size)])
         else:
-            h_n = torch.zeros(nw_hidden[0].size()).cuda()
-        l = [[self.rnn.max_length] * self.k for _ in range(b)]  # Placeholder for lengths of top-k sequences
-                                                                # Similar to `h_n`
+            h_n = nw_hidden[0].new_zeros(nw_hidden[0].size())
+        steps = [len(symbols)] * b if lengths is None else [min(len(symbols), n) for n in lengths]
+        l = [[steps[b_idx]] * self.k for b_idx in range(b)]  # Placeholder for lengths of top-k sequences
+                                                             # Similar to `h_n`
 
         # the last step output of the beams are not sorted
         # thus they are sorted here
@@ -241,10 +316,16 @@ class TopKDecoder(torch.nn.Module):
 #        t = self.rnn.max_length - 1
         t = len(nw_output) - 1
         # initialize the back pointer with the sorted order of the last step beams.
-        # add self.pos_index for indexing variable with b*k as the first dimension.
-        t_predecessors = (sorted_idx + self.pos_index.expand_as(sorted_idx)).view(b * self.k)
+        # add pos_index for indexing variable with b*k as the first dimension.
+        t_predecessors = (sorted_idx + pos_index.expand_as(sorted_idx)).view(b * self.k)
 #        print(t, len(nw_output))
         while t >= 0:
+            # the sequences reaching their maximum length at this step start from their own best beams
+            for b_idx in range(b):
+                if steps[b_idx] == t + 1 < len(symbols):
+                    rows = slice(b_idx * self.k, (b_idx + 1) * self.k)
+                    s[b_idx], beam_idx = scores[t][rows].view(-1).topk(self.k)
+                    t_predecessors[rows] = beam_idx + b_idx * self.k
             # Re-order the variables with the back pointer
             current_output = nw_output[t].index_select(0, t_predecessors)
             if lstm:
@@ -254,7 +335,7 @@ class TopKDecoder(torch.nn.Module):
             current_symbol = symbols[t].index_select(0, t_predecessors)
             # Re-order the back pointer of the previous step with the back pointer of
             # the current step
-            t_predecessors = predecessors[t].index_select(0, t_predecessors).squeeze()
+            t_predecessors = predecessors[t].index_select(0, t_predecessors).view(-1)
 
             # This tricky block handles dropped sequences that see EOS earlier.
             # The basic idea is summarized below:
@@ -281,6 +362,9 @@ class TopKDecoder(torch.nn.Module):
                     # the first two dimensions
                     idx = eos_indices[i]
                     b_idx = int(idx[0] / self.k)
+                    # ended after the maximum length of the sequence
+                    if steps[b_idx] < t + 1:
+                        continue
                     # The indices of the replacing position
                     # according to the replacement strategy noted above
                     res_k_idx = self.k - (batch_eos_found[b_idx] % self.k) - 1
@@ -314,9 +398,9 @@ class TopKDecoder(torch.nn.Module):
         # the order (very unlikely)
         s, re_sorted_idx = s.topk(self.k)
         for b_idx in range(b):
-            l[b_idx] = [l[b_idx][k_idx.data[0]] for k_idx in re_sorted_idx[b_idx,:]]
+            l[b_idx] = [l[b_idx][int(k_idx)] for k_idx in re_sorted_idx[b_idx,:]]
 
-        re_sorted_idx = (re_sorted_idx + self.pos_index.expand_as(re_sorted_idx)).view(b * self.k)
+        re_sorted_idx = (re_sorted_idx + pos_index.expand_as(re_sorted_idx)).view(b * self.k)
 
         # Reverse the sequences and re-order at the same time
         # It is reversed because the backtracking happens in reverse time order
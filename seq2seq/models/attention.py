@@ -3,6 +3,78 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 
+def length_mask(lengths, max_len):
+    """
+    Returns a byte tensor of size (batch, max_len) marking the positions beyond the length of each sequence.
+
+    Args:
+        lengths (torch.LongTensor): lengths of the sequences
+        max_len (int): padded length of the sequences
+    """
+    positions = torch.arange(0, max_len, dtype=lengths.dtype, device=lengths.device)
+    return positions.unsqueeze(0) >= lengths.unsqueeze(1)
+
+
+class RaggedContext(object):
+    """
+    Encoded input sequences of uneven lengths grouped by length, so that :class:`Attention` only scores the
+    positions up to the longest sequence of every group instead of the longest sequence of the batch.  The groups
+    are formed once and reused at every decoding step.
+
+    Args:
+        context (batch, input_len, dimensions): tensor containing features of the encoded input sequences
+        lengths (torch.LongTensor): lengths of the input sequences, which are padded at the end
+        max_groups (int, optional): maximum number of groups (default: 4)
+
+    Attributes:
+        UNEVEN_RATIO (float): groups are only formed when less than this part of the positions is unpadded
+    """
+
+    UNEVEN_RATIO = 0.5
+
+    def __init__(self, context, lengths, max_groups=4):
+        self.context = context
+        self.groups = []
+        host_lengths = lengths.tolist()
+        order = sorted(range(len(host_lengths)), key=lambda i: -host_lengths[i])
+        # a new group starts where the lengths fall below half of the longest length of the current group
+        groups = []
+        for i in order:
+            if not groups or (host_lengths[i] * 2 <= host_lengths[groups[-1][0]] and len(groups) < max_groups):
+                groups.append([])
+            groups[-1].append(i)
+        for rows in groups:
+            group_len = max(host_lengths[rows[0]], 1)
+            indices = torch.tensor(rows, dtype=torch.long, device=context.device)
+            self.groups.append((indices, context.index_select(0, indices)[:, :group_len],
+                                length_mask(lengths.index_select(0, indices), group_len)))
+
+    @classmethod
+    def uneven(cls, lengths, max_len):
+        """ Returns whether grouping sequences of the given lengths saves enough computation. """
+        return lengths.size(0) > 1 and float(lengths.sum()) < cls.UNEVEN_RATIO * lengths.size(0) * max_len
+
+    def size(self, dim):
+        return self.context.size(dim)
+
+
+def attention_context(context, mask):
+    """
+    Returns the context to pass to :class:`Attention`: a :class:`RaggedContext` if the padding of `mask` is uneven
+    enough for grouping the sequences by length to pay off, `context` otherwise.
+
+    Args:
+        context (batch, input_len, dimensions): tensor containing features of the encoded input sequences
+        mask (batch, input_len): padding mask of the input sequences, see :func:`length_mask`
+    """
+    if mask is None or isinstance(context, RaggedContext):
+        return context
+    lengths = (mask == 0).long().sum(1)
+    if not RaggedContext.uneven(lengths, mask.size(1)) or not torch.equal(mask, length_mask(lengths, mask.size(1))):
+        return context
+    return RaggedContext(context, lengths)
+
+
 class Attention(nn.Module):
     r"""
     Applies an attention mechanism on the output features from the decoder.
@@ -17,9 +89,12 @@ class Attention(nn.Module):
     Args:
         dim(int): The number of expected features in the output
 
-    Inputs: output, context
+    Inputs: output, context, mask
         - **output** (batch, output_len, dimensions): tensor containing the output features from the decoder.
-        - **context** (batch, input_len, dimensions): tensor containing features of the encoded input sequence.
+        - **context** (batch, input_len, dimensions): tensor containing features of the encoded input sequence,
+          or a :class:`RaggedContext` which carries its own mask.
+        - **mask** (batch, input_len), optional: byte tensor, positions set to 1 are not attended to, e.g. padding
+          of the input sequence (default `None`).
 
     Outputs: output, attn
         - **output** (batch, output_len, dimensions): tensor containing the attended output features from the decoder.
@@ -27,7 +102,8 @@ class Attention(nn.Module):
 
     Attributes:
         linear_out (torch.nn.Linear): applies a linear transformation to the incoming data: :math:`y = Ax + b`.
-        mask (torch.Tensor, optional): applies a :math:`-inf` to the indices specified in the `Tensor`.
+
+    The module keeps no state between calls, so that concurrent calls on one shared model do not interfere.
 
     Examples::
 
@@ -40,34 +116,44 @@ class Attention(nn.Module):
     def __init__(self, dim):
         super(Attention, self).__init__()
         self.linear_out = nn.Linear(dim*2, dim)
-        self.mask = None
 
-    def set_mask(self, mask):
-        """
-        Sets indices to be masked
+    def forward(self, output, context, mask=None):
+        if isinstance(context, RaggedContext):
+            mix, attn = self._ragged_mix(output, context)
+        else:
+            mix, attn = self._mix(output, context, mask)
 
-        Args:
-            mask (torch.Tensor): tensor containing indices to be masked
-        """
-        self.mask = mask
+        return self._combine(mix, output), attn
 
-    def forward(self, output, context):
+    def _combine(self, mix, output):
         batch_size = output.size(0)
         hidden_size = output.size(2)
+        # concat -> (batch, out_len, 2*dim)
+        combined = torch.cat((mix, output), dim=2)
+        # output -> (batch, out_len, dim)
+        return F.tanh(self.linear_out(combined.view(-1, 2 * hidden_size))).view(batch_size, -1, hidden_size)
+
+    def _mix(self, output, context, mask):
+        batch_size = output.size(0)
         input_size = context.size(1)
         # (batch, out_len, dim) * (batch, in_len, dim) -> (batch, out_len, in_len)
-        #print(output.size(), context.size())
         attn = torch.bmm(output, context.transpose(1, 2))
-        if self.mask is not None:
-            attn.data.masked_fill_(self.mask, -float('inf'))
-        attn = F.softmax(attn.view(-1, input_size)).view(batch_size, -1, input_size)
+        if mask is not None:
+            if mask.dim() == 2:
+                mask = mask.unsqueeze(1)
+            attn = attn.masked_fill(mask, -float('inf'))
+        attn = F.softmax(attn.view(-1, input_size), dim=1).view(batch_size, -1, input_size)
 
         # (batch, out_len, in_len) * (batch, in_len, dim) -> (batch, out_len, dim)
         mix = torch.bmm(attn, context)
+        return mix, attn
 
-        # concat -> (batch, out_len, 2*dim)
-        combined = torch.cat((mix, output), dim=2)
-        # output -> (batch, out_len, dim)
-        output = F.tanh(self.linear_out(combined.view(-1, 2 * hidden_size))).view(batch_size, -1, hidden_size)
-
-        return output, attn
+    def _ragged_mix(self, output, context):
+        input_size = context.size(1)
+        mix = output.new_zeros(output.size())
+        attn = output.new_zeros(output.size(0), output.size(1), input_size)
+        for indices, group_context, group_mask in context.groups:
+            group_mix, group_attn = self._mix(output.index_select(0, indices), group_context, group_mask)
+            mix = mix.index_copy(0, indices, group_mix)
+            attn = attn.index_copy(0, indices, F.pad(group_attn, (0, input_size - group_attn.size(2))))
+        return mix, attn
@@ -1,5 +1,7 @@
 """ A base class for RNN. """
+import torch
 import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
 
 
 class BaseRNN(nn.Module):
@@ -43,6 +45,16 @@ class BaseRNN(nn.Module):
             raise ValueError("Unsupported RNN Cell: {0}".format(rnn_cell))
 
         self.dropout_p = dropout_p
+        self.checkpoint_activations = False
+
+    def _checkpoint(self, function, *args):
+        """
+        Calls `function(*args)`, without keeping its intermediate activations for the backward pass when
+        `checkpoint_activations` is set and gradients are computed: they are recomputed in backward instead.
+        """
+        if self.checkpoint_activations and self.training and torch.is_grad_enabled():
+            return checkpoint(function, *args, use_reentrant=False)
+        return function(*args)
 
     def forward(self, *args, **kwargs):
         raise NotImplementedError()
@@ -0,0 +1,107 @@
+""" Fixed-signature views of a model for tracing and export, one module per graph. """
+import torch.nn as nn
+import torch.nn.functional as F
+
+from .attention import length_mask
+
+
+class EncoderGraph(nn.Module):
+    r"""
+    Encodes padded input sequences with an `EncoderRNN`, keeping the padded length of the outputs so that inputs of
+    different lengths padded to the same length share a graph.
+
+    Args:
+        encoder (EncoderRNN): the encoder
+        decoder (DecoderRNN, optional): decoder whose initial state is returned instead of the encoder hidden
+            state (default: `None`)
+        pack (bool, optional): pack the inputs, so that the outputs and hidden state are those of the unpadded
+            inputs; otherwise the padding is encoded like in an encoder without `variable_lengths` (default: True)
+
+    Inputs: input_var, input_lengths
+        - **input_var** (batch, padded_len): tensor containing the padded input symbols
+        - **input_lengths** (batch): tensor containing the lengths of the inputs
+
+    Outputs: encoder_outputs, hidden, encoder_mask
+        - **encoder_outputs** (batch, padded_len, hidden_size): outputs of the encoder, zero beyond the lengths
+          when packing
+        - **hidden** (num_layers, batch, hidden_size): initial hidden state of the decoder, or the encoder hidden
+          state without a decoder
+        - **encoder_mask** (batch, padded_len): byte tensor marking the padded positions
+    """
+
+    def __init__(self, encoder, decoder=None, pack=True):
+        super(EncoderGraph, self).__init__()
+        self.encoder = encoder
+        self.decoder = decoder
+        self.pack = pack
+
+    def forward(self, input_var, input_lengths):
+        padded_len = input_var.size(1)
+        embedded = self.encoder.input_dropout(self.encoder.embedding(input_var))
+        if self.pack:
+            embedded = nn.utils.rnn.pack_padded_sequence(embedded, input_lengths.cpu(), batch_first=True,
+                                                         enforce_sorted=False)
+        output, hidden = self.encoder.rnn(embedded)
+        if self.pack:
+            output, _ = nn.utils.rnn.pad_packed_sequence(output, batch_first=True, total_length=padded_len)
+        if self.decoder is not None:
+            hidden = self.decoder._init_state(hidden)
+        return output, hidden, length_mask(input_lengths, padded_len)
+
+
+class HierarchialGraph(nn.Module):
+    r"""
+    Runs the `HierarchialRNN` of a `HSeq2seq` model over the encoded chunks of the input sequences.
+
+    Args:
+        hrnn (HierarchialRNN): the hierarchial RNN
+        decoder (DecoderRNN): decoder whose initial state is returned
+
+    Inputs: chunk_outputs, encoder_outputs, encoder_mask
+        - **chunk_outputs** (batch, seq_len, hidden_size): encoder outputs at the last position of every chunk
+        - **encoder_outputs** (batch, seq_len * chunk_len, hidden_size): encoder outputs of all the chunks,
+          used for attention
+        - **encoder_mask** (batch, seq_len * chunk_len): byte tensor marking the padding of the chunks
+
+    Outputs: hrnn_outputs, decoder_hidden
+        - **hrnn_outputs** (batch, seq_len, hidden_size): outputs of the hierarchial RNN
+        - **decoder_hidden** (num_layers, batch, hidden_size): initial hidden state of the decoder
+    """
+
+    def __init__(self, hrnn, decoder):
+        super(HierarchialGraph, self).__init__()
+        self.hrnn = hrnn
+        self.decoder = decoder
+
+    def forward(self, chunk_outputs, encoder_outputs, encoder_mask):
+        output, hidden = self.hrnn.rnn(self.hrnn.input_dropout(chunk_outputs))
+        output = self.hrnn.attend(output, chunk_outputs, encoder_outputs, encoder_mask)
+        return output, self.decoder._init_state(hidden)
+
+
+class DecoderStepGraph(nn.Module):
+    r"""
+    Runs one decoding step of a `DecoderRNN`: embedding, RNN, attention and output projection.
+
+    Args:
+        decoder (DecoderRNN): the decoder
+
+    Inputs: input_var, hidden, encoder_outputs, encoder_mask
+        - **input_var** (batch, 1): tensor containing the previous symbols
+        - **hidden** (num_layers, batch, hidden_size): decoder hidden state
+        - **encoder_outputs** (batch, padded_len, hidden_size): outputs of :class:`EncoderGraph`
+        - **encoder_mask** (batch, padded_len): padding mask of :class:`EncoderGraph`
+
+    Outputs: log_probs, hidden
+        - **log_probs** (batch, vocab_size): log probabilities of the next symbols
+        - **hidden** (num_layers, batch, hidden_size): decoder hidden state after the step
+    """
+
+    def __init__(self, decoder):
+        super(DecoderStepGraph, self).__init__()
+        self.decoder = decoder
+
+    def forward(self, input_var, hidden, encoder_outputs, encoder_mask):
+        log_probs, hidden, _ = self.decoder.forward_step(input_var, hidden, encoder_outputs,
+                                                         function=F.log_softmax, encoder_mask=encoder_mask)
+        return log_probs.squeeze(1), hidden
@@ -1,9 +1,7 @@
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
+from .attention import Attention
 
 
-class HAttention(nn.Module):
+class HAttention(Attention):
     r"""
     Applies an attention mechanism on the output features from the decoder.
 
@@ -17,9 +15,11 @@ class HAttention(nn.Module):
     Args:
         dim(int): The number of expected features in the output
 
-    Inputs: output, context
+    Inputs: output, context, mask
         - **output** (batch, output_len, dimensions): tensor containing the output features from the decoder.
         - **context** (batch, input_len, dimensions): tensor containing features of the encoded input sequence.
+        - **mask** (batch, input_len), optional: byte tensor, positions set to 1 are not attended to, e.g. padding
+          of the chunks of the input sequence (default `None`).
 
     Outputs: output, attn
         - **output** (batch, output_len, dimensions): tensor containing the attended output features from the decoder.
@@ -38,35 +38,4 @@ class HAttention(nn.Module):
 
     """
     def __init__(self, dim):
-        super(HAttention, self).__init__()
-        self.linear_out = nn.Linear(dim*2, dim)
-        self.mask = None
-
-    def set_mask(self, mask):
-        """
-        Sets indices to be masked
-
-        Args:
-            mask (torch.Tensor): tensor containing indices to be masked
-        """
-        self.mask = mask
-
-    def forward(self, output, context):
-        batch_size = output.size(0)
-        hidden_size = output.size(2)
-        input_size = context.size(1)
-        # (batch, out_len, dim) * (batch, in_len, dim) -> (batch, out_len, in_len)
-        attn = torch.bmm(output, context.transpose(1, 2))
-        if self.mask is not None:
-            attn.data.masked_fill_(self.mask, -float('inf'))
-        attn = F.softmax(attn.view(-1, input_size)).view(batch_size, -1, input_size)
-
-        # (batch, out_len, in_len) * (batch, in_len, dim) -> (batch, out_len, dim)
-        mix = torch.bmm(attn, context)
-
-        # concat -> (batch, out_len, 2*dim)
-        combined = torch.cat((mix, output), dim=2)
-        # output -> (batch, out_len, dim)
-        output = F.tanh(self.linear_out(combined.view(-1, 2 * hidden_size))).view(batch_size, -1, hidden_size)
-
-        return output, attn
+        super(HAttention, self).__init__(dim)
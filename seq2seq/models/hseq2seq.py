@@ -2,6 +2,9 @@ import torch.nn as nn
 import torch.nn.functional as F
 import torch
 
+from .seq2seq import share_embedding
+from .attention import length_mask
+
 class HSeq2seq(nn.Module):
     """ Standard sequence-to-sequence architecture with configurable encoder
     and decoder.
@@ -10,17 +13,28 @@ class HSeq2seq(nn.Module):
         encoder (EncoderRNN): object of EncoderRNN
         decoder (DecoderRNN): object of DecoderRNN
         decode_function (func, optional): function to generate symbols from output hidden states (default: F.log_softmax)
+        share_embeddings (bool, optional): share the embeddings of the encoder and the decoder, for source and
+            target fields with a joint vocabulary, see :func:`seq2seq.dataset.fields.build_joint_vocab`
+            (default: False)
 
-    Inputs: input_variable, input_lengths, target_variable, teacher_forcing_ratio, volatile
+    Inputs: input_variable, input_lengths, chunk_lengths, target_variable, teacher_forcing_ratio, volatile, shortlist,
+            max_lengths
         - **input_variable** (list, option): list of sequences, whose length is the batch size and within which
           each sequence is a list of token IDs. This information is forwarded to the encoder.
         - **input_lengths** (list of int, optional): A list that contains the lengths of sequences
-            in the mini-batch, it must be provided when using variable length RNN (default: `None`)
+            in the mini-batch, it must be provided when using variable length RNN.  Neither the hierarchial RNN
+            nor the decoder attend to the chunks beyond the lengths (default: `None`)
+        - **chunk_lengths** (batch, seq_len): tensor containing the lengths of the chunks, the hierarchial RNN does
+            not attend to the padding of the chunks
         - **target_variable** (list, optional): list of sequences, whose length is the batch size and within which
           each sequence is a list of token IDs. This information is forwarded to the decoder.
         - **teacher_forcing_ratio** (int, optional): The probability that teacher forcing will be used. A random number
           is drawn uniformly from 0-1 for every decoding token, and if the sample is smaller than the given value,
           teacher forcing would be used (default is 0)
+        - **shortlist** (torch.LongTensor, optional): sorted ids of the only target words the decoder scores,
+          see :class:`seq2seq.models.DecoderRNN` (default is `None`)
+        - **max_lengths** (batch), optional: maximum number of decoding steps of every sequence, see
+          :class:`seq2seq.models.DecoderRNN` (default is `None`)
 
     Outputs: decoder_outputs, decoder_hidden, ret_dict
         - **decoder_outputs** (batch): batch-length list of tensors with size (max_length, hidden_size) containing the
@@ -34,20 +48,34 @@ class HSeq2seq(nn.Module):
 
     """
 
-    def __init__(self, encoder, hrnn, decoder, decode_function=F.log_softmax):
+    def __init__(self, encoder, hrnn, decoder, decode_function=F.log_softmax, share_embeddings=False):
         super(HSeq2seq, self).__init__()
         self.encoder = encoder
         self.decoder = decoder
         self.hrnn = hrnn
         self.decode_function = decode_function
+        self.share_embeddings = share_embeddings
+        if share_embeddings:
+            share_embedding(encoder, decoder)
 
     def flatten_parameters(self):
-        self.encoder.rnn.flatten_parameters()
-        self.hrnn.rnn.flatten_parameters()
-        self.decoder.rnn.flatten_parameters()
+        for rnn in [self.encoder.rnn, self.hrnn.rnn, self.decoder.rnn]:
+            # dynamically quantized RNNs keep packed weights and cannot be flattened
+            if hasattr(rnn, 'flatten_parameters'):
+                rnn.flatten_parameters()
 
-    def forward(self, input_variable, input_lengths=None, chunk_lengths =None,  target_variable=None,
-                teacher_forcing_ratio=0):
+    def encode(self, input_variable, input_lengths=None, chunk_lengths=None):
+        """
+        Encodes the input sequences, the first half of :meth:`forward`.
+
+        Returns: encoder_outputs, encoder_hidden, encoder_mask
+            - **encoder_outputs** (batch, seq_len, hidden_size): outputs of the hierarchial RNN, attended to by the
+              decoder
+            - **encoder_hidden** (num_layers, batch, hidden_size): hidden state of the hierarchial RNN, the decoder
+              starts from it, see :meth:`seq2seq.models.DecoderRNN._init_state`
+            - **encoder_mask** (batch, seq_len): byte tensor marking the padded chunks, `None` without
+              `input_lengths`
+        """
         #print(input_variable.size())
         #print(input_variable.data)
         transformed_input = input_variable.view(-1, input_variable.size()[-1])
@@ -75,23 +103,41 @@ class HSeq2seq(nn.Module):
                                                                      encoder_outputs.size()[-1])
         #print("Outputs of Encoder", encoder_outputs.size(), reshaped_encoder_outputs.size())
 
-        last_outputs = reshaped_encoder_outputs[:, :, -1, :].contiguous().view(batch_size, sequence_length, -1).contiguous() # From [Batch Size, Seq Length, Chunk Length]
+        # outputs at the last word of every chunk, the outputs past it depend on how much the chunk is padded
+        last_index = (chunk_lengths.contiguous().view(batch_size, sequence_length, 1, 1) - 1).clamp(min=0)
+        last_outputs = reshaped_encoder_outputs.gather(2, last_index.expand(-1, -1, -1, encoder_outputs.size(-1)))
+        last_outputs = last_outputs.view(batch_size, sequence_length, -1)
         #print("Last outputs", last_outputs.size())
         #reshaped_encoder_outputs = last_outputs.view(batch_size, sequence_length, -1)
 
-        sequence_input_lengths = [sequence_length] * batch_size
+        sequence_input_lengths = [sequence_length] * batch_size if input_lengths is None else list(input_lengths)
         #sequence_input_lengths = chunk_lengths.view(-1)
         word_len = reshaped_encoder_outputs.size()[2]
         reshaped_encoder_outputs = reshaped_encoder_outputs.view(batch_size, sequence_length * word_len, -1).contiguous()
         #print("Reshaped Outputs", reshaped_encoder_outputs.size())
+        # padded words of the chunks and padded chunks of the sequences are not attended to
+        word_mask = length_mask(chunk_lengths.contiguous().view(-1), word_len).view(batch_size, sequence_length,
+                                                                                    word_len)
+        sequence_mask = None
+        if input_lengths is not None:
+            sequence_mask = length_mask(torch.as_tensor(input_lengths, device=chunk_lengths.device), sequence_length)
+            word_mask = word_mask | sequence_mask.unsqueeze(2)
         hrnn_outputs, hrnn_hidden = self.hrnn(last_outputs,
                                               reshaped_encoder_outputs,
-                                              sequence_input_lengths)
+                                              sequence_input_lengths,
+                                              encoder_mask=word_mask.view(batch_size, sequence_length * word_len))
         #print("HRNN Outputs", hrnn_outputs.size())
+        return hrnn_outputs, hrnn_hidden, sequence_mask
 
+    def forward(self, input_variable, input_lengths=None, chunk_lengths =None,  target_variable=None,
+                teacher_forcing_ratio=0, shortlist=None, max_lengths=None):
+        hrnn_outputs, hrnn_hidden, sequence_mask = self.encode(input_variable, input_lengths, chunk_lengths)
         result = self.decoder(inputs=target_variable,
                               encoder_hidden=hrnn_hidden,
                               encoder_outputs=hrnn_outputs,
                               function=self.decode_function,
-                              teacher_forcing_ratio=teacher_forcing_ratio)
+                              teacher_forcing_ratio=teacher_forcing_ratio,
+                              shortlist=shortlist,
+                              max_lengths=max_lengths,
+                              encoder_mask=sequence_mask)
         return result
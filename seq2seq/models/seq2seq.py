@@ -1,6 +1,19 @@
+import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from .TopKDecoder import TopKDecoder
+from .attention import length_mask
+
+
+def share_embedding(encoder, decoder):
+    """ Makes the encoder use the embedding weights of the decoder. """
+    decoder_rnn = decoder.rnn if isinstance(decoder, TopKDecoder) else decoder
+    if encoder.embedding.weight.size() != decoder_rnn.embedding.weight.size():
+        raise ValueError("Embeddings can only be shared by an encoder and a decoder with the same vocabulary "
+                         "and hidden sizes.")
+    encoder.embedding.weight = decoder_rnn.embedding.weight
+
 class Seq2seq(nn.Module):
     """ Standard sequence-to-sequence architecture with configurable encoder
     and decoder.
@@ -9,17 +22,25 @@ class Seq2seq(nn.Module):
         encoder (EncoderRNN): object of EncoderRNN
         decoder (DecoderRNN): object of DecoderRNN
         decode_function (func, optional): function to generate symbols from output hidden states (default: F.log_softmax)
+        share_embeddings (bool, optional): share the embeddings of the encoder and the decoder, for source and
+            target fields with a joint vocabulary, see :func:`seq2seq.dataset.fields.build_joint_vocab`
+            (default: False)
 
-    Inputs: input_variable, input_lengths, target_variable, teacher_forcing_ratio, volatile
+    Inputs: input_variable, input_lengths, target_variable, teacher_forcing_ratio, volatile, shortlist, max_lengths
         - **input_variable** (list, option): list of sequences, whose length is the batch size and within which
           each sequence is a list of token IDs. This information is forwarded to the encoder.
         - **input_lengths** (list of int, optional): A list that contains the lengths of sequences
-            in the mini-batch, it must be provided when using variable length RNN (default: `None`)
+            in the mini-batch, it must be provided when using variable length RNN.  The decoder does not attend to
+            the positions beyond the lengths (default: `None`)
         - **target_variable** (list, optional): list of sequences, whose length is the batch size and within which
           each sequence is a list of token IDs. This information is forwarded to the decoder.
         - **teacher_forcing_ratio** (int, optional): The probability that teacher forcing will be used. A random number
           is drawn uniformly from 0-1 for every decoding token, and if the sample is smaller than the given value,
           teacher forcing would be used (default is 0)
+        - **shortlist** (torch.LongTensor, optional): sorted ids of the only target words the decoder scores,
+          see :class:`seq2seq.models.DecoderRNN` (default is `None`)
+        - **max_lengths** (batch), optional: maximum number of decoding steps of every sequence, see
+          :class:`seq2seq.models.DecoderRNN` (default is `None`)
 
     Outputs: decoder_outputs, decoder_hidden, ret_dict
         - **decoder_outputs** (batch): batch-length list of tensors with size (max_length, hidden_size) containing the
@@ -33,22 +54,48 @@ class Seq2seq(nn.Module):
 
     """
 
-    def __init__(self, encoder, decoder, decode_function=F.log_softmax):
+    def __init__(self, encoder, decoder, decode_function=F.log_softmax, share_embeddings=False):
         super(Seq2seq, self).__init__()
         self.encoder = encoder
         self.decoder = decoder
         self.decode_function = decode_function
+        self.share_embeddings = share_embeddings
+        if share_embeddings:
+            share_embedding(encoder, decoder)
 
     def flatten_parameters(self):
-        self.encoder.rnn.flatten_parameters()
-        self.decoder.rnn.flatten_parameters()
+        for rnn in [self.encoder.rnn, self.decoder.rnn]:
+            # dynamically quantized RNNs keep packed weights and cannot be flattened
+            if hasattr(rnn, 'flatten_parameters'):
+                rnn.flatten_parameters()
 
-    def forward(self, input_variable, input_lengths=None, target_variable=None,
-                teacher_forcing_ratio=0):
+    def encode(self, input_variable, input_lengths=None):
+        """
+        Encodes the input sequences, the first half of :meth:`forward`.
+
+        Returns: encoder_outputs, encoder_hidden, encoder_mask
+            - **encoder_outputs** (batch, input_len, hidden_size): outputs attended to by the decoder
+            - **encoder_hidden** (num_layers * num_directions, batch, hidden_size): hidden state the decoder starts
+              from, see :meth:`seq2seq.models.DecoderRNN._init_state`
+            - **encoder_mask** (batch, input_len): byte tensor marking the padded positions of `encoder_outputs`,
+              `None` without `input_lengths`
+        """
         encoder_outputs, encoder_hidden = self.encoder(input_variable, input_lengths)
+        encoder_mask = None
+        if input_lengths is not None:
+            encoder_mask = length_mask(torch.as_tensor(input_lengths, device=encoder_outputs.device),
+                                       encoder_outputs.size(1))
+        return encoder_outputs, encoder_hidden, encoder_mask
+
+    def forward(self, input_variable, input_lengths=None, target_variable=None,
+                teacher_forcing_ratio=0, shortlist=None, max_lengths=None):
+        encoder_outputs, encoder_hidden, encoder_mask = self.encode(input_variable, input_lengths)
         result = self.decoder(inputs=target_variable,
                               encoder_hidden=encoder_hidden,
                               encoder_outputs=encoder_outputs,
                               function=self.decode_function,
-                              teacher_forcing_ratio=teacher_forcing_ratio)
+                              teacher_forcing_ratio=teacher_forcing_ratio,
+                              shortlist=shortlist,
+                              max_lengths=max_lengths,
+                              encoder_mask=encoder_mask)
         return result
@@ -6,6 +6,10 @@ class Optimizer(object):
     """ The Optimizer class encapsulates torch.optim package and provides functionalities
     for learning rate scheduling and gradient norm clipping.
 
+    The parameters are the fp32 master weights: with reduced precision training (bfloat16 autocast, see
+    :func:`seq2seq.util.precision.autocast`) only the forward computation is done in bfloat16, the gradients,
+    the clipping and the updates stay in fp32.
+
     Args:
         optim (torch.optim.Optimizer): optimizer object, the parameters to be optimized
             should be given when instantiating the object, e.g. torch.optim.SGD(params)
@@ -0,0 +1,5 @@
+from .batcher import MicroBatcher
+from .scheduler import DecodeScheduler
+from .streaming import iterate_async
+from .http_server import InferenceServer, load_predictor
+from .prefork import PreforkServer
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher(object):
+    """
+    Groups the requests of an asyncio application into micro-batches for a batched predictor.
+
+    Requests are queued by :meth:`predict`.  A batch is formed from the first queued request and the requests
+    arriving within `max_delay` seconds after it, up to `max_batch_size` requests, and is run by `predict_batch` on
+    a worker thread so that the event loop keeps accepting requests meanwhile.  The requests queued while a batch
+    runs form the next batch.
+
+    Args:
+        predict_batch (callable): takes a list of source sequences and returns the list of their predictions,
+            e.g. :meth:`seq2seq.evaluator.Predictor.predict_batch`
+        max_batch_size (int, optional): maximum number of requests in a batch (default: 32)
+        max_delay (float, optional): maximum time in seconds to wait for more requests after the first request of
+            a batch (default: 0.005)
+        executor (concurrent.futures.Executor, optional): executor running the batches (default: a single thread)
+
+    Attributes:
+        requests (int): number of predicted requests
+        batches (int): number of predicted batches
+
+    Examples::
+
+         >>> batcher = MicroBatcher(Predictor(model, src_vocab, tgt_vocab).predict_batch)
+         >>> batcher.start()
+         >>> tgt_seq = await batcher.predict("1 3 5 7 9".split())
+    """
+
+    def __init__(self, predict_batch, max_batch_size=32, max_delay=0.005, executor=None):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1)
+        self.requests = 0
+        self.batches = 0
+        self.logger = logging.getLogger(__name__)
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """ Starts forming batches, from a coroutine running in the event loop of the application. """
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        """ Stops forming batches, the queued requests are cancelled. """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+        self._task = None
+
+    async def predict(self, src_seq):
+        """
+        Queues a source sequence and waits for its prediction.
+
+        Args:
+            src_seq (list): list of tokens in source language
+
+        Returns:
+            tgt_seq (list): list of tokens in target language
+        """
+        if self._task is None:
+            self.start()
+        future = asyncio.get_event_loop().create_future()
+        self._queue.put_nowait((src_seq, future))
+        return await future
+
+    def stats(self):
+        """ Returns the request and batch counters. """
+        return {'requests': self.requests, 'batches': self.batches}
+
+    async def _next_batch(self):
+        loop = asyncio.get_event_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # clients that went away do not need a prediction
+        return [(src_seq, future) for src_seq, future in batch if not future.done()]
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            try:
+                tgt_seqs = await loop.run_in_executor(self.executor, self.predict_batch,
+                                                      [src_seq for src_seq, _ in batch])
+            except Exception as e:
+                self.logger.exception("Prediction of a batch of %d requests failed", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.requests += len(batch)
+            self.batches += 1
+            for (_, future), tgt_seq in zip(batch, tgt_seqs):
+                if not future.done():
+                    future.set_result(tgt_seq)
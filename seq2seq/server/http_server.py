@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from seq2seq.models import HSeq2seq
+from seq2seq.evaluator import Predictor, HierarchialPredictor, CachedPredictor
+from seq2seq.util.bundle import InferenceBundle
+from seq2seq.util.checkpoint import Checkpoint
+from .batcher import MicroBatcher
+from .scheduler import DecodeScheduler
+from .streaming import iterate_async
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+def load_predictor(path, **kwargs):
+    """
+    Loads a model and creates the predictor matching its type.
+
+    Args:
+        path (str): path of an inference bundle file or of a checkpoint directory
+        **kwargs: passed to the predictor, e.g. `use_bf16`, `shortlist` or `length_predictor`
+
+    Returns:
+        Predictor or HierarchialPredictor: `HierarchialPredictor` for `HSeq2seq` models, `Predictor` otherwise
+    """
+    if os.path.isfile(path):
+        loaded = InferenceBundle.load(path)
+    else:
+        loaded = Checkpoint.load(path)
+    predictor_class = HierarchialPredictor if isinstance(loaded.model, HSeq2seq) else Predictor
+    return predictor_class(loaded.model, loaded.input_vocab, loaded.output_vocab, **kwargs)
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, message):
+        super(HttpError, self).__init__(message)
+        self.status = status
+
+
+class InferenceServer(object):
+    """
+    HTTP/JSON inference server on asyncio, predicting the concurrent requests in micro-batches formed by a
+    :class:`seq2seq.server.batcher.MicroBatcher`, or decoding them with continuous batching by a
+    :class:`seq2seq.server.scheduler.DecodeScheduler`.
+
+    Endpoints:
+
+    - `POST /predict` with `{"src": "1 3 5"}` or `{"src": ["1", "3", "5"]}` answers `{"tgt": ["5", "3", "1", "<eos>"]}`.
+      A text is split into tokens by `predictor.tokenize`.
+      The tokens of a `HSeq2seq` model are chunks of sub-tokens separated by `|`.
+      A request with a latency budget in seconds, e.g. `{"src": "1 3 5", "budget": 0.1}`, is predicted by
+      `predictor.predict_with_deadline` on the threads of the streamed requests instead of being batched, and
+      answers `{"tgt": [...], "truncated": false}`.  The budget runs from the arrival of the request, so the time
+      it waits for a thread is charged against it, and a request whose budget ran out before decoding starts
+      answers `{"tgt": [], "truncated": true}`.
+    - `POST /predict_stream` with the same body streams the predicted tokens as they are decoded, in a chunked
+      response of one `{"token": "5"}` JSON line per token.  Streamed requests are decoded by
+      `predictor.predict_stream` on their own thread, up to `max_streams` at once, instead of being batched.
+    - `GET /health` answers `{"status": "ok", "pid": ...}`, the counters of the batcher and, for a
+      :class:`seq2seq.evaluator.CachedPredictor`, the statistics of its cache under `cache`.  The cache answers
+      the micro-batched requests, continuous batching and streaming decode every request.
+
+    Connections are kept alive between requests unless the client asks otherwise.
+
+    Args:
+        predictor (Predictor or HierarchialPredictor): predictor with a `predict_batch` method, see
+            :func:`load_predictor`
+        host (str, optional): address to listen on (default: 127.0.0.1)
+        port (int, optional): port to listen on, 0 picks a free port (default: 8000)
+        max_batch_size (int, optional): maximum number of requests in a batch (default: 32)
+        max_delay (float, optional): maximum time in seconds a request waits for more requests to batch with
+            (default: 0.005)
+        max_body_size (int, optional): maximum size of a request body in bytes (default: 1 MiB)
+        continuous (bool, optional): decode greedily with continuous batching instead of forming micro-batches,
+            requests then join and leave the running batch at every decoding step, beam search models and
+            shortlists are rejected with a ValueError (default: False)
+        max_slots (int, optional): maximum number of sequences decoded together with continuous batching
+            (default: 64)
+        max_streams (int, optional): maximum number of responses streamed at once (default: 4)
+        sock (socket.socket, optional): listening socket to accept connections from instead of binding `host`
+            and `port`, e.g. one shared by pre-forked workers (default: None)
+
+    Examples::
+
+         >>> server = InferenceServer(load_predictor('model.bundle'), port=8000)
+         >>> server.serve_forever()
+    """
+
+    def __init__(self, predictor, host='127.0.0.1', port=8000, max_batch_size=32, max_delay=0.005,
+                 max_body_size=1 << 20, continuous=False, max_slots=64, max_streams=4, sock=None):
+        self.predictor = predictor
+        self.host = host
+        self.port = port
+        self.sock = sock
+        self.max_body_size = max_body_size
+        if continuous:
+            self.batcher = DecodeScheduler(predictor, max_slots=max_slots)
+        else:
+            self.batcher = MicroBatcher(predictor.predict_batch, max_batch_size=max_batch_size,
+                                        max_delay=max_delay)
+        self.stream_executor = ThreadPoolExecutor(max_workers=max_streams, thread_name_prefix='stream')
+        self.logger = logging.getLogger(__name__)
+        self._server = None
+
+    async def start(self):
+        """ Starts listening, `port` is updated with the bound port. """
+        self.batcher.start()
+        if self.sock is None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        else:
+            self._server = await asyncio.start_server(self._handle, sock=self.sock)
+        self.host, self.port = self._server.sockets[0].getsockname()[:2]
+        self.logger.info("Serving on http://%s:%d", self.host, self.port)
+
+    async def close(self):
+        """ Stops listening and cancels the pending requests. """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.stop()
+
+    def serve_forever(self):
+        """ Runs the server until interrupted. """
+        async def serve():
+            await self.start()
+            try:
+                await self._server.serve_forever()
+            finally:
+                await self.close()
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'malformed request line'}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {'error': 'invalid Content-Length'}, keep_alive=False)
+                    break
+                if length > self.max_body_size:
+                    await self._respond(writer, 413, {'error': 'request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                if path.split('?')[0] == '/predict_stream' and method == 'POST':
+                    keep_alive = await self._stream(writer, body, keep_alive)
+                    if not keep_alive:
+                        break
+                    continue
+                try:
+                    status, payload = 200, await self._route(method, path.split('?')[0], body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception:
+                    self.logger.exception("Failed to answer %s %s", method, path)
+                    status, payload = 500, {'error': 'prediction failed'}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if path == '/health':
+            if method != 'GET':
+                raise HttpError(405, 'use GET')
+            health = {'status': 'ok', 'pid': os.getpid()}
+            health.update(self.batcher.stats())
+            if isinstance(self.predictor, CachedPredictor):
+                health['cache'] = self.predictor.stats()
+            return health
+        if path == '/predict':
+            if method != 'POST':
+                raise HttpError(405, 'use POST')
+            arrival = time.monotonic()
+            request = self._parse_body(body)
+            src_seq = self._parse_source(request)
+            budget = request.get('budget')
+            if budget is None:
+                return {'tgt': await self.batcher.predict(src_seq)}
+            if isinstance(budget, bool) or not isinstance(budget, (int, float)) or budget <= 0:
+                raise HttpError(400, '"budget" must be a positive number of seconds')
+            loop = asyncio.get_running_loop()
+            tgt_seq, truncated = await loop.run_in_executor(self.stream_executor, self._predict_before, src_seq,
+                                                            arrival + budget)
+            return {'tgt': tgt_seq, 'truncated': truncated}
+        if path == '/predict_stream':
+            raise HttpError(405, 'use POST')
+        raise HttpError(404, 'unknown path {}'.format(path))
+
+    def _predict_before(self, src_seq, deadline):
+        # the time spent waiting for a thread counts against the budget
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return [], True
+        return self.predictor.predict_with_deadline(src_seq, left)
+
+    def _parse_body(self, body):
+        try:
+            request = json.loads(body.decode('utf-8'))
+        except ValueError:
+            request = None
+        if not isinstance(request, dict) or 'src' not in request:
+            raise HttpError(400, 'expected a JSON object with a "src" field')
+        return request
+
+    def _parse_source(self, request):
+        src = request['src']
+        src_seq = self.predictor.tokenize(src) if isinstance(src, str) else src
+        if not isinstance(src_seq, list) or not src_seq or not all(isinstance(tok, str) for tok in src_seq):
+            raise HttpError(400, '"src" must be a non-empty string or list of tokens')
+        return src_seq
+
+    async def _stream(self, writer, body, keep_alive):
+        try:
+            src_seq = self._parse_source(self._parse_body(body))
+        except HttpError as e:
+            await self._respond(writer, e.status, {'error': str(e)}, keep_alive)
+            return keep_alive
+        head = ('HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n'
+                'Connection: {}\r\n\r\n'.format('keep-alive' if keep_alive else 'close'))
+        writer.write(head.encode('latin-1'))
+        try:
+            async for tok in iterate_async(self.predictor.predict_stream(src_seq), self.stream_executor):
+                line = json.dumps({'token': tok}).encode('utf-8') + b'\n'
+                writer.write('{:x}\r\n'.format(len(line)).encode('latin-1') + line + b'\r\n')
+                await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception:
+            # the status is sent already, the response is cut short instead
+            self.logger.exception("Failed to stream a prediction")
+            return False
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+        return keep_alive
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        head = ('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n'
+                .format(status, REASONS[status], len(body), 'keep-alive' if keep_alive else 'close'))
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
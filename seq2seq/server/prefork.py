@@ -0,0 +1,158 @@
+import os
+import gc
+import signal
+import socket
+import asyncio
+import logging
+
+import torch
+
+from .http_server import InferenceServer
+from .scheduler import DecodeScheduler
+
+
+class PreforkServer(object):
+    """
+    Multi-process CPU serving: a master process holding the loaded predictor forks `workers` processes, each
+    running its own :class:`seq2seq.server.http_server.InferenceServer` with its own request queue on a listening
+    socket they share, the kernel hands every new connection to one of them.
+
+    The workers share the weight pages of the master copy-on-write, serving never writes to the weights so they
+    stay shared and the memory used by a worker is mostly its activations.  The weights of an inference bundle are
+    memory-mapped from the file and shared with any process mapping it as well.  The objects of the master are
+    moved out of the garbage collector's reach with `gc.freeze` before forking, so that collections in the workers
+    do not touch, and copy, their pages.
+
+    Every worker runs `threads_per_worker` torch threads, pinned to its own cores when there are enough of them.
+    The master restarts the workers that die and stops them all on SIGTERM or SIGINT.  Prediction must not run in
+    the master before forking: the thread pool of torch does not survive a fork.
+
+    Args:
+        predictor (Predictor or HierarchialPredictor): predictor shared by the workers, see
+            :func:`seq2seq.server.http_server.load_predictor`
+        host (str, optional): address to listen on (default: 127.0.0.1)
+        port (int, optional): port to listen on, 0 picks a free port (default: 8000)
+        workers (int, optional): number of worker processes (default: number of cores / `threads_per_worker`)
+        threads_per_worker (int, optional): number of torch threads of a worker (default: 1)
+        pin_workers (bool, optional): pins every worker to its own `threads_per_worker` cores (default: True)
+        **server_kwargs: passed to the `InferenceServer` of every worker, e.g. `max_batch_size` or `continuous`
+
+    Examples::
+
+         >>> server = PreforkServer(load_predictor('model.bundle'), port=8000, workers=8, threads_per_worker=2)
+         >>> server.serve_forever()
+    """
+
+    def __init__(self, predictor, host='127.0.0.1', port=8000, workers=None, threads_per_worker=1,
+                 pin_workers=True, **server_kwargs):
+        if server_kwargs.get('continuous'):
+            # fail here rather than in every worker
+            DecodeScheduler.check(predictor)
+        self.predictor = predictor
+        self.host = host
+        self.port = port
+        self.cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+        num_cores = len(self.cores) if self.cores is not None else (os.cpu_count() or 1)
+        self.threads_per_worker = threads_per_worker
+        self.workers = workers if workers is not None else max(1, num_cores // threads_per_worker)
+        self.pin_workers = pin_workers and self.cores is not None and \
+            self.workers * threads_per_worker <= num_cores
+        self.server_kwargs = server_kwargs
+        self.logger = logging.getLogger(__name__)
+        self._sock = None
+        self._children = {}
+        self._stopping = False
+
+    def start(self):
+        """ Binds the listening socket, `port` is updated with the bound port, and forks the workers. """
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(socket.SOMAXCONN)
+        self._sock.setblocking(False)
+        self.port = self._sock.getsockname()[1]
+        self._stopping = False
+
+        self.predictor.model.eval()
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+        for index in range(self.workers):
+            self._spawn(index)
+        self.logger.info("Serving on http://%s:%d with %d workers", self.host, self.port, self.workers)
+
+    def stop(self):
+        """ Asks the workers to stop, they finish answering their connections first. """
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def join(self):
+        """ Waits for the workers, restarting the ones that die until :meth:`stop` is called. """
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self._children.pop(pid, None)
+            if index is None:
+                continue
+            if not self._stopping:
+                self.logger.warning("Worker %d (pid %d) exited with status %d, restarting it", index, pid, status)
+                self._spawn(index)
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+
+    def serve_forever(self):
+        """ Runs the workers until the master receives SIGTERM or SIGINT. """
+        def handle(signum, frame):
+            self.stop()
+        previous = [(signum, signal.signal(signum, handle)) for signum in (signal.SIGTERM, signal.SIGINT)]
+        try:
+            self.start()
+            self.join()
+        finally:
+            for signum, handler in previous:
+                signal.signal(signum, handler)
+
+    def _spawn(self, index):
+        pid = os.fork()
+        if pid:
+            self._children[pid] = index
+            return
+        status = 1
+        try:
+            self._run_worker(index)
+            status = 0
+        except BaseException:
+            self.logger.exception("Worker %d failed", index)
+        finally:
+            # a worker never returns into the code of the master
+            os._exit(status)
+
+    def _run_worker(self, index):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        if self.pin_workers:
+            first = index * self.threads_per_worker
+            os.sched_setaffinity(0, self.cores[first:first + self.threads_per_worker])
+        torch.set_num_threads(self.threads_per_worker)
+        server = InferenceServer(self.predictor, sock=self._sock, **self.server_kwargs)
+
+        async def serve():
+            stopped = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(signum, stopped.set)
+            await server.start()
+            try:
+                await stopped.wait()
+            finally:
+                await server.close()
+        asyncio.run(serve())
@@ -0,0 +1,275 @@
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+
+import torch
+
+from seq2seq.models import TopKDecoder
+from seq2seq.util.precision import autocast
+
+
+class _Sequence(object):
+
+    def __init__(self, future, input_len, max_length):
+        self.future = future
+        self.input_len = input_len
+        self.max_length = max_length
+        self.symbols = []
+
+
+class DecodeScheduler(object):
+    """
+    Greedy decoding with iteration-level (continuous) batching: the sequences being decoded form a running batch
+    that every call of :meth:`step` advances by one `DecoderRNN.forward_step`.  Queued requests are encoded and
+    join the running batch at the next step, and finished sequences leave it right away, so a long response does
+    not hold the short ones back until the end of a static batch.
+
+    The decoder state of the running sequences lives in buffers indexed by slot, `max_slots` sequences at most:
+    the decoder hidden state, the encoder outputs and their padding mask, and the last emitted symbols.  A step
+    only runs the active slots, and only attends up to the longest input among them.
+
+    The scheduler can be driven by calling :meth:`step`, or run on its own thread with :meth:`start`.  Like
+    :class:`seq2seq.server.batcher.MicroBatcher` it then serves the `predict` coroutine of an asyncio application.
+    With the `length_predictor` of the predictor, a sequence leaves the running batch at the maximum length
+    predicted from its source length.  Beam search models and shortlists are not supported, as their predictions
+    would differ from those of the predictor.
+
+    Args:
+        predictor (Predictor or HierarchialPredictor): predictor whose `encode_batch` encodes the requests
+        max_slots (int, optional): maximum number of sequences decoded together (default: 64)
+
+    Raises:
+        ValueError: if the model decodes with a `TopKDecoder` or the predictor has a `shortlist`
+
+    Attributes:
+        requests (int): number of predicted requests
+        steps (int): number of decoding steps run
+
+    Examples::
+
+         >>> scheduler = DecodeScheduler(Predictor(model, src_vocab, tgt_vocab))
+         >>> future = scheduler.submit("1 3 5 7 9".split())
+         >>> while scheduler.step():
+         ...     pass
+         >>> future.result()
+         ['9', '7', '5', '3', '1', '<eos>']
+    """
+
+    def __init__(self, predictor, max_slots=64):
+        self.predictor = predictor
+        self.check(predictor)
+        model = predictor.model
+        self.decoder = model.decoder
+        self.function = model.decode_function
+        self.max_slots = max_slots
+        self.requests = 0
+        self.steps = 0
+        self.logger = logging.getLogger(__name__)
+        self._pending = queue.Queue()
+        self._slots = [None] * max_slots
+        self._hidden = None
+        self._outputs = None
+        self._mask = None
+        self._symbols = None
+        self._thread = None
+        self._stopped = False
+
+    @staticmethod
+    def check(predictor):
+        """ Raises ValueError if the predictions of `predictor` cannot be decoded with continuous batching. """
+        if isinstance(predictor.model.decoder, TopKDecoder):
+            raise ValueError("Continuous batching decodes greedily, beam search models are not supported.")
+        if predictor.shortlist is not None:
+            raise ValueError("Continuous batching does not support shortlists.")
+
+    def submit(self, src_seq):
+        """
+        Queues a source sequence.
+
+        Args:
+            src_seq (list): list of tokens in source language
+
+        Returns:
+            concurrent.futures.Future: future resolved with the list of predicted tokens in target language
+        """
+        future = Future()
+        self._pending.put((src_seq, future))
+        return future
+
+    def step(self):
+        """
+        Admits the queued requests into the free slots and advances the running sequences by one step.
+
+        Returns:
+            int: number of sequences still running after the step
+        """
+        self._admit(block=False)
+        return self._step()
+
+    def start(self):
+        """ Starts decoding on a background thread. """
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='decode-scheduler')
+            self._thread.daemon = True
+            self._thread.start()
+
+    async def stop(self):
+        """ Stops the background thread, the queued and running requests are cancelled. """
+        if self._thread is None:
+            return
+        self._stopped = True
+        self._pending.put(None)
+        await asyncio.get_event_loop().run_in_executor(None, self._thread.join)
+        self._thread = None
+        for i, sequence in enumerate(self._slots):
+            if sequence is not None:
+                sequence.future.cancel()
+                self._slots[i] = None
+        while not self._pending.empty():
+            item = self._pending.get_nowait()
+            if item is not None:
+                item[1].cancel()
+
+    async def predict(self, src_seq):
+        """ Queues a source sequence and waits for its prediction, see :meth:`submit`. """
+        if self._thread is None:
+            self.start()
+        return await asyncio.wrap_future(self.submit(src_seq))
+
+    def stats(self):
+        """ Returns the request and step counters. """
+        return {'requests': self.requests, 'steps': self.steps,
+                'running': sum(sequence is not None for sequence in self._slots)}
+
+    def _run(self):
+        while not self._stopped:
+            # wait for requests only when nothing is running
+            running = any(sequence is not None for sequence in self._slots)
+            self._admit(block=not running)
+            if not self._stopped:
+                self._step()
+
+    def _admit(self, block):
+        free = [i for i, sequence in enumerate(self._slots) if sequence is None]
+        batch = []
+        while len(batch) < len(free):
+            try:
+                item = self._pending.get(block=block and not batch)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            # cancelled requests are dropped
+            if item[1].set_running_or_notify_cancel():
+                batch.append(item)
+        if not batch:
+            return
+        try:
+            encoder_outputs, encoder_hidden, encoder_mask = self.predictor.encode_batch([src for src, _ in batch])
+            hidden = self.decoder._init_state(encoder_hidden)
+        except Exception as e:
+            self.logger.exception("Encoding a batch of %d requests failed", len(batch))
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        slots = free[:len(batch)]
+        index = torch.LongTensor(slots).to(encoder_outputs.device)
+        self._allocate(encoder_outputs, hidden)
+        input_len = encoder_outputs.size(1)
+        if self.decoder.use_attention:
+            self._reserve(input_len)
+            self._outputs[index, :input_len] = encoder_outputs.to(self._outputs.dtype)
+            self._mask[index] = True
+            if encoder_mask is None:
+                self._mask[index, :input_len] = False
+            else:
+                self._mask[index, :input_len] = encoder_mask
+        if isinstance(hidden, tuple):
+            for buffer, h in zip(self._hidden, hidden):
+                buffer[:, index] = h.to(buffer.dtype)
+        else:
+            self._hidden[:, index] = hidden.to(self._hidden.dtype)
+        self._symbols[index] = self.decoder.sos_id
+        max_lengths = [self.decoder.max_length] * len(batch)
+        if self.predictor.length_predictor is not None:
+            src_lengths = [input_len] * len(batch) if encoder_mask is None else (encoder_mask == 0).sum(1).tolist()
+            max_lengths = [min(self.decoder.max_length, n) for n in
+                           self.predictor.length_predictor.max_lengths(src_lengths)]
+        for slot, (_, future), max_length in zip(slots, batch, max_lengths):
+            self._slots[slot] = _Sequence(future, input_len, max_length)
+
+    def _allocate(self, encoder_outputs, hidden):
+        if self._symbols is not None:
+            return
+        device = encoder_outputs.device
+
+        def buffer(h):
+            return h.new_zeros(h.size(0), self.max_slots, h.size(2))
+        self._hidden = tuple([buffer(h) for h in hidden]) if isinstance(hidden, tuple) else buffer(hidden)
+        self._symbols = torch.zeros(self.max_slots, 1, dtype=torch.long, device=device)
+        self._outputs = encoder_outputs.new_zeros(self.max_slots, 0, encoder_outputs.size(2))
+        self._mask = torch.ones(self.max_slots, 0, dtype=torch.bool, device=device)
+
+    def _reserve(self, input_len):
+        # the buffers grow to the longest input seen
+        extra = input_len - self._outputs.size(1)
+        if extra > 0:
+            self._outputs = torch.cat([self._outputs,
+                                       self._outputs.new_zeros(self.max_slots, extra, self._outputs.size(2))], 1)
+            self._mask = torch.cat([self._mask, self._mask.new_ones(self.max_slots, extra)], 1)
+
+    def _step(self):
+        active = [i for i, sequence in enumerate(self._slots) if sequence is not None]
+        if not active:
+            return 0
+        try:
+            symbols = self._advance(active)
+        except Exception as e:
+            self.logger.exception("Decoding a step of %d sequences failed", len(active))
+            for slot in active:
+                sequence = self._slots[slot]
+                self._slots[slot] = None
+                if not sequence.future.done():
+                    sequence.future.set_exception(e)
+            return sum(sequence is not None for sequence in self._slots)
+
+        for slot, symbol in zip(active, symbols.view(-1).tolist()):
+            sequence = self._slots[slot]
+            sequence.symbols.append(symbol)
+            if symbol == self.decoder.eos_id or len(sequence.symbols) >= sequence.max_length:
+                self._slots[slot] = None
+                self.requests += 1
+                if not sequence.future.done():
+                    sequence.future.set_result([self.predictor.tgt_vocab.itos[tok] for tok in sequence.symbols])
+        return sum(sequence is not None for sequence in self._slots)
+
+    def _advance(self, active):
+        """ Runs one decoding step of the active slots and returns their symbols. """
+        index = torch.LongTensor(active).to(self._symbols.device)
+        if isinstance(self._hidden, tuple):
+            hidden = tuple([h.index_select(1, index) for h in self._hidden])
+        else:
+            hidden = self._hidden.index_select(1, index)
+        encoder_outputs, encoder_mask = None, None
+        if self.decoder.use_attention:
+            input_len = max(self._slots[i].input_len for i in active)
+            encoder_outputs = self._outputs[index, :input_len]
+            encoder_mask = self._mask[index, :input_len]
+
+        with torch.no_grad(), autocast(self.predictor.use_bf16):
+            step_output, hidden, _ = self.decoder.forward_step(self._symbols.index_select(0, index), hidden,
+                                                               encoder_outputs, function=self.function,
+                                                               encoder_mask=encoder_mask)
+        symbols = step_output.squeeze(1).topk(1)[1]
+        self._symbols[index] = symbols
+        if isinstance(hidden, tuple):
+            for buffer, h in zip(self._hidden, hidden):
+                buffer[:, index] = h.to(buffer.dtype)
+        else:
+            self._hidden[:, index] = hidden.to(self._hidden.dtype)
+        self.steps += 1
+        return symbols
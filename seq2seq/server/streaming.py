@@ -0,0 +1,26 @@
+import asyncio
+
+_DONE = object()
+
+
+async def iterate_async(iterator, executor=None):
+    """
+    Iterates a blocking iterator from an asyncio application, every item is produced on `executor` so that the
+    event loop keeps running meanwhile.
+
+    Args:
+        iterator (iterator): blocking iterator, e.g. of :meth:`seq2seq.evaluator.Predictor.predict_stream`
+        executor (concurrent.futures.Executor, optional): executor producing the items (default: the default
+            executor of the event loop)
+
+    Examples::
+
+         >>> async for tok in iterate_async(predictor.predict_stream("1 3 5 7 9".split())):
+         ...     print(tok)
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        item = await loop.run_in_executor(executor, next, iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
@@ -10,9 +10,10 @@ from torch import optim
 
 import seq2seq
 from seq2seq.evaluator import Evaluator
-from seq2seq.loss import NLLLoss
+from seq2seq.loss import NLLLoss, AdaptiveNLLLoss
 from seq2seq.optim import Optimizer
 from seq2seq.util.checkpoint import Checkpoint
+from seq2seq.util.precision import autocast
 
 class SupervisedTrainer(object):
     """ The SupervisedTrainer class helps in setting up a training framework in a
@@ -21,23 +22,33 @@ class SupervisedTrainer(object):
     Args:
         expt_dir (optional, str): experiment Directory to store details of the experiment,
             by default it makes a folder in the current directory to store the details (default: `experiment`).
-        loss (seq2seq.loss.loss.Loss, optional): loss for training, (default: seq2seq.loss.NLLLoss)
+        loss (seq2seq.loss.loss.Loss, optional): loss for training, a `seq2seq.loss.AdaptiveNLLLoss` for decoders
+            with an adaptive output layer, (default: seq2seq.loss.NLLLoss)
         batch_size (int, optional): batch size for experiment, (default: 64)
         checkpoint_every (int, optional): number of epochs to checkpoint after, (default: 100)
+        print_every (int, optional): number of optimizer updates to log the training loss after, (default: 100)
+        use_bf16 (bool, optional): run the forward pass of training and evaluation under bfloat16 autocast,
+            the parameters and the loss stay in fp32 (default: False)
+        accumulate_steps (int, optional): number of batches to accumulate the gradients of before every update
+            of the parameters, the effective batch size is `batch_size * accumulate_steps`.  `checkpoint_every`
+            and `print_every` count updates rather than batches (default: 1)
     """
     def __init__(self, expt_dir='experiment', loss=NLLLoss(), batch_size=64,
                  random_seed=None,
-                 checkpoint_every=100, print_every=100):
+                 checkpoint_every=100, print_every=100, use_bf16=False, accumulate_steps=1):
         self._trainer = "Simple Trainer"
         self.random_seed = random_seed
         if random_seed is not None:
             random.seed(random_seed)
             torch.manual_seed(random_seed)
         self.loss = loss
-        self.evaluator = Evaluator(loss=self.loss, batch_size=batch_size)
+        self.use_bf16 = use_bf16
+        self.evaluator = Evaluator(loss=self.loss, batch_size=batch_size, use_bf16=use_bf16)
         self.optimizer = None
         self.checkpoint_every = checkpoint_every
         self.print_every = print_every
+        self.accumulate_steps = accumulate_steps
+        self._accumulated = 0
 
         if not os.path.isabs(expt_dir):
             expt_dir = os.path.join(os.getcwd(), expt_dir)
@@ -50,21 +61,34 @@ class SupervisedTrainer(object):
 
     def _train_batch(self, input_variable, input_lengths, chunk_lengths, target_variable, model, teacher_forcing_ratio):
         loss = self.loss
-        # Forward propagation
-        decoder_outputs, decoder_hidden, other = model(input_variable, input_lengths, chunk_lengths, target_variable,
-                                                       teacher_forcing_ratio=teacher_forcing_ratio)
-        # Get loss
-        loss.reset()
-        for step, step_output in enumerate(decoder_outputs):
-            batch_size = target_variable.size(0)
-            loss.eval_batch(step_output.contiguous().view(batch_size, -1), target_variable[:, step + 1])
-        # Backward propagation
-        model.zero_grad()
-        loss.backward()
-        self.optimizer.step()
+        with autocast(self.use_bf16):
+            # Forward propagation
+            decoder_outputs, decoder_hidden, other = model(input_variable, input_lengths, chunk_lengths, target_variable,
+                                                           teacher_forcing_ratio=teacher_forcing_ratio)
+            # Get loss
+            loss.reset()
+            for step, step_output in enumerate(decoder_outputs):
+                batch_size = target_variable.size(0)
+                loss.eval_batch(step_output.contiguous().view(batch_size, -1), target_variable[:, step + 1])
+        # Backward propagation, the gradients are averaged over the accumulated batches
+        if self._accumulated == 0:
+            model.zero_grad()
+        loss.backward(1. / self.accumulate_steps)
+        self._accumulated += 1
+        if self._accumulated == self.accumulate_steps:
+            self._update(model)
 
         return loss.get_loss()
 
+    def _update(self, model):
+        """ Updates the parameters with the accumulated gradients, rescaling those of an incomplete window. """
+        if self._accumulated < self.accumulate_steps:
+            for param in model.parameters():
+                if param.grad is not None:
+                    param.grad.data.mul_(self.accumulate_steps / self._accumulated)
+        self.optimizer.step()
+        self._accumulated = 0
+
     def _train_epoches(self, data, model, n_epochs, start_epoch, start_step,
                        dev_data=None, teacher_forcing_ratio=0):
         log = self.logger
@@ -82,6 +106,11 @@ class SupervisedTrainer(object):
         steps_per_epoch = len(batch_iterator)
         total_steps = steps_per_epoch * n_epochs
 
+        # the windows of accumulated batches are aligned to the steps, checkpoints are only taken between windows
+        print_steps = self.print_every * self.accumulate_steps
+        checkpoint_steps = self.checkpoint_every * self.accumulate_steps
+        self._accumulated = 0
+
         step = start_step
         step_elapsed = 0
         for epoch in range(start_epoch, n_epochs + 1):
@@ -106,8 +135,11 @@ class SupervisedTrainer(object):
                 print_loss_total += loss
                 epoch_loss_total += loss
 
-                if step % self.print_every == 0 and step_elapsed > self.print_every:
-                    print_loss_avg = print_loss_total / self.print_every
+                if step == total_steps and self._accumulated > 0:
+                    self._update(model)
+
+                if step % print_steps == 0 and step_elapsed > print_steps:
+                    print_loss_avg = print_loss_total / print_steps
                     print_loss_total = 0
                     log_msg = 'Progress: %d%%, Train %s: %.4f' % (
                         step / total_steps * 100,
@@ -116,7 +148,7 @@ class SupervisedTrainer(object):
                     log.info(log_msg)
 
                 # Checkpoint
-                if step % self.checkpoint_every == 0 or step == total_steps:
+                if step % checkpoint_steps == 0 or step == total_steps:
                     Checkpoint(model=model,
                                optimizer=self.optimizer,
                                epoch=epoch, step=step,
@@ -138,6 +170,16 @@ class SupervisedTrainer(object):
 
             log.info(log_msg)
 
+    def _check_loss(self, model):
+        """ Binds the loss of a decoder with an adaptive output layer to it, see :class:`AdaptiveNLLLoss`. """
+        if getattr(model.decoder, 'output_layer', 'linear') != 'adaptive':
+            return
+        if not isinstance(self.loss, AdaptiveNLLLoss):
+            raise ValueError("A decoder with an adaptive output layer has to be trained with AdaptiveNLLLoss, "
+                             "not {}.".format(self.loss.name))
+        # a resumed model has its own output layer
+        self.loss.output_layer = model.decoder.out
+
     def train(self, model, data, num_epochs=5,
               resume=False, dev_data=None,
               optimizer=None, teacher_forcing_ratio=0):
@@ -179,6 +221,7 @@ class SupervisedTrainer(object):
                 optimizer = Optimizer(optim.Adam(model.parameters()), max_grad_norm=5)
             self.optimizer = optimizer
 
+        self._check_loss(model)
         self.logger.info("Optimizer: %s, Scheduler: %s" % (self.optimizer.optimizer, self.optimizer.scheduler))
 
         self._train_epoches(data, model, num_epochs,
@@ -0,0 +1,86 @@
+import os
+import hashlib
+import tempfile
+
+
+class ArtifactStore(object):
+    """
+    A content-addressed blob store.  Every blob is stored once under the hex digest of its content, so
+    writing identical content again (e.g. the vocabularies or frozen weights of a model saved by every
+    checkpoint) costs a hash instead of a disk write.
+
+    Blobs are sharded by the first two characters of their digest::
+
+        root
+        +-- ab
+        |  +-- ab3f...  (blob)
+
+    Args:
+        root (str): path to the directory holding the blobs, created if missing
+
+    Attributes:
+        HASH_NAME (str): name of the `hashlib` algorithm used to address blobs
+    """
+
+    HASH_NAME = 'sha256'
+
+    def __init__(self, root):
+        self.root = root
+        if not os.path.exists(root):
+            os.makedirs(root)
+
+    @classmethod
+    def digest(cls, data):
+        """ Returns the address of the given bytes. """
+        return hashlib.new(cls.HASH_NAME, data).hexdigest()
+
+    def path(self, digest):
+        """ Returns the path of the blob with the given digest. """
+        return os.path.join(self.root, digest[:2], digest)
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """
+        Stores a blob unless a blob with the same content already exists.
+
+        The blob is written to a temporary file and renamed into place, so a crash never leaves a
+        truncated blob behind a valid address.
+        Args:
+            data (bytes): content of the blob
+        Returns:
+            str: digest of the blob
+        """
+        digest = self.digest(data)
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+
+        shard = os.path.dirname(path)
+        if not os.path.exists(shard):
+            os.makedirs(shard)
+        fd, tmp_path = tempfile.mkstemp(dir=shard, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                fout.write(data)
+            os.rename(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def get(self, digest):
+        """
+        Reads a blob.
+        Args:
+            digest (str): digest of the blob
+        Returns:
+            bytes: content of the blob
+        """
+        path = self.path(digest)
+        if not os.path.exists(path):
+            raise KeyError("Blob {} does not exist in {}".format(digest, self.root))
+        with open(path, 'rb') as fin:
+            return fin.read()
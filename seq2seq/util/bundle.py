@@ -0,0 +1,214 @@
+import os
+import json
+import struct
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from seq2seq.dataset.vocabulary import CompactVocab
+from seq2seq.models import EncoderRNN, DecoderRNN, HierarchialRNN, TopKDecoder, Seq2seq, HSeq2seq
+from .checkpoint import _model_tensors
+from .quantization import is_quantized
+
+
+def _rnn_cell_name(module):
+    return 'lstm' if module.rnn_cell is nn.LSTM else 'gru'
+
+
+def model_config(module):
+    """
+    Describes how to rebuild a model with a JSON serializable dictionary.
+
+    Args:
+        module (torch.nn.Module): one of `Seq2seq`, `HSeq2seq`, `EncoderRNN`, `HierarchialRNN`,
+            `DecoderRNN` or `TopKDecoder`
+    Returns:
+        dict: configuration that can be passed to :func:`build_model`
+    """
+    if isinstance(module, Seq2seq) or isinstance(module, HSeq2seq):
+        if module.decode_function is not F.log_softmax:
+            raise ValueError("Only models decoding with F.log_softmax can be exported.")
+        config = {'type': type(module).__name__,
+                  'encoder': model_config(module.encoder),
+                  'decoder': model_config(module.decoder),
+                  'share_embeddings': module.share_embeddings}
+        if isinstance(module, HSeq2seq):
+            config['hrnn'] = model_config(module.hrnn)
+        return config
+    if isinstance(module, TopKDecoder):
+        return {'type': 'TopKDecoder', 'decoder_rnn': model_config(module.rnn), 'k': module.k}
+    if isinstance(module, EncoderRNN):
+        return {'type': 'EncoderRNN', 'vocab_size': module.vocab_size, 'max_len': module.max_len,
+                'hidden_size': module.hidden_size, 'input_dropout_p': module.input_dropout_p,
+                'dropout_p': module.dropout_p, 'n_layers': module.n_layers,
+                'bidirectional': module.rnn.bidirectional, 'rnn_cell': _rnn_cell_name(module),
+                'variable_lengths': module.variable_lengths}
+    if isinstance(module, HierarchialRNN):
+        return {'type': 'HierarchialRNN', 'max_len': module.max_len, 'hidden_size': module.hidden_size,
+                'input_dropout_p': module.input_dropout_p, 'dropout_p': module.dropout_p,
+                'n_layers': module.n_layers, 'rnn_cell': _rnn_cell_name(module),
+                'variable_lengths': module.variable_lengths, 'attention_window': module.attention_window,
+                'attention_topk': module.attention_topk}
+    if isinstance(module, DecoderRNN):
+        return {'type': 'DecoderRNN', 'vocab_size': module.vocab_size, 'max_len': module.max_length,
+                'hidden_size': module.hidden_size, 'sos_id': module.sos_id, 'eos_id': module.eos_id,
+                'n_layers': module.n_layers, 'rnn_cell': _rnn_cell_name(module),
+                'bidirectional': module.bidirectional_encoder, 'input_dropout_p': module.input_dropout_p,
+                'dropout_p': module.dropout_p, 'use_attention': module.use_attention,
+                'output_layer': module.output_layer, 'cutoffs': module.cutoffs, 'div_value': module.div_value,
+                'tie_weights': module.tie_weights}
+    raise ValueError("Unsupported module: {0}".format(type(module).__name__))
+
+
+def build_model(config):
+    """
+    Rebuilds a model with freshly initialized weights from a configuration created by :func:`model_config`.
+
+    Args:
+        config (dict): model configuration
+    Returns:
+        torch.nn.Module: the model
+    """
+    config = dict(config)
+    model_type = config.pop('type')
+    if model_type == 'Seq2seq':
+        return Seq2seq(build_model(config['encoder']), build_model(config['decoder']),
+                       share_embeddings=config.get('share_embeddings', False))
+    if model_type == 'HSeq2seq':
+        return HSeq2seq(build_model(config['encoder']), build_model(config['hrnn']),
+                        build_model(config['decoder']), share_embeddings=config.get('share_embeddings', False))
+    if model_type == 'TopKDecoder':
+        return TopKDecoder(build_model(config['decoder_rnn']), config['k'])
+    if model_type == 'EncoderRNN':
+        return EncoderRNN(**config)
+    if model_type == 'HierarchialRNN':
+        return HierarchialRNN(**config)
+    if model_type == 'DecoderRNN':
+        return DecoderRNN(**config)
+    raise ValueError("Unsupported module: {0}".format(model_type))
+
+
+class InferenceBundle(object):
+    """
+    The InferenceBundle class packs everything needed for inference into a single file: the model configuration,
+    the vocabularies and the model weights.  Unlike a :class:`seq2seq.util.checkpoint.Checkpoint` nothing in a
+    bundle is pickled and the optimizer is left out.
+
+    The file is laid out as a JSON header followed by the raw weights, every tensor aligned to `ALIGNMENT`
+    bytes::
+
+        MAGIC | header length (uint64) | header (JSON) | padding | tensor | padding | tensor ...
+
+    Loading maps the file copy-on-write into memory and creates the weights and the vocabularies
+    (:class:`seq2seq.dataset.vocabulary.CompactVocab`) as views of the mapping, so loading does not read them
+    eagerly and processes loading the same bundle share the physical pages.
+
+    Args:
+        model (seq2seq.models): model to export, e.g. `Seq2seq` or `HSeq2seq`
+        input_vocab (Vocabulary): vocabulary for the input language
+        output_vocab (Vocabulary): vocabulary for the output language
+
+    Attributes:
+        MAGIC (bytes): bytes a bundle file starts with
+        ALIGNMENT (int): alignment of the tensors in the file in bytes
+
+    Examples::
+
+         >>> InferenceBundle.from_checkpoint(Checkpoint.load(path)).save('model.bundle')
+         >>> bundle = InferenceBundle.load('model.bundle')
+         >>> predictor = Predictor(bundle.model, bundle.input_vocab, bundle.output_vocab)
+    """
+
+    MAGIC = b'S2SBNDL1'
+    ALIGNMENT = 64
+
+    def __init__(self, model, input_vocab, output_vocab):
+        self.model = model
+        self.input_vocab = input_vocab
+        self.output_vocab = output_vocab
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint):
+        """ Creates a bundle from the model and vocabularies of a checkpoint. """
+        return cls(checkpoint.model, checkpoint.input_vocab, checkpoint.output_vocab)
+
+    def save(self, path):
+        """
+        Writes the bundle to a file.
+        Args:
+            path (str): path of the bundle file
+        """
+        if is_quantized(self.model):
+            raise ValueError("Quantized models cannot be bundled, bundle the fp32 model instead.")
+        sections = []
+        tensors = {}
+        for name, tensor in _model_tensors(self.model):
+            array = tensor.data.cpu().contiguous().numpy()
+            tensors[name] = {'dtype': array.dtype.str, 'shape': list(array.shape)}
+            sections.append((tensors[name], array.tobytes()))
+
+        vocabs = {}
+        for name, vocab in [('input', self.input_vocab), ('output', self.output_vocab)]:
+            vocabs[name] = {}
+            sections.append((vocabs[name], CompactVocab.from_vocab(vocab).to_bytes()))
+
+        # offsets are relative to the end of the header, which is aligned as well
+        offset = 0
+        for entry, data in sections:
+            entry['offset'] = offset
+            entry['nbytes'] = len(data)
+            offset += self._padded(len(data))
+
+        header = json.dumps({'config': model_config(self.model),
+                             'tensors': tensors,
+                             'vocabs': vocabs}).encode('utf-8')
+        header_end = self._padded(len(self.MAGIC) + 8 + len(header))
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fout:
+            fout.write(self.MAGIC)
+            fout.write(struct.pack('<Q', len(header)))
+            fout.write(header)
+            fout.write(b'\0' * (header_end - fout.tell()))
+            for _, data in sections:
+                fout.write(data)
+                fout.write(b'\0' * (self._padded(len(data)) - len(data)))
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a bundle with its weights memory-mapped from the file.  The model is returned in evaluation mode.
+        Args:
+            path (str): path of the bundle file
+        Returns:
+            bundle (InferenceBundle): the loaded bundle
+        """
+        with open(path, 'rb') as fin:
+            if fin.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError("{} is not an inference bundle.".format(path))
+            header_len, = struct.unpack('<Q', fin.read(8))
+            header = json.loads(fin.read(header_len).decode('utf-8'))
+        header_end = cls._padded(len(cls.MAGIC) + 8 + header_len)
+        buf = np.memmap(path, dtype=np.uint8, mode='c')
+
+        def section(entry):
+            start = header_end + entry['offset']
+            return buf[start:start + entry['nbytes']]
+
+        model = build_model(header['config'])
+        for name, tensor in _model_tensors(model):
+            entry = header['tensors'][name]
+            array = section(entry).view(np.dtype(entry['dtype'])).reshape(entry['shape'])
+            tensor.data = torch.from_numpy(array)
+        model.eval()
+
+        return cls(model,
+                   CompactVocab.from_buffer(section(header['vocabs']['input'])),
+                   CompactVocab.from_buffer(section(header['vocabs']['output'])))
+
+    @classmethod
+    def _padded(cls, size):
+        return (size + cls.ALIGNMENT - 1) // cls.ALIGNMENT * cls.ALIGNMENT
@@ -1,11 +1,55 @@
 from __future__ import print_function
+import io
 import os
+import json
 import time
 import shutil
+from contextlib import contextmanager
 
 import torch
 import dill
 
+from .artifact_store import ArtifactStore
+
+
+def _to_bytes(obj, dump=torch.save):
+    buf = io.BytesIO()
+    dump(obj, buf)
+    return buf.getvalue()
+
+
+def _torch_load(data, map_location=None):
+    buf = io.BytesIO(data)
+    try:
+        return torch.load(buf, map_location=map_location, weights_only=False)
+    except TypeError:
+        # torch < 1.13 does not know `weights_only`
+        buf.seek(0)
+        return torch.load(buf, map_location=map_location)
+
+
+def _model_tensors(model):
+    """ Returns the named parameters and buffers of a model, each shared tensor listed once. """
+    tensors = list(model.named_parameters())
+    tensors += list(model.named_buffers())
+    return tensors
+
+
+@contextmanager
+def _stripped(model):
+    """ Temporarily empties the parameters and buffers of a model so that pickling it only stores its
+    structure. """
+    tensors = _model_tensors(model)
+    datas = [t.data for _, t in tensors]
+    try:
+        for _, t in tensors:
+            t.data = t.data.new(0)
+        yield
+    finally:
+        for (_, t), data in zip(tensors, datas):
+            t.data = data
+
+
 class Checkpoint(object):
     """
     The Checkpoint class manages the saving and loading of a model during training. It allows training to be suspended
@@ -14,6 +58,16 @@ class Checkpoint(object):
     To make a checkpoint, initialize a Checkpoint object with the following args; then call that object's save() method
     to write parameters to disk.
 
+    Checkpoints are small JSON manifests.  The model structure, every parameter tensor, the optimizer and the
+    vocabularies are stored as blobs of an :class:`ArtifactStore` shared by all checkpoints of an experiment and
+    are referenced by their digest, so content that does not change between checkpoints is written only once::
+
+        experiment_dir
+        +-- blobs
+        +-- checkpoints
+        |  +-- YYYY_mm_dd_HH_MM_SS
+        |     +-- manifest.json
+
     Args:
         model (seq2seq): seq2seq model being trained
         optimizer (Optimizer): stores the state of the optimizer
@@ -24,6 +78,8 @@ class Checkpoint(object):
 
     Attributes:
         CHECKPOINT_DIR_NAME (str): name of the checkpoint directory
+        BLOB_DIR_NAME (str): name of the directory of the artifact store, a sibling of the checkpoint directory
+        MANIFEST_NAME (str): name of the manifest file of a checkpoint
         TRAINER_STATE_NAME (str): name of the file storing trainer states
         MODEL_NAME (str): name of the file storing model
         INPUT_VOCAB_FILE (str): name of the input vocab file
@@ -31,6 +87,8 @@ class Checkpoint(object):
     """
 
     CHECKPOINT_DIR_NAME = 'checkpoints'
+    BLOB_DIR_NAME = 'blobs'
+    MANIFEST_NAME = 'manifest.json'
     TRAINER_STATE_NAME = 'trainer_states.pt'
     MODEL_NAME = 'model.pt'
     INPUT_VOCAB_FILE = 'input_vocab.pt'
@@ -68,17 +126,28 @@ class Checkpoint(object):
         if os.path.exists(path):
             shutil.rmtree(path)
         os.makedirs(path)
-        torch.save({'epoch': self.epoch,
-                    'step': self.step,
-                    'optimizer': self.optimizer
-                   },
-                   os.path.join(path, self.TRAINER_STATE_NAME))
-        torch.save(self.model, os.path.join(path, self.MODEL_NAME))
 
-        with open(os.path.join(path, self.INPUT_VOCAB_FILE), 'wb') as fout:
-            dill.dump(self.input_vocab, fout)
-        with open(os.path.join(path, self.OUTPUT_VOCAB_FILE), 'wb') as fout:
-            dill.dump(self.output_vocab, fout)
+        store = ArtifactStore(os.path.join(experiment_dir, self.BLOB_DIR_NAME))
+        tensors = {}
+        for name, tensor in _model_tensors(self.model):
+            tensors[name] = store.put(_to_bytes(tensor.data.clone()))
+        # the optimizer references the model parameters, strip them from both
+        with _stripped(self.model):
+            model = store.put(_to_bytes(self.model))
+            optimizer = store.put(_to_bytes(self.optimizer))
+
+        manifest = {'epoch': self.epoch,
+                    'step': self.step,
+                    'model': model,
+                    'tensors': tensors,
+                    'optimizer': optimizer,
+                    'input_vocab': store.put(_to_bytes(self.input_vocab, dill.dump)),
+                    'output_vocab': store.put(_to_bytes(self.output_vocab, dill.dump))}
+        # the manifest is written last, a checkpoint without one is incomplete
+        tmp_path = os.path.join(path, self.MANIFEST_NAME + '.tmp')
+        with open(tmp_path, 'w') as fout:
+            json.dump(manifest, fout, indent=2, sort_keys=True)
+        os.rename(tmp_path, os.path.join(path, self.MANIFEST_NAME))
 
         return path
 
@@ -91,6 +160,11 @@ class Checkpoint(object):
         Returns:
             checkpoint (Checkpoint): checkpoint object with fields copied from those stored on disk
         """
+        manifest_path = os.path.join(path, cls.MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            return cls._load_manifest(path, manifest_path)
+
+        # checkpoints written before the artifact store was introduced
         if torch.cuda.is_available():
             resume_checkpoint = torch.load(os.path.join(path, cls.TRAINER_STATE_NAME))
             model = torch.load(os.path.join(path, cls.MODEL_NAME))
@@ -111,11 +185,34 @@ class Checkpoint(object):
                           step=resume_checkpoint['step'],
                           path=path)
 
+    @classmethod
+    def _load_manifest(cls, path, manifest_path):
+        with open(manifest_path) as fin:
+            manifest = json.load(fin)
+        experiment_dir = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+        store = ArtifactStore(os.path.join(experiment_dir, cls.BLOB_DIR_NAME))
+        map_location = None if torch.cuda.is_available() else 'cpu'
+
+        model = _torch_load(store.get(manifest['model']), map_location)
+        for name, tensor in _model_tensors(model):
+            tensor.data = _torch_load(store.get(manifest['tensors'][name]), map_location)
+        model.flatten_parameters() # make RNN parameters contiguous
+
+        return Checkpoint(model=model,
+                          input_vocab=dill.loads(store.get(manifest['input_vocab'])),
+                          output_vocab=dill.loads(store.get(manifest['output_vocab'])),
+                          optimizer=_torch_load(store.get(manifest['optimizer']), map_location),
+                          epoch=manifest['epoch'],
+                          step=manifest['step'],
+                          path=path)
+
     @classmethod
     def get_latest_checkpoint(cls, experiment_path):
         """
         Given the path to an experiment directory, returns the path to the last saved checkpoint's subdirectory.
 
+        Subdirectories without a manifest (e.g. left behind by a crash during `save`) are skipped.
+
         Precondition: at least one checkpoint has been made (i.e., latest checkpoint subdirectory exists).
         Args:
             experiment_path (str): path to the experiment directory
@@ -124,4 +221,9 @@ class Checkpoint(object):
         """
         checkpoints_path = os.path.join(experiment_path, cls.CHECKPOINT_DIR_NAME)
         all_times = sorted(os.listdir(checkpoints_path), reverse=True)
-        return os.path.join(checkpoints_path, all_times[0])
+        for date_time in all_times:
+            path = os.path.join(checkpoints_path, date_time)
+            if os.path.exists(os.path.join(path, cls.MANIFEST_NAME)) or \
+                    os.path.exists(os.path.join(path, cls.MODEL_NAME)):
+                return path
+        raise LookupError("No complete checkpoint found in {}".format(checkpoints_path))
@@ -0,0 +1,125 @@
+import os
+import json
+import warnings
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from seq2seq.models import TopKDecoder, HSeq2seq
+from seq2seq.models.graphs import EncoderGraph, HierarchialGraph, DecoderStepGraph
+from .quantization import is_quantized
+from .onnx_runtime import ENCODER_FILE_NAME, HRNN_FILE_NAME, DECODER_STEP_FILE_NAME, CONFIG_FILE_NAME
+
+
+def _state_names(rnn_cell, prefix):
+    if rnn_cell is nn.LSTM:
+        return [prefix + '_h', prefix + '_c']
+    return [prefix]
+
+
+def _export(module, args, path, input_names, output_names, dynamic_axes, opset_version):
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        torch.onnx.export(module.eval(), args, path, input_names=input_names, output_names=output_names,
+                          dynamic_axes=dynamic_axes, opset_version=opset_version, dynamo=False)
+
+
+def export_onnx(model, input_vocab, output_vocab, path, opset_version=14):
+    """
+    Exports a model as separate ONNX graphs that can be run by :class:`seq2seq.util.onnx_runtime.OnnxSeq2seq`
+    without torch:
+
+    - `encoder.onnx`: the `EncoderRNN`, packing variable length inputs
+    - `hrnn.onnx`: the `HierarchialRNN` of a `HSeq2seq` model
+    - `decoder_step.onnx`: one step of the `DecoderRNN`, taking and returning the decoder hidden state
+    - `model.json`: the names of the graph inputs, the decoding parameters and the vocabularies
+
+    The batch size and the sequence lengths of the graphs are dynamic.  A `TopKDecoder` is exported as its
+    underlying `DecoderRNN`, beam search is left to the runtime.
+
+    Args:
+        model (seq2seq.models): trained `Seq2seq` or `HSeq2seq` model, decoding with `F.log_softmax`
+        input_vocab (Vocabulary): vocabulary for the input language
+        output_vocab (Vocabulary): vocabulary for the output language
+        path (str): directory to write the graphs to
+        opset_version (int, optional): ONNX opset to export to (default: 14)
+    """
+    if model.decode_function is not F.log_softmax:
+        raise ValueError("Only models decoding with F.log_softmax can be exported.")
+    if is_quantized(model):
+        raise ValueError("Quantized models cannot be exported, export the fp32 model instead.")
+    model = model.cpu()
+    model.eval()
+    encoder = model.encoder
+    decoder = model.decoder.rnn if isinstance(model.decoder, TopKDecoder) else model.decoder
+    hierarchial = isinstance(model, HSeq2seq)
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    # encoder
+    batch, length = 2, 3
+    input_var = torch.full((batch, length), 0, dtype=torch.long)
+    input_lengths = torch.tensor([length, length - 1], dtype=torch.long)
+    if hierarchial:
+        # chunks are padded like the predictor pads them, the decoder starts from the hidden state of the hrnn
+        encoder_graph = EncoderGraph(encoder, pack=encoder.variable_lengths)
+        encoder_state = _state_names(encoder.rnn_cell, 'encoder_hidden')
+    else:
+        encoder_graph = EncoderGraph(encoder, decoder)
+        encoder_state = _state_names(decoder.rnn_cell, 'hidden')
+    _export(encoder_graph, (input_var, input_lengths), os.path.join(path, ENCODER_FILE_NAME),
+            input_names=['input', 'input_lengths'],
+            output_names=['encoder_outputs'] + encoder_state + ['encoder_mask'],
+            dynamic_axes=dict([('input', {0: 'batch', 1: 'input_len'}), ('input_lengths', {0: 'batch'}),
+                               ('encoder_outputs', {0: 'batch', 1: 'input_len'}),
+                               ('encoder_mask', {0: 'batch', 1: 'input_len'})] +
+                              [(name, {1: 'batch'}) for name in encoder_state]),
+            opset_version=opset_version)
+    with torch.no_grad():
+        encoder_outputs, hidden, encoder_mask = encoder_graph(input_var, input_lengths)
+
+    # hierarchial rnn
+    state = _state_names(decoder.rnn_cell, 'hidden')
+    if hierarchial:
+        chunk_outputs = encoder_outputs[torch.arange(batch), input_lengths - 1].view(1, batch, -1)
+        encoder_outputs = encoder_outputs.contiguous().view(1, batch * length, -1)
+        encoder_mask = encoder_mask.contiguous().view(1, batch * length)
+        _export(HierarchialGraph(model.hrnn, decoder), (chunk_outputs, encoder_outputs, encoder_mask),
+                os.path.join(path, HRNN_FILE_NAME),
+                input_names=['chunk_outputs', 'encoder_outputs', 'encoder_mask'],
+                output_names=['hrnn_outputs'] + state,
+                dynamic_axes=dict([('chunk_outputs', {0: 'batch', 1: 'seq_len'}),
+                                   ('encoder_outputs', {0: 'batch', 1: 'input_len'}),
+                                   ('encoder_mask', {0: 'batch', 1: 'input_len'}),
+                                   ('hrnn_outputs', {0: 'batch', 1: 'seq_len'})] +
+                                  [(name, {1: 'batch'}) for name in state]),
+                opset_version=opset_version)
+        with torch.no_grad():
+            encoder_outputs, hidden = HierarchialGraph(model.hrnn, decoder)(chunk_outputs, encoder_outputs,
+                                                                            encoder_mask)
+        encoder_mask = torch.zeros(encoder_outputs.size()[:2], dtype=torch.bool)
+
+    # decoder step
+    symbols = torch.full((encoder_outputs.size(0), 1), decoder.sos_id, dtype=torch.long)
+    next_state = ['next_' + name for name in state]
+    _export(DecoderStepGraph(decoder), (symbols, hidden, encoder_outputs, encoder_mask),
+            os.path.join(path, DECODER_STEP_FILE_NAME),
+            input_names=['input'] + state + ['encoder_outputs', 'encoder_mask'],
+            output_names=['log_probs'] + next_state,
+            dynamic_axes=dict([('input', {0: 'batch'}), ('log_probs', {0: 'batch'}),
+                               ('encoder_outputs', {0: 'batch', 1: 'input_len'}),
+                               ('encoder_mask', {0: 'batch', 1: 'input_len'})] +
+                              [(name, {1: 'batch'}) for name in state + next_state]),
+            opset_version=opset_version)
+
+    config = {'type': type(model).__name__,
+              'sos_id': decoder.sos_id,
+              'eos_id': decoder.eos_id,
+              'max_length': decoder.max_length,
+              'encoder_state': encoder_state,
+              'state': state,
+              'input_vocab': list(input_vocab.itos),
+              'output_vocab': list(output_vocab.itos)}
+    with open(os.path.join(path, CONFIG_FILE_NAME), 'w') as fout:
+        json.dump(config, fout)
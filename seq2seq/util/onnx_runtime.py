@@ -0,0 +1,166 @@
+"""
+Runs models exported by :func:`seq2seq.util.onnx_export.export_onnx` with onnxruntime.  Only numpy and
+onnxruntime are needed, the module does not import torch.
+"""
+import os
+import json
+
+import numpy as np
+
+ENCODER_FILE_NAME = 'encoder.onnx'
+HRNN_FILE_NAME = 'hrnn.onnx'
+DECODER_STEP_FILE_NAME = 'decoder_step.onnx'
+CONFIG_FILE_NAME = 'model.json'
+
+
+class OnnxSeq2seq(object):
+    """
+    Greedy and beam search decoding of an exported `Seq2seq` or `HSeq2seq` model.
+
+    Args:
+        path (str): directory the model was exported to
+        providers (list of str, optional): onnxruntime execution providers (default: `['CPUExecutionProvider']`)
+
+    Examples::
+
+         >>> model = OnnxSeq2seq('experiment/onnx')
+         >>> model.predict("1 3 5 7 9".split())
+         ['9', '7', '5', '3', '1', '<eos>']
+         >>> model.predict("1 3 5 7 9".split(), beam_size=3)
+         ['9', '7', '5', '3', '1', '<eos>']
+    """
+
+    def __init__(self, path, providers=None):
+        import onnxruntime
+
+        if providers is None:
+            providers = ['CPUExecutionProvider']
+        with open(os.path.join(path, CONFIG_FILE_NAME)) as fin:
+            config = json.load(fin)
+        self.hierarchial = config['type'] == 'HSeq2seq'
+        self.sos_id = config['sos_id']
+        self.eos_id = config['eos_id']
+        self.max_length = config['max_length']
+        self.state_names = config['state']
+        self.encoder_state_names = config['encoder_state']
+        self.src_itos = config['input_vocab']
+        self.tgt_itos = config['output_vocab']
+        self.src_stoi = dict((tok, i) for i, tok in reversed(list(enumerate(self.src_itos))))
+        self.unk_index = self.src_stoi.get('<unk>', 0)
+
+        def session(file_name):
+            return onnxruntime.InferenceSession(os.path.join(path, file_name), providers=providers)
+        self.encoder = session(ENCODER_FILE_NAME)
+        self.hrnn = session(HRNN_FILE_NAME) if self.hierarchial else None
+        self.decoder_step = session(DECODER_STEP_FILE_NAME)
+
+    def predict(self, src_seq, beam_size=1):
+        """ Make prediction given `src_seq` as input.
+
+        Args:
+            src_seq (list): list of tokens in source language, tokens of a `HSeq2seq` model are chunks of
+              sub-tokens separated by `|`
+            beam_size (int, optional): size of the beam, greedy decoding is used for 1 (default: 1)
+
+        Returns:
+            tgt_seq (list): list of tokens in target language as predicted by the model
+        """
+        encoder_outputs, state, encoder_mask = self.encode(src_seq)
+        if beam_size == 1:
+            tgt_id_seq = self._greedy(encoder_outputs, state, encoder_mask)
+        else:
+            tgt_id_seq = self._beam(encoder_outputs, state, encoder_mask, beam_size)
+        return [self.tgt_itos[tok] for tok in tgt_id_seq]
+
+    def encode(self, src_seq):
+        """
+        Encodes a source sequence.
+
+        Returns: encoder_outputs, state, encoder_mask
+            - **encoder_outputs** (1, input_len, hidden_size): outputs attended to by the decoder
+            - **state** (list): initial hidden state of the decoder
+            - **encoder_mask** (1, input_len): positions not attended to
+        """
+        if self.hierarchial:
+            return self._encode_chunks(src_seq)
+        input_var = np.array([[self.src_stoi.get(tok, self.unk_index) for tok in src_seq]], dtype=np.int64)
+        input_lengths = np.array([len(src_seq)], dtype=np.int64)
+        outputs = self.encoder.run(None, {'input': input_var, 'input_lengths': input_lengths})
+        return outputs[0], outputs[1:-1], outputs[-1]
+
+    def _encode_chunks(self, src_seq):
+        # pads the chunks as `HierarchialPredictor` does
+        seq = [tok.split('|') for tok in src_seq]
+        chunk_len = max(len(chunk) for chunk in seq)
+        input_var = np.array([[self.src_stoi.get(tok, self.unk_index) for tok in chunk + ['<cpad>'] *
+                               (chunk_len - len(chunk))] for chunk in seq], dtype=np.int64)
+        chunk_lengths = np.array([len(chunk) for chunk in seq], dtype=np.int64)
+        outputs = self.encoder.run(None, {'input': input_var, 'input_lengths': chunk_lengths})
+        encoder_outputs = outputs[0]
+        chunk_outputs = encoder_outputs[np.arange(len(seq)), chunk_lengths - 1].reshape(1, len(seq), -1)
+        encoder_outputs = np.ascontiguousarray(encoder_outputs).reshape(1, len(seq) * chunk_len, -1)
+        # the padding of the chunks is not attended to
+        word_mask = np.arange(chunk_len)[None, :] >= chunk_lengths[:, None]
+        outputs = self.hrnn.run(None, {'chunk_outputs': chunk_outputs, 'encoder_outputs': encoder_outputs,
+                                       'encoder_mask': word_mask.reshape(1, len(seq) * chunk_len)})
+        encoder_mask = np.zeros(outputs[0].shape[:2], dtype=bool)
+        return outputs[0], outputs[1:], encoder_mask
+
+    def step(self, symbols, state, encoder_outputs, encoder_mask):
+        """
+        Runs one decoding step.
+
+        Args:
+            symbols (batch, 1): previous symbols
+            state (list): decoder hidden state
+            encoder_outputs (batch, input_len, hidden_size): outputs of the encoder
+            encoder_mask (batch, input_len): positions not attended to
+
+        Returns: log_probs, state
+            - **log_probs** (batch, vocab_size): log probabilities of the next symbols
+            - **state** (list): decoder hidden state after the step
+        """
+        feed = {'input': symbols, 'encoder_outputs': encoder_outputs, 'encoder_mask': encoder_mask}
+        feed.update(zip(self.state_names, state))
+        outputs = self.decoder_step.run(None, feed)
+        return outputs[0], outputs[1:]
+
+    def _greedy(self, encoder_outputs, state, encoder_mask):
+        tgt_id_seq = []
+        symbols = np.array([[self.sos_id]], dtype=np.int64)
+        for _ in range(self.max_length):
+            log_probs, state = self.step(symbols, state, encoder_outputs, encoder_mask)
+            symbols = log_probs.argmax(axis=1).reshape(1, 1)
+            tgt_id_seq.append(int(symbols[0, 0]))
+            if tgt_id_seq[-1] == self.eos_id:
+                break
+        return tgt_id_seq
+
+    def _beam(self, encoder_outputs, state, encoder_mask, k):
+        encoder_outputs = np.repeat(encoder_outputs, k, axis=0)
+        encoder_mask = np.repeat(encoder_mask, k, axis=0)
+        state = [np.repeat(s, k, axis=1) for s in state]
+        # all beams start from the same symbol, only the first one is expanded
+        scores = np.full(k, -np.inf, dtype=np.float32)
+        scores[0] = 0
+        hypotheses = [[] for _ in range(k)]
+        finished = []
+        symbols = np.full((k, 1), self.sos_id, dtype=np.int64)
+        for _ in range(self.max_length):
+            log_probs, state = self.step(symbols, state, encoder_outputs, encoder_mask)
+            vocab_size = log_probs.shape[1]
+            candidates = (scores[:, None] + log_probs).reshape(-1)
+            best = np.argsort(-candidates, kind='stable')[:k]
+            beams, tokens = best // vocab_size, best % vocab_size
+            scores = candidates[best]
+            hypotheses = [hypotheses[b] + [int(t)] for b, t in zip(beams, tokens)]
+            state = [s[:, beams] for s in state]
+            for i, token in enumerate(tokens):
+                if token == self.eos_id and np.isfinite(scores[i]):
+                    finished.append((float(scores[i]), hypotheses[i]))
+                    scores[i] = -np.inf
+            if len(finished) >= k or not np.isfinite(scores).any():
+                break
+            symbols = tokens.reshape(k, 1).astype(np.int64)
+        finished.extend((float(scores[i]), hypotheses[i]) for i in range(k) if np.isfinite(scores[i]))
+        return max(finished, key=lambda hypothesis: hypothesis[0])[1]
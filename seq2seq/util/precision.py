@@ -0,0 +1,31 @@
+import torch
+
+
+class _NoAutocast(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def autocast(use_bf16):
+    """
+    Returns a context manager running the enclosed forward computation in bfloat16 where it is safe to do so.
+
+    Only the operations `torch.autocast` selects (matrix multiplications, RNNs) run in bfloat16, reductions such as
+    `log_softmax` and the losses stay in fp32, and so do the parameters: the optimizer keeps updating fp32 master
+    weights.  Backward propagation should be called outside of the context.
+
+    Args:
+        use_bf16 (bool): whether to use bfloat16, a no-op context is returned otherwise
+    Returns:
+        context manager
+    """
+    if not use_bf16:
+        return _NoAutocast()
+    if not hasattr(torch, 'autocast'):
+        raise ValueError("bfloat16 autocast requires torch >= 1.10.")
+    device_type = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return torch.autocast(device_type, dtype=torch.bfloat16)
@@ -0,0 +1,52 @@
+import copy
+
+import torch
+import torch.nn as nn
+
+from .checkpoint import Checkpoint
+
+QUANTIZED_MODULES = {nn.Linear, nn.GRU, nn.LSTM}
+
+
+def quantize_dynamic(model):
+    """
+    Returns a copy of a model with int8 dynamically quantized weights for CPU inference.
+
+    The weights of every `nn.Linear`, `nn.GRU` and `nn.LSTM` are stored as int8 and the activations are quantized
+    on the fly, which covers the largest matrices of the models: `DecoderRNN.out`, the RNNs of `EncoderRNN`,
+    `DecoderRNN` and `HierarchialRNN` and `Attention.linear_out`.  Embeddings stay in fp32.  Quantized models run
+    on CPU only and cannot be trained.
+
+    Args:
+        model (seq2seq.models): trained model, e.g. `Seq2seq` or `HSeq2seq`
+    Returns:
+        seq2seq.models: the quantized model in evaluation mode
+    """
+    # the model of the caller keeps its device and mode
+    model = copy.deepcopy(model).cpu()
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, QUANTIZED_MODULES, dtype=torch.qint8, inplace=True)
+
+
+def is_quantized(model):
+    """ Returns whether any submodule of a model holds quantized weights. """
+    return any(type(module).__module__.startswith(('torch.nn.quantized', 'torch.ao.nn.quantized'))
+               for module in model.modules())
+
+
+def quantize_checkpoint(checkpoint):
+    """
+    Quantizes the model of a checkpoint, see :func:`quantize_dynamic`.  The optimizer is dropped since a quantized
+    model cannot be trained.
+
+    Args:
+        checkpoint (Checkpoint): checkpoint of a trained model
+    Returns:
+        Checkpoint: a new, unsaved checkpoint holding the quantized model
+    """
+    return Checkpoint(model=quantize_dynamic(checkpoint.model),
+                      optimizer=None,
+                      epoch=checkpoint.epoch,
+                      step=checkpoint.step,
+                      input_vocab=checkpoint.input_vocab,
+                      output_vocab=checkpoint.output_vocab)
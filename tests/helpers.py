@@ -0,0 +1,26 @@
+import torch
+
+from seq2seq.evaluator import Predictor
+from seq2seq.models import Seq2seq, EncoderRNN, DecoderRNN
+
+
+class Vocab(object):
+    """ Vocabulary of the given tokens, with the `itos` and `stoi` of a `torchtext.vocab.Vocab`. """
+
+    def __init__(self, itos):
+        self.itos = itos
+        self.stoi = dict((tok, i) for i, tok in enumerate(itos))
+
+
+def digit_vocab(*specials):
+    """ Vocabulary of `<unk>`, `<pad>`, `<sos>`, `<eos>`, the extra `specials` and the digits. """
+    return Vocab(['<unk>', '<pad>', '<sos>', '<eos>'] + list(specials) + [str(i) for i in range(10)])
+
+
+def toy_predictor():
+    """ Predictor of a seeded, untrained attention `Seq2seq` with hidden states of 16 features over `digit_vocab()`. """
+    torch.manual_seed(0)
+    vocab = digit_vocab()
+    encoder = EncoderRNN(len(vocab.itos), 8, 16, variable_lengths=True)
+    decoder = DecoderRNN(len(vocab.itos), 8, 16, vocab.stoi['<sos>'], vocab.stoi['<eos>'], use_attention=True)
+    return Predictor(Seq2seq(encoder, decoder), vocab, vocab)
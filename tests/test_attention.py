@@ -0,0 +1,47 @@
+import unittest
+
+import torch
+
+from seq2seq.models import Seq2seq, EncoderRNN, DecoderRNN
+from seq2seq.models.attention import Attention, RaggedContext, attention_context, length_mask
+
+
+class TestAttention(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.attention = Attention(8)
+        self.context = torch.randn(5, 12, 8)
+        self.output = torch.randn(5, 3, 8)
+        self.lengths = torch.LongTensor([12, 2, 7, 1, 3])
+
+    def test_masked_positions_get_no_weight(self):
+        mask = length_mask(self.lengths, 12)
+        _, attn = self.attention(self.output, self.context, mask)
+        self.assertTrue(torch.all(attn.masked_select(mask.unsqueeze(1).expand_as(attn)) == 0))
+        self.assertTrue(torch.allclose(attn.sum(2), torch.ones(5, 3)))
+
+    def test_ragged_context_matches_masked_context(self):
+        mask = length_mask(self.lengths, 12)
+        context = attention_context(self.context, mask)
+        self.assertIsInstance(context, RaggedContext)
+        self.assertGreater(len(context.groups), 1)
+
+        output, attn = self.attention(self.output, self.context, mask)
+        ragged_output, ragged_attn = self.attention(self.output, context)
+        self.assertTrue(torch.allclose(output, ragged_output, atol=1e-6))
+        self.assertTrue(torch.allclose(attn, ragged_attn, atol=1e-6))
+
+    def test_even_lengths_keep_dense_context(self):
+        mask = length_mask(torch.LongTensor([12, 11, 12, 10, 12]), 12)
+        self.assertIs(attention_context(self.context, mask), self.context)
+
+    def test_seq2seq_ignores_padding(self):
+        encoder = EncoderRNN(10, 10, 8, variable_lengths=True)
+        decoder = DecoderRNN(10, 10, 8, 1, 2, use_attention=True)
+        model = Seq2seq(encoder, decoder).eval()
+        with torch.no_grad():
+            batch_outputs, _, _ = model(torch.LongTensor([[3, 4, 5, 6], [7, 8, 0, 0]]), [4, 2])
+            outputs, _, _ = model(torch.LongTensor([[7, 8]]), [2])
+        for batch_step_output, step_output in zip(batch_outputs, outputs):
+            self.assertTrue(torch.allclose(batch_step_output[1], step_output[0], atol=1e-6))
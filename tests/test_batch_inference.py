@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from seq2seq.evaluator import BatchInference
+from tests.helpers import toy_predictor
+
+
+class TestBatchInference(unittest.TestCase):
+
+    def setUp(self):
+        self.predictor = toy_predictor()
+        self.test_dir = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.test_dir, 'src.tsv')
+        self.out_path = os.path.join(self.test_dir, 'out.tsv')
+        self.lines = [' '.join(str((i * 7 + j) % 10) for j in range(1 + i % 5)) + '\tref' for i in range(23)]
+        self.lines.insert(5, '')
+        with open(self.src_path, 'w') as f:
+            f.write('\n'.join(self.lines) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _expected(self):
+        expected = []
+        for line in self.lines:
+            if line:
+                prediction = self.predictor.predict(line.split('\t')[0].split())
+                expected.append(line + '\t' + ' '.join(tok for tok in prediction if tok != '<eos>'))
+        return expected
+
+    def _output(self):
+        with open(self.out_path) as f:
+            return f.read().splitlines()
+
+    def test_run(self):
+        stats = BatchInference(self.predictor, shard_size=4, batch_size=3).run(self.src_path, self.out_path)
+        self.assertEqual(self._output(), self._expected())
+        self.assertEqual(stats, {'lines': 24, 'written': 23, 'duplicates': 0})
+        self.assertFalse(os.path.exists(BatchInference.progress_path(self.out_path)))
+
+    def test_workers(self):
+        BatchInference(self.predictor, workers=2, shard_size=4).run(self.src_path, self.out_path)
+        self.assertEqual(self._output(), self._expected())
+
+    def test_resume_after_crash(self):
+        predict_batch = self.predictor.predict_batch
+        calls = []
+
+        def crashing_predict_batch(src_seqs):
+            calls.append(src_seqs)
+            if len(calls) == 3:
+                raise RuntimeError('crash')
+            return predict_batch(src_seqs)
+        inference = BatchInference(self.predictor, shard_size=4)
+        with mock.patch.object(self.predictor, 'predict_batch', side_effect=crashing_predict_batch):
+            self.assertRaises(RuntimeError, inference.run, self.src_path, self.out_path)
+        self.assertEqual(len(self._output()), 7)
+        # a partial write after the marker is dropped
+        with open(self.out_path, 'a') as f:
+            f.write('partial')
+
+        stats = inference.run(self.src_path, self.out_path)
+        self.assertEqual(self._output(), self._expected())
+        self.assertEqual(stats['lines'], 24)
+
+    def test_dedupe(self):
+        with mock.patch.object(self.predictor, 'predict_batch', side_effect=lambda src_seqs: [['x']] * len(src_seqs)):
+            stats = BatchInference(self.predictor, dedupe=True).run(self.src_path, self.out_path)
+        self.assertEqual(self._output(), [self.lines[0] + '\tx'])
+        self.assertEqual(stats['duplicates'], 22)
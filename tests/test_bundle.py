@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from seq2seq.models import EncoderRNN, DecoderRNN, HierarchialRNN, TopKDecoder, Seq2seq, HSeq2seq
+from seq2seq.util.bundle import InferenceBundle, model_config, build_model
+from tests.helpers import Vocab
+
+
+class TestInferenceBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.vocab = Vocab(['<unk>', '<pad>', '<sos>', '<eos>', 'a', 'b'])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_config_round_trip(self):
+        encoder = EncoderRNN(6, 5, 8, bidirectional=True, rnn_cell='lstm', variable_lengths=True)
+        decoder = DecoderRNN(6, 5, 16, 2, 3, rnn_cell='lstm', bidirectional=True, use_attention=True)
+        hrnn = HierarchialRNN(5, 16)
+        tied_decoder = DecoderRNN(6, 5, 8, 2, 3, tie_weights=True)
+        for model in [Seq2seq(encoder, decoder), HSeq2seq(encoder, hrnn, TopKDecoder(decoder, 3)),
+                      Seq2seq(EncoderRNN(6, 5, 8), tied_decoder, share_embeddings=True)]:
+            config = model_config(model)
+            self.assertEqual(config, model_config(build_model(config)))
+
+    def test_save_and_load(self):
+        model = Seq2seq(EncoderRNN(6, 5, 8), DecoderRNN(6, 5, 8, 2, 3, use_attention=True))
+        path = os.path.join(self.dir, 'model.bundle')
+        InferenceBundle(model, self.vocab, self.vocab).save(path)
+
+        bundle = InferenceBundle.load(path)
+        self.assertFalse(bundle.model.training)
+        for (name, param), (_, loaded_param) in zip(model.state_dict().items(),
+                                                    bundle.model.state_dict().items()):
+            self.assertTrue(torch.equal(param, loaded_param), name)
+        self.assertEqual(self.vocab.itos, bundle.output_vocab.itos)
+        self.assertEqual(4, bundle.input_vocab.stoi['a'])
+        # unseen tokens map to <unk> and are not added to the vocabulary
+        self.assertEqual(0, bundle.input_vocab.stoi['unseen'])
+        self.assertEqual(6, len(bundle.input_vocab.stoi))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import time
+import threading
+import unittest
+
+import mock
+
+from seq2seq.evaluator import CachedPredictor
+from tests.helpers import toy_predictor
+
+
+class TestCachedPredictor(unittest.TestCase):
+
+    def setUp(self):
+        self.predictor = toy_predictor()
+        self.predict_batch = mock.Mock(wraps=self.predictor.predict_batch)
+        self.predictor.predict_batch = self.predict_batch
+
+    def test_repeated_requests_hit(self):
+        cached = CachedPredictor(self.predictor)
+        expected = self.predictor.predict(['1', '2', '3'])
+        self.assertEqual(cached.predict(['1', '2', '3']), expected)
+        self.assertEqual(cached.predict(['1', '2', '3']), expected)
+        # unknown tokens share the ids of <unk>
+        self.assertEqual(cached.predict(['x']), cached.predict(['y']))
+        self.assertEqual(self.predict_batch.call_count, 2)
+        stats = cached.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (2, 2, 2))
+
+    def test_batch_predicts_distinct_misses_together(self):
+        cached = CachedPredictor(self.predictor)
+        cached.predict(['4'])
+        src_seqs = [['1', '2'], ['4'], ['5'], ['1', '2']]
+        self.assertEqual(cached.predict_batch(src_seqs), [self.predictor.predict(seq) for seq in src_seqs])
+        self.assertEqual(self.predict_batch.call_args_list[1][0][0], [['1', '2'], ['5']])
+        self.assertEqual(cached.coalesced, 1)
+
+    def test_decoding_config_is_part_of_the_key(self):
+        cached = CachedPredictor(self.predictor)
+        cached.predict(['1', '2'])
+        self.predictor.model.decoder.max_length = 1
+        self.assertEqual(len(cached.predict(['1', '2'])), 1)
+        self.assertEqual(cached.misses, 2)
+
+    def test_limits(self):
+        cached = CachedPredictor(self.predictor, max_entries=2)
+        for src_seq in [['1'], ['2'], ['1'], ['3']]:
+            cached.predict(src_seq)
+        # ['2'] was the least recently used
+        self.assertEqual(cached.evictions, 1)
+        cached.predict(['1'])
+        cached.predict(['2'])
+        self.assertEqual(cached.stats()['misses'], 4)
+
+        cached = CachedPredictor(self.predictor, max_bytes=1)
+        cached.predict(['1'])
+        self.assertEqual(cached.stats()['bytes'], 0)
+
+    def test_ttl(self):
+        cached = CachedPredictor(self.predictor, ttl=10)
+        with mock.patch('seq2seq.evaluator.cached_predictor.time.monotonic', return_value=0):
+            cached.predict(['1'])
+        with mock.patch('seq2seq.evaluator.cached_predictor.time.monotonic', return_value=5):
+            cached.predict(['1'])
+        with mock.patch('seq2seq.evaluator.cached_predictor.time.monotonic', return_value=11):
+            cached.predict(['1'])
+        self.assertEqual((cached.hits, cached.misses, cached.expirations), (1, 2, 1))
+
+    def test_concurrent_requests_are_coalesced(self):
+        started, release = threading.Event(), threading.Event()
+        predict_batch = self.predict_batch
+
+        def slow_predict_batch(src_seqs):
+            started.set()
+            release.wait()
+            return predict_batch(src_seqs)
+        self.predictor.predict_batch = slow_predict_batch
+        cached = CachedPredictor(self.predictor)
+
+        results = [None] * 4
+
+        def predict(i):
+            results[i] = cached.predict(['1', '2'])
+        threads = [threading.Thread(target=predict, args=(i,)) for i in range(4)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        while cached.coalesced < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(predict_batch.call_count, 1)
+        self.assertEqual(results, [results[0]] * 4)
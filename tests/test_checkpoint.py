@@ -3,8 +3,10 @@ import os
 import shutil
 
 import mock
-from mock import ANY
+import torch
 
+from seq2seq.models import EncoderRNN, DecoderRNN, Seq2seq
+from seq2seq.optim import Optimizer
 from seq2seq.util.checkpoint import Checkpoint
 
 
@@ -21,46 +23,73 @@ class TestCheckpoint(unittest.TestCase):
         ckpt = Checkpoint(None, None, None, None, None, None)
         self.assertRaises(LookupError, lambda: ckpt.path)
 
+    @mock.patch('seq2seq.util.checkpoint.os.path.exists')
     @mock.patch('seq2seq.util.checkpoint.os.listdir')
-    def test_get_latest_checkpoint(self, mock_listdir):
+    def test_get_latest_checkpoint(self, mock_listdir, mock_exists):
         mock_listdir.return_value = ['2017_05_22_09_47_26',
                                      '2017_05_22_09_47_31',
                                      '2017_05_23_10_47_29']
+        mock_exists.return_value = True
         latest_checkpoint = Checkpoint.get_latest_checkpoint(self.EXP_DIR)
         self.assertEquals(latest_checkpoint,
                           os.path.join(self.EXP_DIR,
                                        'checkpoints/2017_05_23_10_47_29'))
 
-    @mock.patch('seq2seq.util.checkpoint.torch')
-    @mock.patch('seq2seq.util.checkpoint.dill')
-    @mock.patch('seq2seq.util.checkpoint.open')
-    def test_save_checkpoint_calls_torch_save(self, mock_open, mock_dill, mock_torch):
-        epoch = 5
-        step = 10
-        optim = mock.Mock()
-        state_dict = {'epoch': epoch, 'step': step, 'optimizer': optim}
-
-        mock_model = mock.Mock()
-        mock_vocab = mock.Mock()
-        mock_open.return_value = mock.MagicMock()
-
-        chk_point = Checkpoint(model=mock_model, optimizer=optim,
-                               epoch=epoch, step=step,
-                               input_vocab=mock_vocab, output_vocab=mock_vocab)
-
-        path = chk_point.save(self._get_experiment_dir())
-
-        self.assertEquals(2, mock_torch.save.call_count)
-        mock_torch.save.assert_any_call(state_dict,
-                                        os.path.join(chk_point.path, Checkpoint.TRAINER_STATE_NAME))
-        mock_torch.save.assert_any_call(mock_model,
-                                        os.path.join(chk_point.path, Checkpoint.MODEL_NAME))
-        self.assertEquals(2, mock_open.call_count)
-        mock_open.assert_any_call(os.path.join(path, Checkpoint.INPUT_VOCAB_FILE), ANY)
-        mock_open.assert_any_call(os.path.join(path, Checkpoint.OUTPUT_VOCAB_FILE), ANY)
-        self.assertEquals(2, mock_dill.dump.call_count)
-        mock_dill.dump.assert_any_call(mock_vocab,
-                                       mock_open.return_value.__enter__.return_value)
+    @mock.patch('seq2seq.util.checkpoint.os.path.exists')
+    @mock.patch('seq2seq.util.checkpoint.os.listdir')
+    def test_get_latest_checkpoint_skips_incomplete(self, mock_listdir, mock_exists):
+        mock_listdir.return_value = ['2017_05_22_09_47_26',
+                                     '2017_05_23_10_47_29']
+        mock_exists.side_effect = lambda path: '2017_05_22_09_47_26' in path
+        latest_checkpoint = Checkpoint.get_latest_checkpoint(self.EXP_DIR)
+        self.assertEquals(latest_checkpoint,
+                          os.path.join(self.EXP_DIR,
+                                       'checkpoints/2017_05_22_09_47_26'))
+
+    def test_save_and_load(self):
+        model = self._get_model()
+        optim = Optimizer(torch.optim.Adam(model.parameters()), max_grad_norm=5)
+        vocab = ['<unk>', '<pad>', 'a', 'b']
+
+        path = Checkpoint(model=model, optimizer=optim, epoch=5, step=10,
+                          input_vocab=vocab, output_vocab=vocab).save(self._get_experiment_dir())
+        self.assertEquals([Checkpoint.MANIFEST_NAME], os.listdir(path))
+
+        loaded = Checkpoint.load(path)
+        self.assertEquals(5, loaded.epoch)
+        self.assertEquals(10, loaded.step)
+        self.assertEquals(vocab, loaded.input_vocab)
+        self.assertEquals(vocab, loaded.output_vocab)
+        self.assertEquals(5, loaded.optimizer.max_grad_norm)
+        for (name, param), (_, loaded_param) in zip(model.state_dict().items(),
+                                                    loaded.model.state_dict().items()):
+            self.assertTrue(torch.equal(param, loaded_param), name)
+
+    def test_save_deduplicates_blobs(self):
+        model = self._get_model()
+        optim = Optimizer(torch.optim.SGD(model.parameters(), lr=1))
+        experiment_dir = self._get_experiment_dir()
+        blob_dir = os.path.join(experiment_dir, Checkpoint.BLOB_DIR_NAME)
+
+        Checkpoint(model, optim, 1, 1, ['a'], ['b']).save(experiment_dir)
+        n_blobs = sum(len(files) for _, _, files in os.walk(blob_dir))
+        # only the decoder output bias changes between the checkpoints
+        model.decoder.out.bias.data.add_(1)
+        with mock.patch('seq2seq.util.checkpoint.time.strftime', return_value='later'):
+            Checkpoint(model, optim, 1, 2, ['a'], ['b']).save(experiment_dir)
+        self.assertEquals(n_blobs + 1, sum(len(files) for _, _, files in os.walk(blob_dir)))
+
+    def test_save_and_load_tied_weights(self):
+        encoder = EncoderRNN(10, 10, 8)
+        decoder = DecoderRNN(10, 10, 8, 0, 1, tie_weights=True)
+        model = Seq2seq(encoder, decoder, share_embeddings=True)
+        optim = Optimizer(torch.optim.SGD(model.parameters(), lr=1))
+
+        path = Checkpoint(model, optim, 1, 1, ['a'], ['b']).save(self._get_experiment_dir())
+        loaded = Checkpoint.load(path).model
+        self.assertTrue(loaded.decoder.out.weight is loaded.decoder.embedding.weight)
+        self.assertTrue(loaded.encoder.embedding.weight is loaded.decoder.embedding.weight)
+        self.assertTrue(torch.equal(model.decoder.embedding.weight, loaded.encoder.embedding.weight))
 
     @mock.patch('seq2seq.util.checkpoint.torch')
     @mock.patch('seq2seq.util.checkpoint.dill')
@@ -86,6 +115,11 @@ class TestCheckpoint(unittest.TestCase):
         self.assertEquals(loaded_chk_point.input_vocab, dummy_vocabulary)
         self.assertEquals(loaded_chk_point.output_vocab, dummy_vocabulary)
 
+    def _get_model(self):
+        encoder = EncoderRNN(10, 5, 8)
+        decoder = DecoderRNN(12, 5, 8, 0, 1, use_attention=True)
+        return Seq2seq(encoder, decoder)
+
     def _get_experiment_dir(self):
         root_dir = os.path.dirname(os.path.realpath(__file__))
         experiment_dir = os.path.join(root_dir, self.EXP_DIR)
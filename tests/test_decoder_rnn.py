@@ -1,4 +1,5 @@
 import os
+import time
 import unittest
 
 import torch
@@ -56,3 +57,66 @@ class TestDecoderRNN(unittest.TestCase):
                 equal = False
                 break
         self.assertFalse(equal)
+
+    def test_adaptive_output_layer(self):
+        rnn = DecoderRNN(self.vocab_size, 5, 16, 0, 1, output_layer='adaptive', cutoffs=[10, 50])
+        # in training mode the outputs are the hidden states projected by seq2seq.loss.AdaptiveNLLLoss
+        outputs, _, _ = rnn()
+        self.assertEqual([(1, 16)] * 5, [step_output.size() for step_output in outputs])
+        rnn.eval()
+        outputs, _, other = rnn()
+        self.assertEqual(5, len(outputs))
+        for step_output, symbols in zip(outputs, other['sequence']):
+            self.assertEqual((1, self.vocab_size), step_output.size())
+            # full log probabilities, as with the linear output layer
+            self.assertAlmostEqual(1., step_output.exp().sum().item(), places=4)
+            self.assertEqual(symbols.tolist(), step_output.topk(1)[1].tolist())
+
+    def test_adaptive_output_layer_requires_cutoffs(self):
+        self.assertRaises(ValueError, DecoderRNN, self.vocab_size, 5, 16, 0, 1, output_layer='adaptive')
+
+    def test_precompute_input_projections(self):
+        for rnn_cell in ['gru', 'lstm']:
+            rnn = DecoderRNN(self.vocab_size, 10, 16, 0, 1, n_layers=2, rnn_cell=rnn_cell)
+            rnn.eval()
+            hidden = torch.randn(2, 3, 16)
+            if rnn_cell == 'lstm':
+                hidden = (hidden, torch.randn(2, 3, 16))
+            outputs, _, other = rnn(encoder_hidden=hidden)
+
+            rnn.precompute_input_projections()
+            projected_outputs, _, projected_other = rnn(encoder_hidden=hidden)
+            for output, projected_output in zip(outputs, projected_outputs):
+                self.assertTrue(torch.allclose(output, projected_output, atol=1e-5))
+            self.assertEqual(other['length'], projected_other['length'])
+
+            rnn.train()
+            self.assertIsNone(rnn._input_projections)
+
+    def test_deadline(self):
+        rnn = DecoderRNN(self.vocab_size, 10, 16, 0, 1)
+        hidden = torch.randn(1, 3, 16)
+        _, _, other = rnn(encoder_hidden=hidden, deadline=time.monotonic())
+        # the first step is decoded even when the deadline has passed
+        self.assertEqual(len(other['sequence']), 1)
+        self.assertEqual(other['length'], [1, 1, 1])
+        self.assertEqual(other['truncated'], [int(s) != 1 for s in other['sequence'][0].view(-1)])
+
+        _, _, other = rnn(encoder_hidden=hidden, deadline=time.monotonic() + 60)
+        self.assertEqual(len(other['sequence']), 10)
+        self.assertEqual(other['truncated'], [False] * 3)
+
+    def test_max_lengths(self):
+        rnn = DecoderRNN(self.vocab_size, 10, 16, 0, 1)
+        rnn.out.bias.data[1] = -10
+        hidden = torch.randn(1, 3, 16)
+        _, _, full = rnn(encoder_hidden=hidden)
+        _, _, other = rnn(encoder_hidden=hidden, max_lengths=[2, 4, 20])
+        self.assertEqual(other['length'], [min(n, length) for n, length in zip([2, 4, 10], full['length'])])
+        for step, symbols in enumerate(other['sequence']):
+            self.assertTrue(torch.equal(symbols, full['sequence'][step]))
+
+        # the decoding stops once every sequence reached its maximum length
+        _, _, other = rnn(encoder_hidden=hidden, max_lengths=[2, 3, 1])
+        self.assertEqual(len(other['sequence']), 3)
+        self.assertEqual(other['truncated'], [False] * 3)
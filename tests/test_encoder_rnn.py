@@ -58,3 +58,17 @@ class TestEncoderRNN(unittest.TestCase):
                 equal = False
                 break
         self.assertFalse(equal)
+
+    def test_checkpoint_activations_keeps_gradients(self):
+        rnn = EncoderRNN(self.vocab_size, 50, 16, input_dropout_p=0.5, variable_lengths=True)
+        checkpointed = EncoderRNN(self.vocab_size, 50, 16, input_dropout_p=0.5, variable_lengths=True,
+                                  checkpoint_activations=True)
+        checkpointed.load_state_dict(rnn.state_dict())
+        gradients = []
+        for model in [rnn, checkpointed]:
+            torch.manual_seed(0)
+            output, _ = model(self.input_var, self.lengths)
+            output.sum().backward()
+            gradients.append([param.grad for param in model.parameters()])
+        for grad, checkpointed_grad in zip(*gradients):
+            self.assertTrue(torch.allclose(grad, checkpointed_grad, atol=1e-6))
@@ -3,7 +3,7 @@ import unittest
 
 import torchtext
 
-from seq2seq.dataset import SourceField, TargetField
+from seq2seq.dataset import SourceField, TargetField, build_joint_vocab
 
 class TestField(unittest.TestCase):
 
@@ -48,3 +48,19 @@ class TestField(unittest.TestCase):
         field.build_vocab(train)
         self.assertFalse(field.sos_id is None)
         self.assertFalse(field.eos_id is None)
+
+    def test_build_joint_vocab(self):
+        test_path = os.path.dirname(os.path.realpath(__file__))
+        src = SourceField()
+        tgt = TargetField()
+        train = torchtext.data.TabularDataset(
+            path=os.path.join(test_path, 'data/eng-fra.txt'), format='tsv',
+            fields=[('src', src), ('tgt', tgt)]
+        )
+        build_joint_vocab(src, tgt, train)
+        self.assertTrue(src.vocab is tgt.vocab)
+        self.assertEqual(tgt.vocab.stoi['<sos>'], tgt.sos_id)
+        self.assertEqual(tgt.vocab.stoi['<eos>'], tgt.eos_id)
+        for example in train.examples:
+            for tok in example.src + example.tgt:
+                self.assertIn(tok, src.vocab.stoi)
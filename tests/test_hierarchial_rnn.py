@@ -0,0 +1,76 @@
+import unittest
+
+import torch
+
+from seq2seq.models import HSeq2seq, EncoderRNN, DecoderRNN, HierarchialRNN
+from seq2seq.models.attention import length_mask
+
+
+class TestHierarchialRNN(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.batch_size, self.seq_len, self.chunk_len, self.hidden_size = 2, 6, 4, 8
+        self.chunks = torch.randn(self.batch_size, self.seq_len, self.hidden_size)
+        self.words = torch.randn(self.batch_size, self.seq_len * self.chunk_len, self.hidden_size)
+        chunk_lengths = torch.randint(1, self.chunk_len + 1, (self.batch_size * self.seq_len,))
+        self.mask = length_mask(chunk_lengths, self.chunk_len).view(self.batch_size, -1)
+
+    def test_topk_of_all_chunks_matches_full_attention(self):
+        full = HierarchialRNN(10, self.hidden_size).eval()
+        topk = HierarchialRNN(10, self.hidden_size, attention_topk=self.seq_len).eval()
+        topk.load_state_dict(full.state_dict())
+        with torch.no_grad():
+            output, _ = full(self.chunks, self.words, encoder_mask=self.mask)
+            topk_output, _ = topk(self.chunks, self.words, encoder_mask=self.mask)
+        self.assertTrue(torch.allclose(output, topk_output, atol=1e-6))
+
+    def test_window_of_one_chunk_attends_to_own_words(self):
+        hrnn = HierarchialRNN(10, self.hidden_size, attention_window=1).eval()
+        with torch.no_grad():
+            output, _ = hrnn(self.chunks, self.words, encoder_mask=self.mask)
+            rnn_output, _ = hrnn.rnn(self.chunks)
+            words = self.words.view(self.batch_size * self.seq_len, self.chunk_len, -1)
+            expected, _ = hrnn.attention(rnn_output.contiguous().view(self.batch_size * self.seq_len, 1, -1), words,
+                                         self.mask.view(self.batch_size * self.seq_len, self.chunk_len))
+        self.assertTrue(torch.allclose(output, expected.view_as(output), atol=1e-6))
+
+    def test_variable_lengths_ignores_padded_chunks(self):
+        hrnn = HierarchialRNN(10, self.hidden_size, variable_lengths=True).eval()
+        lengths, mask = [3, self.seq_len], self.mask.clone()
+        mask[0, 3 * self.chunk_len:] = 1
+        with torch.no_grad():
+            output, _ = hrnn(self.chunks, self.words, lengths, encoder_mask=mask)
+            alone, _ = hrnn(self.chunks[:1, :3], self.words[:1, :3 * self.chunk_len], [3],
+                            encoder_mask=mask[:1, :3 * self.chunk_len])
+        self.assertEqual(output.size(1), self.seq_len)
+        self.assertTrue(torch.allclose(output[0, :3], alone[0], atol=1e-6))
+
+    def test_local_attention_modes_are_exclusive(self):
+        self.assertRaises(ValueError, HierarchialRNN, 10, 8, attention_window=2, attention_topk=2)
+
+    def test_checkpoint_activations_keeps_gradients(self):
+        gradients = []
+        hrnn = HierarchialRNN(10, self.hidden_size, attention_window=2)
+        checkpointed = HierarchialRNN(10, self.hidden_size, attention_window=2, checkpoint_activations=True)
+        checkpointed.load_state_dict(hrnn.state_dict())
+        for model in [hrnn, checkpointed]:
+            words = self.words.clone().requires_grad_()
+            output, _ = model(self.chunks, words, encoder_mask=self.mask)
+            output.sum().backward()
+            gradients.append([words.grad] + [param.grad for param in model.parameters()])
+        for grad, checkpointed_grad in zip(*gradients):
+            self.assertTrue(torch.allclose(grad, checkpointed_grad, atol=1e-6))
+
+    def test_chunk_features_are_outputs_at_last_word(self):
+        encoder = EncoderRNN(10, 10, self.hidden_size, variable_lengths=True)
+        model = HSeq2seq(encoder, HierarchialRNN(10, self.hidden_size), DecoderRNN(10, 5, self.hidden_size, 1, 2))
+        features = []
+        model.hrnn.register_forward_hook(lambda module, inputs, outputs: features.append(inputs[0]))
+        chunks = [[3, 4], [5, 6, 7]]
+        input_var = torch.LongTensor([[chunk + [0] * (3 - len(chunk)) for chunk in chunks]])
+        with torch.no_grad():
+            model.eval()(input_var, chunk_lengths=torch.LongTensor([[len(chunk) for chunk in chunks]]))
+            for i, chunk in enumerate(chunks):
+                outputs, _ = encoder(torch.LongTensor([chunk]), [len(chunk)])
+                self.assertTrue(torch.allclose(features[0][0, i], outputs[0, -1], atol=1e-6))
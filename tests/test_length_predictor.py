@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import torchtext
+
+from seq2seq.dataset import SourceField, TargetField, LengthPredictor
+
+
+class TestLengthPredictor(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_build(self):
+        pairs = [(['a'], ['x'] * n) for n in range(1, 11)] + [(['a'] * 3, ['x'] * 4)] * 10
+        length_predictor = LengthPredictor.build(pairs, quantile=0.9, margin=1, min_count=5)
+        # 9 tokens and the end of sentence symbol, plus the margin
+        self.assertEqual(length_predictor.max_lengths([1]), [11])
+        # source lengths without pairs are pooled with the next ones, and the caps do not decrease
+        self.assertEqual(length_predictor.max_lengths([0, 2, 3]), [11, 11, 11])
+        self.assertEqual(length_predictor.max_lengths([100]), [11])
+
+        pairs = [(['a'], ['x'])] * 10 + [(['a'] * 2, ['x'] * 6)] * 10
+        length_predictor = LengthPredictor.build(pairs, quantile=1., margin=0, min_count=5)
+        self.assertEqual(length_predictor.max_lengths([1, 2, 5]), [2, 7, 7])
+
+    def test_from_dataset(self):
+        test_path = os.path.dirname(os.path.realpath(__file__))
+        dataset = torchtext.data.TabularDataset(
+            path=os.path.join(test_path, 'data/eng-fra.txt'), format='tsv',
+            fields=[('src', SourceField()), ('tgt', TargetField())])
+        length_predictor = LengthPredictor.from_dataset(dataset, quantile=1., margin=0, min_count=1)
+        longest = max(len(example.tgt) - 1 for example in dataset.examples if len(example.src) == 3)
+        self.assertEqual(length_predictor.max_lengths([3]), [longest])
+
+    def test_save_and_load(self):
+        length_predictor = LengthPredictor.build([(['a'], ['x'] * 3), (['a'] * 4, ['x'] * 8)], min_count=1)
+        path = os.path.join(self.dir, 'lengths.npz')
+        length_predictor.save(path)
+        loaded = LengthPredictor.load(path)
+        np.testing.assert_array_equal(loaded.caps, length_predictor.caps)
@@ -7,7 +7,8 @@ import torch.nn.functional as F
 from torch.autograd import Variable
 
 from seq2seq.loss.loss import Loss
-from seq2seq.loss import NLLLoss, Perplexity
+from seq2seq.loss import NLLLoss, AdaptiveNLLLoss, Perplexity
+from seq2seq.models import DecoderRNN
 
 class TestLoss(unittest.TestCase):
     @classmethod
@@ -83,3 +84,44 @@ class TestLoss(unittest.TestCase):
         ppl_loss = ppl.get_loss()
 
         self.assertAlmostEqual(ppl_loss, math.exp(nll_loss))
+
+    def test_adaptive_nllloss_init_WITH_LINEAR_OUTPUT_LAYER(self):
+        self.assertRaises(ValueError, lambda: AdaptiveNLLLoss(torch.nn.Linear(4, 5)))
+
+    def test_adaptive_nllloss(self):
+        torch.manual_seed(0)
+        pad = 5
+        decoder = DecoderRNN(60, 8, 16, 0, 1, use_attention=True, output_layer='adaptive', cutoffs=[10, 30])
+        encoder_hidden, encoder_outputs = torch.randn(1, 4, 16), torch.randn(4, 3, 16)
+        targets = torch.randint(2, 60, (4, 7))
+        targets[1, 4:] = pad
+        targets[:, 0] = 0
+
+        gradients, losses = [], []
+        for adaptive in [True, False]:
+            decoder.zero_grad()
+            outputs, _, _ = decoder(targets, encoder_hidden, encoder_outputs, teacher_forcing_ratio=1)
+            if adaptive:
+                loss = AdaptiveNLLLoss(decoder.out, mask=pad)
+            else:
+                # the full log probabilities of the same hidden states
+                outputs = [decoder.out.log_prob(step_output) for step_output in outputs]
+                weight = torch.ones(60)
+                loss = NLLLoss(weight=weight, mask=pad)
+            for step, step_output in enumerate(outputs):
+                loss.eval_batch(step_output, targets[:, step + 1])
+            loss.backward()
+            losses.append(loss.acc_loss.item())
+            gradients.append([param.grad.clone() for param in decoder.parameters()])
+
+        self.assertAlmostEqual(losses[0], losses[1], places=4)
+        for grad, expected in zip(*gradients):
+            self.assertTrue(torch.allclose(grad, expected, atol=1e-5))
+
+        # in evaluation mode the decoder outputs log probabilities, as with NLLLoss
+        decoder.eval()
+        outputs, _, _ = decoder(targets, encoder_hidden, encoder_outputs, teacher_forcing_ratio=1)
+        loss = AdaptiveNLLLoss(decoder.out, mask=pad)
+        for step, step_output in enumerate(outputs):
+            loss.eval_batch(step_output, targets[:, step + 1])
+        self.assertAlmostEqual(loss.acc_loss.item(), losses[0], places=4)
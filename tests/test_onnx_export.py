@@ -0,0 +1,66 @@
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from seq2seq.evaluator import Predictor, HierarchialPredictor
+from seq2seq.models import Seq2seq, HSeq2seq, EncoderRNN, DecoderRNN, HierarchialRNN, TopKDecoder
+from seq2seq.util.onnx_export import export_onnx
+from tests.helpers import digit_vocab
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+
+@unittest.skipIf(onnxruntime is None, "onnxruntime is not installed")
+class TestOnnxExport(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.dir = tempfile.mkdtemp()
+        self.vocab = digit_vocab('<cpad>')
+        self.src_seqs = [["1"], "1 2 3".split(), "9 8 7 6 5 4".split()]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _runtime(self, model):
+        from seq2seq.util.onnx_runtime import OnnxSeq2seq
+        export_onnx(model, self.vocab, self.vocab, self.dir)
+        return OnnxSeq2seq(self.dir)
+
+    def test_seq2seq_matches_predictor(self):
+        for rnn_cell in ['gru', 'lstm']:
+            encoder = EncoderRNN(15, 10, 16, bidirectional=True, rnn_cell=rnn_cell, variable_lengths=True)
+            decoder = DecoderRNN(15, 10, 32, 2, 3, bidirectional=True, rnn_cell=rnn_cell, use_attention=True)
+            model = Seq2seq(encoder, decoder)
+            runtime = self._runtime(model)
+            predictor = Predictor(model, self.vocab, self.vocab)
+            for src_seq in self.src_seqs:
+                self.assertEqual(predictor.predict(src_seq), runtime.predict(src_seq))
+
+    def test_hseq2seq_matches_predictor(self):
+        encoder = EncoderRNN(15, 10, 16, rnn_cell='lstm', variable_lengths=True)
+        decoder = DecoderRNN(15, 10, 16, 2, 3, rnn_cell='lstm', use_attention=True)
+        model = HSeq2seq(encoder, HierarchialRNN(10, 16, rnn_cell='lstm'), decoder)
+        runtime = self._runtime(model)
+        predictor = HierarchialPredictor(model, self.vocab, self.vocab)
+        for src_seq in [["1|2"], "1|2|3 4 5|6".split()]:
+            self.assertEqual(predictor.predict(src_seq), runtime.predict(src_seq))
+
+    def test_beam_search(self):
+        decoder = DecoderRNN(15, 10, 16, 2, 3, use_attention=True)
+        model = Seq2seq(EncoderRNN(15, 10, 16), TopKDecoder(decoder, 3))
+        runtime = self._runtime(model)
+        tgt_seq = runtime.predict(self.src_seqs[1], beam_size=3)
+        self.assertTrue(0 < len(tgt_seq) <= 10)
+        for tok in tgt_seq:
+            self.assertIn(tok, self.vocab.stoi)
+
+
+if __name__ == '__main__':
+    unittest.main()
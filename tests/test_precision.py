@@ -0,0 +1,40 @@
+import unittest
+
+import torch
+
+from seq2seq.loss import NLLLoss
+from seq2seq.models import EncoderRNN, DecoderRNN, Seq2seq
+from seq2seq.optim import Optimizer
+from seq2seq.util.precision import autocast
+
+
+class TestPrecision(unittest.TestCase):
+
+    def test_bf16_train_step_keeps_fp32_weights_and_loss(self):
+        model = Seq2seq(EncoderRNN(10, 5, 16, variable_lengths=True),
+                        DecoderRNN(10, 5, 16, 2, 3, use_attention=True))
+        optimizer = Optimizer(torch.optim.SGD(model.parameters(), lr=0.1), max_grad_norm=5)
+        loss = NLLLoss()
+        src = torch.LongTensor([[4, 5, 6], [7, 8, 9]])
+        tgt = torch.LongTensor([[2, 6, 5, 3], [2, 9, 8, 3]])
+
+        with autocast(True):
+            decoder_outputs, _, _ = model(src, [3, 3], tgt, teacher_forcing_ratio=1)
+            loss.reset()
+            for step, step_output in enumerate(decoder_outputs):
+                loss.eval_batch(step_output, tgt[:, step + 1])
+        self.assertEqual(torch.float32, loss.acc_loss.dtype)
+
+        model.zero_grad()
+        loss.backward()
+        optimizer.step()
+        for param in model.parameters():
+            self.assertEqual(torch.float32, param.dtype)
+
+    def test_disabled_autocast_is_noop(self):
+        with autocast(False):
+            self.assertEqual(torch.float32, torch.mm(torch.randn(2, 2), torch.randn(2, 2)).dtype)
+
+
+if __name__ == '__main__':
+    unittest.main()
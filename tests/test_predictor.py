@@ -1,11 +1,13 @@
 import os
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
+import torch
 import torchtext
 
-from seq2seq.evaluator import Predictor
-from seq2seq.dataset import SourceField, TargetField
-from seq2seq.models import Seq2seq, EncoderRNN, DecoderRNN
+from seq2seq.evaluator import Predictor, HierarchialPredictor, ThreadedPredictor
+from seq2seq.dataset import SourceField, TargetField, Tokenizer, LengthPredictor
+from seq2seq.models import Seq2seq, HSeq2seq, EncoderRNN, DecoderRNN, HierarchialRNN, TopKDecoder
 
 class TestPredictor(unittest.TestCase):
 
@@ -25,9 +27,118 @@ class TestPredictor(unittest.TestCase):
         decoder = DecoderRNN(len(trg.vocab), 10, 10, trg.sos_id, trg.eos_id, rnn_cell='lstm')
         seq2seq = Seq2seq(encoder, decoder)
         self.predictor = Predictor(seq2seq, src.vocab, trg.vocab)
+        self.src_vocab = src.vocab
+        self.trg_vocab = trg.vocab
+        self.sos_id = trg.sos_id
+        self.eos_id = trg.eos_id
 
     def test_predict(self):
         src_seq = ["I", "am", "fat"]
         tgt_seq = self.predictor.predict(src_seq)
         for tok in tgt_seq:
             self.assertTrue(tok in self.predictor.tgt_vocab.stoi)
+
+    def test_predict_text(self):
+        predictor = Predictor(self.predictor.model, self.src_vocab, self.trg_vocab, tokenizer=Tokenizer())
+        self.assertEqual(predictor.predict("I'm fat."), predictor.predict(["I", "'m", "fat", "."]))
+        self.assertEqual(self.predictor.predict("I am fat"), self.predictor.predict(["I", "am", "fat"]))
+
+    def _decoder(self):
+        return DecoderRNN(len(self.trg_vocab), 10, 16, self.sos_id, self.eos_id, use_attention=True)
+
+    def test_predict_batch_matches_predict(self):
+        torch.manual_seed(0)
+        src_seqs = [["I", "am", "fat"], ["I"], ["we", "are", "very", "tired", "today"]]
+        for decoder in [self._decoder(), TopKDecoder(self._decoder(), 3)]:
+            encoder = EncoderRNN(len(self.src_vocab), 10, 16, variable_lengths=True)
+            predictor = Predictor(Seq2seq(encoder, decoder), self.src_vocab, self.trg_vocab)
+            self.assertEqual(predictor.predict_batch(src_seqs), [predictor.predict(seq) for seq in src_seqs])
+
+    def test_hierarchial_predict_batch_matches_predict(self):
+        torch.manual_seed(0)
+        src_seqs = [["I|am", "fat"], ["I"], ["we|are|very", "tired", "to|day"]]
+        encoder = EncoderRNN(len(self.src_vocab), 10, 16, variable_lengths=True)
+        model = HSeq2seq(encoder, HierarchialRNN(10, 16, variable_lengths=True), self._decoder())
+        predictor = HierarchialPredictor(model, self.src_vocab, self.trg_vocab)
+        self.assertEqual(predictor.predict_batch(src_seqs), [predictor.predict(seq) for seq in src_seqs])
+
+    def test_precompute_projections(self):
+        torch.manual_seed(0)
+        src_seqs = [["I", "am", "fat"], ["I"], ["we", "are", "very", "tired", "today"]]
+        for decoder in [self._decoder(), TopKDecoder(self._decoder(), 3)]:
+            model = Seq2seq(EncoderRNN(len(self.src_vocab), 10, 16, variable_lengths=True), decoder)
+            expected = [Predictor(model, self.src_vocab, self.trg_vocab).predict(seq) for seq in src_seqs]
+            predictor = Predictor(model, self.src_vocab, self.trg_vocab, precompute_projections=True)
+            rnn = decoder.rnn if isinstance(decoder, TopKDecoder) else decoder
+            self.assertIsNotNone(rnn._input_projections)
+            self.assertEqual([predictor.predict(seq) for seq in src_seqs], expected)
+
+    def test_predict_with_deadline(self):
+        torch.manual_seed(0)
+        src_seq = ["I", "am", "fat"]
+        encoder = EncoderRNN(len(self.src_vocab), 10, 16, variable_lengths=True)
+        greedy = Predictor(Seq2seq(encoder, self._decoder()), self.src_vocab, self.trg_vocab)
+        self.assertEqual(greedy.predict_with_deadline(src_seq, 60), (greedy.predict(src_seq), False))
+
+        beam = Predictor(Seq2seq(encoder, TopKDecoder(greedy.model.decoder, 3)), self.src_vocab, self.trg_vocab)
+        self.assertEqual(beam.predict_with_deadline(src_seq, 60), (beam.predict(src_seq), False))
+        self.assertIn('beam', beam._step_times)
+        # a beam search expected to exceed the budget falls back to greedy decoding
+        beam._step_times['beam'] = 10.
+        self.assertEqual(beam.predict_with_deadline(src_seq, 60), (greedy.predict(src_seq), False))
+        # the greedy fallbacks bring the estimate of a beam step back until the beam search fits again
+        self.assertLess(beam._step_times['beam'], 10.)
+        for _ in range(20):
+            if beam._step_times['beam'] * 10 <= 60:
+                break
+            beam.predict_with_deadline(src_seq, 60)
+        self.assertEqual(beam.predict_with_deadline(src_seq, 60), (beam.predict(src_seq), False))
+
+        tgt_seq, truncated = greedy.predict_with_deadline(src_seq, 0)
+        self.assertEqual(len(tgt_seq), 1)
+        self.assertEqual(truncated, tgt_seq != ['<eos>'])
+
+    def test_length_predictor(self):
+        torch.manual_seed(0)
+        src_seqs = [["I", "am", "fat"], ["I"], ["we", "are", "very", "tired", "today"]]
+        length_predictor = LengthPredictor.build([(["I"], ["je"]), (["I"] * 3, ["je"] * 3)], margin=0, min_count=1)
+        for decoder in [self._decoder(), TopKDecoder(self._decoder(), 3)]:
+            encoder = EncoderRNN(len(self.src_vocab), 10, 16, variable_lengths=True)
+            predictor = Predictor(Seq2seq(encoder, decoder), self.src_vocab, self.trg_vocab,
+                                  length_predictor=length_predictor)
+            tgt_seqs = predictor.predict_batch(src_seqs)
+            self.assertEqual(tgt_seqs, [predictor.predict(seq) for seq in src_seqs])
+            self.assertEqual(tgt_seqs, [list(predictor.predict_stream(seq)) for seq in src_seqs])
+            for tgt_seq, max_length in zip(tgt_seqs, [4, 2, 4]):
+                self.assertLessEqual(len(tgt_seq), max_length)
+
+    def test_predict_stream_matches_predict(self):
+        torch.manual_seed(0)
+        src_seqs = [["I", "am", "fat"], ["I"], ["we", "are", "very", "tired", "today"]]
+        for decoder in [self._decoder(), TopKDecoder(self._decoder(), 3)]:
+            encoder = EncoderRNN(len(self.src_vocab), 10, 16, variable_lengths=True)
+            predictor = Predictor(Seq2seq(encoder, decoder), self.src_vocab, self.trg_vocab)
+            for src_seq in src_seqs:
+                self.assertEqual(list(predictor.predict_stream(src_seq)), predictor.predict(src_seq))
+            self.assertTrue(torch.is_grad_enabled())
+
+        model = HSeq2seq(EncoderRNN(len(self.src_vocab), 10, 16, variable_lengths=True),
+                         HierarchialRNN(10, 16, variable_lengths=True), TopKDecoder(self._decoder(), 3))
+        predictor = HierarchialPredictor(model, self.src_vocab, self.trg_vocab)
+        src_seq = ["we|are|very", "tired", "to|day"]
+        self.assertEqual(list(predictor.predict_stream(src_seq)), predictor.predict(src_seq))
+
+    def test_threaded_predictions_match_sequential(self):
+        torch.manual_seed(0)
+        src_seqs = [["I", "am", "fat"], ["I"], ["we", "are", "very", "tired", "today"], ["we", "are"]] * 8
+        encoder = EncoderRNN(len(self.src_vocab), 10, 16, variable_lengths=True)
+        predictor = Predictor(Seq2seq(encoder, TopKDecoder(self._decoder(), 3)), self.src_vocab, self.trg_vocab)
+        expected = [predictor.predict(seq) for seq in src_seqs]
+        with ThreadedPredictor(predictor, num_threads=4) as threaded:
+            self.assertEqual(threaded.predict_many(src_seqs), expected)
+
+        # batches of different sizes decoded at once on the shared model
+        batches = [src_seqs[:i] for i in range(1, 9)] * 4
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(predictor.predict_batch, batches))
+        self.assertEqual(results, [expected[:len(batch)] for batch in batches])
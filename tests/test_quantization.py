@@ -0,0 +1,45 @@
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from seq2seq.models import EncoderRNN, DecoderRNN, Seq2seq
+from seq2seq.util.checkpoint import Checkpoint
+from seq2seq.util.quantization import quantize_dynamic, quantize_checkpoint, is_quantized
+
+
+class TestQuantization(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = Seq2seq(EncoderRNN(20, 5, 16, variable_lengths=True),
+                             DecoderRNN(20, 5, 16, 2, 3, use_attention=True))
+
+    def test_quantize_dynamic(self):
+        quantized = quantize_dynamic(self.model)
+        self.assertFalse(is_quantized(self.model))
+        self.assertTrue(self.model.training)
+        self.assertFalse(quantized.training)
+        self.assertTrue(is_quantized(quantized))
+        self.assertFalse(isinstance(quantized.decoder.out, torch.nn.Linear))
+
+        src = torch.LongTensor([[4, 5, 6, 7]])
+        outputs, _, _ = self.model.eval()(src, [4])
+        quantized_outputs, _, _ = quantized(src, [4])
+        for output, quantized_output in zip(outputs, quantized_outputs):
+            self.assertTrue((output - quantized_output).abs().max().item() < 0.1)
+
+    def test_quantized_checkpoint_round_trip(self):
+        expt_dir = tempfile.mkdtemp()
+        try:
+            path = quantize_checkpoint(Checkpoint(self.model, None, 1, 2, ['a'], ['b'])).save(expt_dir)
+            loaded = Checkpoint.load(path)
+            self.assertTrue(is_quantized(loaded.model))
+            self.assertEqual(2, loaded.step)
+        finally:
+            shutil.rmtree(expt_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
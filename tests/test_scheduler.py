@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+import mock
+import torch
+
+from seq2seq.dataset import LengthPredictor
+from seq2seq.evaluator import Predictor, HierarchialPredictor
+from seq2seq.models import Seq2seq, HSeq2seq, EncoderRNN, DecoderRNN, HierarchialRNN, TopKDecoder
+from seq2seq.server import DecodeScheduler, InferenceServer, PreforkServer
+from tests.helpers import digit_vocab
+
+
+class TestDecodeScheduler(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.vocab = digit_vocab('<cpad>')
+        self.decoder = DecoderRNN(len(self.vocab.itos), 8, 16, 2, 3, use_attention=True, rnn_cell='lstm')
+        self.encoder = EncoderRNN(len(self.vocab.itos), 8, 16, variable_lengths=True, rnn_cell='lstm')
+
+    def _decode(self, scheduler, src_seqs):
+        futures = []
+        for src_seq in src_seqs:
+            futures.append(scheduler.submit(src_seq))
+            # requests join while others are running
+            scheduler.step()
+        while scheduler.step():
+            pass
+        return [future.result() for future in futures]
+
+    def test_matches_static_batching(self):
+        predictor = Predictor(Seq2seq(self.encoder, self.decoder), self.vocab, self.vocab)
+        src_seqs = [['1', '2', '3'], ['4'], ['5', '6', '7', '8', '9'], ['2', '2'], ['7', '1', '3', '3']]
+        scheduler = DecodeScheduler(predictor, max_slots=2)
+        self.assertEqual(self._decode(scheduler, src_seqs), predictor.predict_batch(src_seqs))
+        self.assertEqual(scheduler.requests, len(src_seqs))
+
+    def test_length_predictor_matches_static_batching(self):
+        length_predictor = LengthPredictor.build([(['1'], ['1']), (['1'] * 4, ['1'] * 3)], margin=0, min_count=1)
+        predictor = Predictor(Seq2seq(self.encoder, self.decoder), self.vocab, self.vocab,
+                              length_predictor=length_predictor)
+        src_seqs = [['1', '2', '3'], ['4'], ['5', '6', '7', '8', '9'], ['2', '2']]
+        scheduler = DecodeScheduler(predictor, max_slots=2)
+        self.assertEqual(self._decode(scheduler, src_seqs), predictor.predict_batch(src_seqs))
+
+    def test_hierarchial_matches_static_batching(self):
+        model = HSeq2seq(self.encoder, HierarchialRNN(8, 16, rnn_cell='lstm', variable_lengths=True), self.decoder)
+        predictor = HierarchialPredictor(model, self.vocab, self.vocab)
+        src_seqs = [['1|2', '3'], ['4'], ['5|6|7', '8', '9|1']]
+        scheduler = DecodeScheduler(predictor, max_slots=2)
+        self.assertEqual(self._decode(scheduler, src_seqs), predictor.predict_batch(src_seqs))
+
+    def test_rejects_beam_search_and_shortlist(self):
+        beam = Predictor(Seq2seq(self.encoder, TopKDecoder(self.decoder, 3)), self.vocab, self.vocab)
+        self.assertRaises(ValueError, DecodeScheduler, beam)
+        self.assertRaises(ValueError, InferenceServer, beam, continuous=True)
+        self.assertRaises(ValueError, PreforkServer, beam, workers=1, continuous=True)
+        shortlisted = Predictor(Seq2seq(self.encoder, self.decoder), self.vocab, self.vocab, shortlist=object())
+        self.assertRaises(ValueError, DecodeScheduler, shortlisted)
+
+    def test_background_thread(self):
+        predictor = Predictor(Seq2seq(self.encoder, self.decoder), self.vocab, self.vocab)
+        src_seqs = [['1', '2', '3'], ['4'], ['5', '6', '7', '8', '9']]
+        scheduler = DecodeScheduler(predictor)
+
+        async def run():
+            scheduler.start()
+            try:
+                return await asyncio.gather(*[scheduler.predict(src_seq) for src_seq in src_seqs])
+            finally:
+                await scheduler.stop()
+
+        self.assertEqual(asyncio.run(run()), predictor.predict_batch(src_seqs))
+
+    def test_failed_step_fails_its_requests(self):
+        predictor = Predictor(Seq2seq(self.encoder, self.decoder), self.vocab, self.vocab)
+        scheduler = DecodeScheduler(predictor)
+        forward_step = self.decoder.forward_step
+        self.decoder.forward_step = mock.Mock(side_effect=RuntimeError('boom'))
+
+        async def run():
+            scheduler.start()
+            try:
+                with self.assertRaises(RuntimeError):
+                    await asyncio.wait_for(scheduler.predict(['1', '2']), 3)
+                # the scheduler keeps running after the failed step
+                self.decoder.forward_step = forward_step
+                return await asyncio.wait_for(scheduler.predict(['1', '2']), 3)
+            finally:
+                await scheduler.stop()
+
+        self.assertEqual(asyncio.run(run()), predictor.predict_batch([['1', '2']])[0])
+        self.assertEqual(scheduler.stats()['running'], 0)
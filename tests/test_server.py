@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import unittest
+import threading
+
+import mock
+
+from seq2seq.server import MicroBatcher, InferenceServer, PreforkServer
+
+
+def reverse_batch(src_seqs):
+    return [list(reversed(src_seq)) for src_seq in src_seqs]
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_concurrent_requests_are_batched(self):
+        predict_batch = mock.Mock(side_effect=reverse_batch)
+        batcher = MicroBatcher(predict_batch, max_batch_size=4, max_delay=0.05)
+
+        async def run():
+            batcher.start()
+            results = await asyncio.gather(*[batcher.predict([str(i), 'x']) for i in range(10)])
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(results, [['x', str(i)] for i in range(10)])
+        self.assertEqual([len(call[0][0]) for call in predict_batch.call_args_list], [4, 4, 2])
+        self.assertEqual(batcher.requests, 10)
+        self.assertEqual(batcher.batches, 3)
+
+    def test_failed_batch_fails_its_requests(self):
+        batcher = MicroBatcher(mock.Mock(side_effect=RuntimeError('boom')))
+
+        async def run():
+            batcher.start()
+            try:
+                await batcher.predict(['a'])
+            finally:
+                await batcher.stop()
+
+        self.assertRaises(RuntimeError, asyncio.run, run())
+
+
+class TestInferenceServer(unittest.TestCase):
+
+    @staticmethod
+    async def _request(port, method, path, payload=None):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+        writer.write('{} {} HTTP/1.1\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'
+                     .format(method, path, len(body)).encode('latin-1') + body)
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(body.decode('utf-8'))
+
+    def test_predict(self):
+        predictor = mock.Mock()
+        predictor.tokenize.side_effect = str.split
+        predictor.predict_batch.side_effect = reverse_batch
+        server = InferenceServer(predictor, port=0, max_delay=0.05)
+
+        async def run():
+            await server.start()
+            try:
+                return await asyncio.gather(self._request(server.port, 'POST', '/predict', {'src': '1 2 3'}),
+                                            self._request(server.port, 'POST', '/predict', {'src': ['4', '5']}),
+                                            self._request(server.port, 'POST', '/predict', {'tgt': '1'}),
+                                            self._request(server.port, 'GET', '/predict'),
+                                            self._request(server.port, 'GET', '/missing'))
+            finally:
+                await server.close()
+
+        responses = asyncio.run(run())
+        self.assertEqual(responses[0], (200, {'tgt': ['3', '2', '1']}))
+        self.assertEqual(responses[1], (200, {'tgt': ['5', '4']}))
+        self.assertEqual([status for status, _ in responses[2:]], [400, 405, 404])
+        self.assertEqual(predictor.predict_batch.call_count, 1)
+        self.assertEqual(sorted(predictor.predict_batch.call_args[0][0]), [['1', '2', '3'], ['4', '5']])
+
+
+    def test_predict_with_budget(self):
+        predictor = mock.Mock()
+        predictor.tokenize.side_effect = str.split
+        predictor.predict_with_deadline.return_value = (['3'], True)
+        server = InferenceServer(predictor, port=0)
+
+        async def run():
+            await server.start()
+            try:
+                return await asyncio.gather(
+                    self._request(server.port, 'POST', '/predict', {'src': '1 2 3', 'budget': 0.1}),
+                    self._request(server.port, 'POST', '/predict', {'src': '1 2 3', 'budget': 'soon'}))
+            finally:
+                await server.close()
+
+        responses = asyncio.run(run())
+        self.assertEqual(responses[0], (200, {'tgt': ['3'], 'truncated': True}))
+        self.assertEqual(responses[1][0], 400)
+        (src_seq, budget), _ = predictor.predict_with_deadline.call_args
+        self.assertEqual(src_seq, ['1', '2', '3'])
+        self.assertTrue(0 < budget <= 0.1)
+        self.assertEqual(predictor.predict_with_deadline.call_count, 1)
+        self.assertEqual(predictor.predict_batch.call_count, 0)
+
+    def test_budget_counts_waiting_for_a_thread(self):
+        predictor = mock.Mock()
+        predictor.tokenize.side_effect = str.split
+        predictor.predict_with_deadline.side_effect = lambda src_seq, budget: time.sleep(0.2) or (['3'], False)
+        server = InferenceServer(predictor, port=0, max_streams=1)
+
+        async def run():
+            await server.start()
+            try:
+                first = asyncio.ensure_future(
+                    self._request(server.port, 'POST', '/predict', {'src': '1 2 3', 'budget': 1}))
+                await asyncio.sleep(0.05)
+                # the only thread is busy for longer than the budget of the second request
+                second = await self._request(server.port, 'POST', '/predict', {'src': '1 2 3', 'budget': 0.05})
+                return await first, second
+            finally:
+                await server.close()
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first, (200, {'tgt': ['3'], 'truncated': False}))
+        self.assertEqual(second, (200, {'tgt': [], 'truncated': True}))
+        self.assertEqual(predictor.predict_with_deadline.call_count, 1)
+
+    def test_invalid_content_length(self):
+        server = InferenceServer(mock.Mock(), port=0)
+
+        async def request(length):
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+            writer.write('POST /predict HTTP/1.1\r\nContent-Length: {}\r\n\r\n'.format(length).encode('latin-1'))
+            response = await reader.read()
+            writer.close()
+            head, _, body = response.partition(b'\r\n\r\n')
+            return int(head.split()[1]), json.loads(body.decode('utf-8'))
+
+        async def run():
+            await server.start()
+            try:
+                return await asyncio.gather(request('ten'), request('-5'))
+            finally:
+                await server.close()
+
+        self.assertEqual(asyncio.run(run()), [(400, {'error': 'invalid Content-Length'})] * 2)
+
+    def test_predict_stream(self):
+        predictor = mock.Mock()
+        predictor.tokenize.side_effect = str.split
+        predictor.predict_stream.side_effect = lambda src_seq: iter(reversed(src_seq))
+        server = InferenceServer(predictor, port=0)
+
+        async def run():
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+                body = json.dumps({'src': '1 2 3'}).encode('utf-8')
+                writer.write('POST /predict_stream HTTP/1.1\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'
+                             .format(len(body)).encode('latin-1') + body)
+                response = await reader.read()
+                writer.close()
+                return response
+            finally:
+                await server.close()
+
+        head, _, body = asyncio.run(run()).partition(b'\r\n\r\n')
+        self.assertIn(b'Transfer-Encoding: chunked', head)
+        lines = []
+        while True:
+            size, _, body = body.partition(b'\r\n')
+            if int(size, 16) == 0:
+                break
+            lines.append(json.loads(body[:int(size, 16)].decode('utf-8')))
+            body = body[int(size, 16) + 2:]
+        self.assertEqual(lines, [{'token': '3'}, {'token': '2'}, {'token': '1'}])
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+class TestPreforkServer(unittest.TestCase):
+
+    def setUp(self):
+        predictor = mock.Mock()
+        predictor.tokenize.side_effect = str.split
+        predictor.predict_batch.side_effect = reverse_batch
+        self.server = PreforkServer(predictor, port=0, workers=2, max_delay=0.01)
+
+    def tearDown(self):
+        self.server.stop()
+        self.server.join()
+
+    def _request(self, method, path, payload=None):
+        for _ in range(50):
+            try:
+                return asyncio.run(TestInferenceServer._request(self.server.port, method, path, payload))
+            except ConnectionError:
+                # the workers are still starting
+                time.sleep(0.1)
+        self.fail('no worker answered')
+
+    def test_workers_answer(self):
+        self.server.start()
+        self.assertEqual(len(self.server._children), 2)
+        self.assertEqual(self._request('POST', '/predict', {'src': '1 2 3'}), (200, {'tgt': ['3', '2', '1']}))
+        for _ in range(4):
+            status, health = self._request('GET', '/health')
+            self.assertEqual(status, 200)
+            self.assertIn(health['pid'], self.server._children)
+
+    def test_dead_worker_is_restarted(self):
+        self.server.start()
+        pid = next(iter(self.server._children))
+        supervisor = threading.Thread(target=self.server.join)
+        supervisor.start()
+        os.kill(pid, signal.SIGKILL)
+        for _ in range(50):
+            if pid not in self.server._children and len(self.server._children) == 2:
+                break
+            time.sleep(0.1)
+        self.assertNotIn(pid, self.server._children)
+        self.assertEqual(len(self.server._children), 2)
+        self.assertEqual(self._request('POST', '/predict', {'src': '1 2'}), (200, {'tgt': ['2', '1']}))
+        self.server.stop()
+        supervisor.join()
+        self.assertEqual(self.server._children, {})
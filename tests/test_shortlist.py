@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from seq2seq.dataset import Shortlist
+from seq2seq.models import DecoderRNN, TopKDecoder
+from tests.helpers import Vocab
+
+
+class TestShortlist(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src_vocab = Vocab(['<unk>', '<pad>', 'chat', 'chien', 'noir'])
+        self.tgt_vocab = Vocab(['<unk>', '<pad>', '<sos>', '<eos>', 'the', 'cat', 'dog', 'black'])
+        pairs = [("chat noir".split(), "the black cat".split()),
+                 ("chien".split(), "the dog".split()),
+                 ("chien noir".split(), "the black dog".split())]
+        self.shortlist = Shortlist.build(pairs, self.src_vocab, self.tgt_vocab, n_frequent=5, n_aligned=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_candidates(self):
+        # the 5 most frequent words and the best aligned word of every source word
+        self.assertEqual([0, 1, 2, 3, 4, 5], self.shortlist.candidates([2]).tolist())
+        self.assertEqual([0, 1, 2, 3, 4, 6, 7], self.shortlist.candidates([3, 4, 3]).tolist())
+        self.assertEqual([0, 1, 2, 3, 4], self.shortlist.candidates([]).tolist())
+
+    def test_save_and_load(self):
+        path = os.path.join(self.dir, 'shortlist.npz')
+        self.shortlist.save(path)
+        loaded = Shortlist.load(path)
+        self.assertEqual(self.shortlist.n_frequent, loaded.n_frequent)
+        self.assertEqual(self.shortlist.candidates([2, 3, 4]).tolist(), loaded.candidates([2, 3, 4]).tolist())
+
+    def test_decoding_with_shortlist(self):
+        decoder = DecoderRNN(8, 5, 16, 2, 3)
+        for param in decoder.parameters():
+            param.data.uniform_(-1, 1)
+        shortlist = torch.LongTensor([0, 3, 5, 6])
+        outputs, _, other = decoder(shortlist=shortlist)
+        for step_output, symbols in zip(outputs, other['sequence']):
+            self.assertIn(symbols.item(), shortlist.tolist())
+            self.assertTrue(torch.isinf(step_output[0, 4]))
+            self.assertAlmostEqual(1., step_output.exp().sum().item(), places=5)
+
+        # a shortlist of the whole vocabulary decodes like no shortlist
+        full_outputs, _, _ = decoder(shortlist=torch.arange(8))
+        outputs, _, _ = decoder()
+        for full_output, output in zip(full_outputs, outputs):
+            self.assertTrue(torch.allclose(full_output, output, atol=1e-6))
+
+        _, _, other = TopKDecoder(decoder, 2)(shortlist=shortlist)
+        for symbols in other['sequence']:
+            self.assertIn(symbols[0].item(), shortlist.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
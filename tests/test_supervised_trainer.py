@@ -2,10 +2,13 @@ import unittest
 import os
 
 import mock
+import torch
 import torchtext
 
 from seq2seq.dataset import SourceField, TargetField
-from seq2seq.trainer import SupervisedTrainer
+from seq2seq.loss import AdaptiveNLLLoss, Perplexity
+from seq2seq.models import DecoderRNN
+from seq2seq.trainer import SupervisedTrainer, PlainSupervisedTrainer
 
 class TestSupervisedTrainer(unittest.TestCase):
 
@@ -49,5 +52,43 @@ class TestSupervisedTrainer(unittest.TestCase):
         step = 7
         trainer._train_epoches(self.dataset, mock_model, n_epoches, start_epoch, step)
 
+    def test_accumulate_steps(self):
+        mock_model = mock.Mock(return_value=([], None, {}))
+        trainer = SupervisedTrainer(batch_size=16, accumulate_steps=3)
+        trainer.loss = mock.Mock()
+        trainer.optimizer = mock.Mock()
+        for _ in range(3):
+            trainer._train_batch(None, None, None, mock.Mock(), mock_model, 0)
+
+        self.assertEqual(1, mock_model.zero_grad.call_count)
+        self.assertEqual(1, trainer.optimizer.step.call_count)
+        trainer.loss.backward.assert_called_with(1. / 3)
+
+    def test_adaptive_output_layer_requires_adaptive_loss(self):
+        model = mock.Mock()
+        model.decoder = DecoderRNN(60, 8, 16, 0, 2, output_layer='adaptive', cutoffs=[10, 30])
+        trainer = SupervisedTrainer(loss=Perplexity(torch.ones(60), 1), batch_size=16)
+        self.assertRaises(ValueError, trainer._check_loss, model)
+
+        # the loss follows the output layer of a resumed model
+        other = DecoderRNN(60, 8, 16, 0, 2, output_layer='adaptive', cutoffs=[10, 30])
+        trainer = SupervisedTrainer(loss=AdaptiveNLLLoss(other.out, mask=1), batch_size=16)
+        trainer._check_loss(model)
+        self.assertIs(trainer.loss.output_layer, model.decoder.out)
+
+    @mock.patch('seq2seq.util.checkpoint.Checkpoint.save')
+    def test_accumulate_steps_flushes_last_window(self, mock_checkpoint):
+        mock_model = mock.Mock(return_value=([], None, {}))
+        mock_model.parameters.return_value = []
+        trainer = PlainSupervisedTrainer(batch_size=16, checkpoint_every=1, accumulate_steps=3)
+        trainer.loss = mock.Mock()
+        trainer.loss.get_loss.return_value = 0
+        trainer.optimizer = mock.Mock()
+        trainer._train_epoches(self.dataset, mock_model, 1, 1, 0)
+
+        # 7 batches: two full windows and the remaining batch
+        self.assertEqual(3, trainer.optimizer.step.call_count)
+        self.assertEqual(3, mock_checkpoint.call_count)
+
 if __name__ == '__main__':
     unittest.main()
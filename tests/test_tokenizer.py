@@ -0,0 +1,46 @@
+import pickle
+import unittest
+
+from seq2seq.dataset import Tokenizer
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def setUp(self):
+        self.tokenizer = Tokenizer()
+
+    def test_contractions_and_quotes(self):
+        self.assertEqual(self.tokenizer("I don't know, it's \"fine\"."),
+                         ['I', 'do', "n't", 'know', ',', 'it', "'s", '``', 'fine', "''", '.'])
+        self.assertEqual(self.tokenizer("I can't go (now)!"), ['I', 'ca', "n't", 'go', '(', 'now', ')', '!'])
+
+    def test_sentences(self):
+        self.assertEqual(self.tokenizer("Hello there. How are you?"),
+                         ['Hello', 'there', '.', 'How', 'are', 'you', '?'])
+        self.assertEqual(self.tokenizer("Ask Mr. Smith."), ['Ask', 'Mr.', 'Smith', '.'])
+
+    def test_lowercase(self):
+        self.assertEqual(Tokenizer(lowercase=True)("Hello World"), ['hello', 'world'])
+
+    def test_cache(self):
+        tokens = self.tokenizer("Hello there.")
+        tokens.append('modified')
+        self.assertEqual(self.tokenizer("Hello there."), ['Hello', 'there', '.'])
+        self.assertEqual((self.tokenizer.hits, self.tokenizer.misses), (1, 1))
+
+    def test_cache_size(self):
+        tokenizer = Tokenizer(cache_size=2)
+        for text in ["a", "b", "c", "a"]:
+            tokenizer(text)
+        self.assertEqual((tokenizer.hits, tokenizer.misses), (0, 4))
+        self.assertEqual(list(tokenizer._cache), ["c", "a"])
+
+    def test_tokenize_batch(self):
+        texts = ["Hi!", "It's late."]
+        self.assertEqual(self.tokenizer.tokenize_batch(texts), [self.tokenizer(text) for text in texts])
+
+    def test_pickle(self):
+        self.tokenizer("Hello there.")
+        tokenizer = pickle.loads(pickle.dumps(self.tokenizer))
+        self.assertEqual(len(tokenizer._cache), 0)
+        self.assertEqual(tokenizer("Hello there."), ['Hello', 'there', '.'])
@@ -1,3 +1,4 @@
+import time
 import unittest
 
 import torch
@@ -16,6 +17,24 @@ class TestDecoderRNN(unittest.TestCase):
         decoder = DecoderRNN(self.vocab_size, 50, 16, 0, 1, input_dropout_p=0)
         TopKDecoder(decoder, 3)
 
+    def test_batch_matches_single_sequences(self):
+        """ The beams of every entry of a batch are decoded as if the entry was decoded alone. """
+        torch.manual_seed(0)
+        decoder = DecoderRNN(self.vocab_size, 10, 16, 0, 1, use_attention=True)
+        topk_decoder = TopKDecoder(decoder, 3)
+        encoder_hidden = torch.randn(1, 2, 16)
+        encoder_outputs = torch.randn(2, 5, 16)
+        with torch.no_grad():
+            _, _, batch = topk_decoder(encoder_hidden=encoder_hidden, encoder_outputs=encoder_outputs)
+            for b in range(2):
+                _, _, single = topk_decoder(encoder_hidden=encoder_hidden[:, b:b + 1],
+                                            encoder_outputs=encoder_outputs[b:b + 1])
+                self.assertEqual(batch['length'][b], single['length'][0])
+                self.assertTrue(np.allclose(batch['score'][b], single['score'][0], atol=1e-5))
+                length = single['length'][0]
+                self.assertEqual([symbols[b].tolist() for symbols in batch['sequence'][:length]],
+                                 [symbols[0].tolist() for symbols in single['sequence'][:length]])
+
     def test_k_1(self):
         """ When k=1, the output of topk decoder should be the same as a normal decoder. """
         batch_size = 1
@@ -141,3 +160,38 @@ class TestDecoderRNN(unittest.TestCase):
                     total_steps = topk_lengths[b][k]
                     for t in range(total_steps):
                         self.assertEqual(topk_pred_symbols[t][b, k].data[0], topk[b][k][t+1][1]) # topk includes SOS
+
+    def test_deadline(self):
+        decoder = DecoderRNN(self.vocab_size, 20, 16, 0, 1)
+        topk_decoder = TopKDecoder(decoder, 3)
+        encoder_hidden = torch.randn(1, 2, 16)
+        _, _, other = topk_decoder(encoder_hidden=encoder_hidden, deadline=time.monotonic())
+        self.assertEqual(len(other['sequence']), 1)
+        self.assertEqual(other['length'], [1, 1])
+        self.assertEqual(other['truncated'], [int(s) != 1 for s in other['sequence'][0].view(-1)])
+
+        _, _, full = topk_decoder(encoder_hidden=encoder_hidden)
+        _, _, other = topk_decoder(encoder_hidden=encoder_hidden, deadline=time.monotonic() + 60)
+        self.assertEqual(other['length'], full['length'])
+        self.assertEqual(other['truncated'], [False, False])
+
+    def test_max_lengths(self):
+        torch.manual_seed(0)
+        decoder = DecoderRNN(self.vocab_size, 12, 16, 0, 1)
+        for param in decoder.parameters():
+            param.data.uniform_(-1, 1)
+        decoder.out.bias.data[1] = -3
+        encoder_hidden = torch.randn(1, 3, 16)
+        max_lengths = [3, 12, 5]
+        _, _, other = TopKDecoder(decoder, 3)(encoder_hidden=encoder_hidden, max_lengths=max_lengths)
+        sequences = torch.cat(other['sequence'], 1)
+
+        # every sequence gets the hypotheses of a search of its own maximum length
+        for b, max_length in enumerate(max_lengths):
+            capped = DecoderRNN(self.vocab_size, max_length, 16, 0, 1)
+            capped.load_state_dict(decoder.state_dict())
+            _, _, expected = TopKDecoder(capped, 3)(encoder_hidden=encoder_hidden[:, b:b + 1])
+            length = expected['length'][0]
+            self.assertEqual(other['length'][b], length)
+            self.assertEqual(sequences[b, :length].tolist(), torch.cat(expected['sequence'], 1)[0, :length].tolist())
+            self.assertAlmostEqual(other['score'][b, 0].item(), expected['score'][0, 0].item(), places=5)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from seq2seq.evaluator import Predictor, TracedPredictor
+from seq2seq.models import Seq2seq, EncoderRNN, DecoderRNN, TopKDecoder
+from tests.helpers import digit_vocab
+
+
+class TestTracedPredictor(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.dir = tempfile.mkdtemp()
+        self.vocab = digit_vocab()
+        encoder = EncoderRNN(14, 10, 16, bidirectional=True, rnn_cell='lstm')
+        decoder = DecoderRNN(14, 10, 32, 2, 3, bidirectional=True, rnn_cell='lstm', use_attention=True)
+        self.model = Seq2seq(encoder, decoder)
+        self.src_seqs = [["1"], "1 2 3".split(), "9 8 7 6 5 4".split()]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_predict_matches_eager(self):
+        eager = Predictor(self.model, self.vocab, self.vocab)
+        traced = TracedPredictor(self.model, self.vocab, self.vocab, buckets=(4, 8))
+        for src_seq in self.src_seqs:
+            self.assertEqual(eager.predict(src_seq), traced.predict(src_seq))
+        self.assertEqual([4, 8], sorted(traced._graphs))
+
+    def test_falls_back_beyond_largest_bucket(self):
+        traced = TracedPredictor(self.model, self.vocab, self.vocab, buckets=(2,))
+        eager = Predictor(self.model, self.vocab, self.vocab)
+        self.assertEqual(eager.predict(self.src_seqs[2]), traced.predict(self.src_seqs[2]))
+        self.assertEqual({}, traced._graphs)
+
+    def test_rejects_unsupported_models_and_options(self):
+        beam = Seq2seq(self.model.encoder, TopKDecoder(self.model.decoder, 3))
+        self.assertRaises(ValueError, TracedPredictor, beam, self.vocab, self.vocab)
+        self.assertRaises(ValueError, TracedPredictor, self.model, self.vocab, self.vocab, use_bf16=True)
+        self.assertRaises(ValueError, TracedPredictor, self.model, self.vocab, self.vocab, shortlist=object())
+
+    def test_cache_dir(self):
+        TracedPredictor(self.model, self.vocab, self.vocab, buckets=(8,), cache_dir=self.dir).warmup()
+        cached, = os.listdir(self.dir)
+        self.assertEqual(['decoder_8.pt', 'encoder_8.pt'], sorted(os.listdir(os.path.join(self.dir, cached))))
+
+        traced = TracedPredictor(self.model, self.vocab, self.vocab, buckets=(8,), cache_dir=self.dir)
+        traced._trace = None  # must not be called
+        eager = Predictor(self.model, self.vocab, self.vocab)
+        self.assertEqual(eager.predict(self.src_seqs[1]), traced.predict(self.src_seqs[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from seq2seq.dataset import CompactVocab
+
+
+class TestCompactVocab(unittest.TestCase):
+
+    def setUp(self):
+        self.itos = ['<unk>', '<pad>', 'the', 'café', "n't", '']
+        self.vocab = CompactVocab(self.itos)
+
+    def test_lookup(self):
+        self.assertEqual(len(self.itos), len(self.vocab))
+        for i, tok in enumerate(self.itos):
+            self.assertEqual(i, self.vocab.stoi[tok])
+            self.assertEqual(tok, self.vocab.itos[i])
+        self.assertEqual(self.itos, list(self.vocab.itos))
+
+    def test_unseen_token_is_not_inserted(self):
+        self.assertEqual(0, self.vocab.stoi['unseen'])
+        self.assertFalse('unseen' in self.vocab.stoi)
+        self.assertEqual(len(self.itos), len(self.vocab.stoi))
+        self.assertEqual(None, self.vocab.stoi.get('unseen'))
+
+    def test_from_vocab(self):
+        class Vocab(object):
+            itos = ['<pad>', '<unk>', 'a']
+            stoi = {'<pad>': 0, '<unk>': 1, 'a': 2}
+        vocab = CompactVocab.from_vocab(Vocab())
+        self.assertEqual(1, vocab.unk_index)
+        self.assertEqual(1, vocab.stoi['b'])
+        self.assertTrue(CompactVocab.from_vocab(vocab) is vocab)
+
+    def test_serialization(self):
+        self.assertEqual(self.vocab, CompactVocab.from_buffer(self.vocab.to_bytes()))
+        self.assertEqual(self.vocab, pickle.loads(pickle.dumps(self.vocab)))
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'vocab.bin')
+            self.vocab.save(path)
+            loaded = CompactVocab.load(path)
+            self.assertEqual(self.vocab, loaded)
+            self.assertEqual(3, loaded.stoi['café'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()